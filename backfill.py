@@ -1,3 +1,4 @@
+import argparse
 import sys
 import os
 from datetime import datetime
@@ -9,57 +10,150 @@ load_dotenv()
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
-from gmail_service import get_gmail_service, search_schedule_emails
-from calendar_service import get_calendar_service, get_or_create_calendar
-from processor import process_messages
+from gmail_service import get_gmail_service, iter_schedule_email_pages
+from calendar_service import get_calendar_service, get_or_create_calendar, find_calendar, parse_calendar_targets
+from transport import bytes_received
+from metrics import stage, reset_metrics, get_metrics, format_summary, write_metrics
+from sync import apply_message_pages
+from checkpoint import load_checkpoint, save_checkpoint, clear_checkpoint, skip_to_checkpoint
+from ics_sink import IcsSink
 
-def main():
+def print_finished(start_time, status, metrics_dir=None):
+    end_time = datetime.now()
+    duration = (end_time - start_time).total_seconds()
+    metrics = get_metrics(bytes_received(), duration, succeeded=status == "successfully")
+    print(format_summary(metrics))
+    if metrics_dir:
+        try:
+            write_metrics(metrics, metrics_dir, run='backfill')
+        except OSError as e:
+            print(f"Could not write metrics to {metrics_dir}: {e}")
+    print("=" * 60)
+    print(f"Finished {status}: {end_time.strftime('%Y-%m-%d %H:%M:%S')} (Duration: {duration:.2f}s)")
+    print("=" * 60)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill all past schedule emails into Google Calendar.")
+    parser.add_argument('--force', action='store_true',
+                        help="Reprocess every email, even those that were already applied.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of threads used to fetch emails and write events (default: 1).")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Print the calendar changes that would be made without making them.")
+    parser.add_argument('--metrics-dir', default='.',
+                        help="Directory the JSON and Prometheus metrics files are written to (default: current directory).")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue an interrupted backfill after the last email it applied.")
+    parser.add_argument('--ics', metavar='PATH',
+                        help="Write the schedule to this .ics file instead of Google Calendar.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    reset_metrics()
     start_time = datetime.now()
     print("=" * 60)
     print(f"Schedule Backfill Started: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
     print("=" * 60)
     
     print("Authenticating with Google Services...")
+    sink = None
+    calendar_service = None
     try:
-        gmail_service = get_gmail_service()
-        calendar_service = get_calendar_service()
+        with stage('auth'):
+            gmail_service = get_gmail_service()
+            if not args.ics:
+                calendar_service = get_calendar_service()
         
-        # Get calendar ID from environment variable or create/find by name
-        calendar_id = os.environ.get('CALENDAR_ID')
-        if calendar_id:
-            print(f"Using calendar ID from CALENDAR_ID env var: {calendar_id}")
+        # Get calendar IDs from environment variable or create/find by name
+        targets = parse_calendar_targets(os.environ.get('CALENDAR_ID'))
+        if args.ics:
+            sink = IcsSink(args.ics, os.environ.get('CALENDAR_NAME', 'Work Schedule'))
+            print(f"Writing the schedule to {args.ics}")
+        elif targets:
+            print(f"Using calendar IDs from CALENDAR_ID env var: {', '.join(calendar_id for calendar_id, _ in targets)}")
         else:
             calendar_name = os.environ.get('CALENDAR_NAME', 'Work Schedule')
-            calendar_id = get_or_create_calendar(calendar_service, calendar_name)
+            if not args.dry_run:
+                calendar_id = get_or_create_calendar(calendar_service, calendar_name)
+            else:
+                # A dry run makes no writes, so a missing calendar is planned against as empty
+                calendar_id = find_calendar(calendar_service, calendar_name)
+                if calendar_id is None:
+                    print(f"Calendar {calendar_name} doesn't exist yet, it would be created")
             print(f"Using calendar: {calendar_name} (ID: {calendar_id})")
+            targets = [(calendar_id, None)]
         
     except Exception as e:
         print(f"Authentication failed: {e}")
-        end_time = datetime.now()
-        duration = (end_time - start_time).total_seconds()
-        print("=" * 60)
-        print(f"Finished (with errors): {end_time.strftime('%Y-%m-%d %H:%M:%S')} (Duration: {duration:.2f}s)")
-        print("=" * 60)
+        print_finished(start_time, "(with errors)", args.metrics_dir)
         return
 
+    checkpoint = load_checkpoint() if args.resume else None
+    if checkpoint:
+        print(f"Resuming after email {checkpoint['message_id']} ({checkpoint['position']} emails already applied)")
+    elif args.resume:
+        print("No backfill checkpoint found, starting from the newest email.")
+    elif not args.dry_run:
+        clear_checkpoint()
+    base_counts = checkpoint['counts'] if checkpoint else (0, 0, 0, 0)
+    position = checkpoint['position'] if checkpoint else 0
+    settled = checkpoint['settled'] if checkpoint else set()
+
     print("Searching for ALL schedule emails (this might take a while)...")
-    # Search all time, no limits
-    messages = search_schedule_emails(gmail_service, max_results=None, newer_than=None)
-    
-    if not messages:
+    found = 0
+
+    def search_pages():
+        # Search all time, no limits; each page is applied before the next one is requested
+        nonlocal found
+        pages = iter_schedule_email_pages(gmail_service)
+        while True:
+            with stage('search'):
+                page = next(pages, None)
+            if page is None:
+                return
+            found += len(page)
+            print(f"Found {found} schedule emails so far")
+            yield page
+
+    def add_counts(counts):
+        return tuple(base + count for base, count in zip(base_counts, counts))
+
+    def save_progress(page, totals):
+        nonlocal position
+        position += len(page)
+        if not args.dry_run:
+            save_checkpoint(page[-1]['id'], position, add_counts(totals), settled)
+
+    pages = search_pages()
+    if checkpoint:
+        pages = skip_to_checkpoint(pages, checkpoint['message_id'])
+
+    # Pages come newest first and process_messages lets the newest email win for every date.
+    # Emails the ledger skips (e.g. of the interrupted page) keep their dates through the ledger.
+    try:
+        counts = apply_message_pages(gmail_service, calendar_service, [sink] if sink else targets, pages,
+                                     force=args.force, workers=args.workers, dry_run=args.dry_run,
+                                     settled=settled, on_page=save_progress)
+    except Exception as e:
+        print(f"Backfill failed: {e}")
+        print("Run again with --resume to continue after the last applied email.")
+        print_finished(start_time, "(with errors)", args.metrics_dir)
+        return
+    added, updated, deleted, unchanged = add_counts(counts)
+    if not args.dry_run:
+        clear_checkpoint()
+
+    if not found:
         print("No schedule emails found.")
+    elif args.dry_run:
+        print(f"\nDry run, nothing was changed. Would add: {added}, update: {updated}, delete: {deleted}, "
+              f"leave unchanged: {unchanged}")
     else:
-        # Process from oldest to newest to ensure correct history
-        messages.reverse()
-        
-        added, updated, deleted = process_messages(gmail_service, calendar_service, calendar_id, messages)
-        print(f"\nDone! Added: {added}, Updated: {updated}, Deleted: {deleted}")
+        print(f"\nDone! Added: {added}, Updated: {updated}, Deleted: {deleted}, Unchanged: {unchanged}")
     
-    end_time = datetime.now()
-    duration = (end_time - start_time).total_seconds()
-    print("=" * 60)
-    print(f"Finished successfully: {end_time.strftime('%Y-%m-%d %H:%M:%S')} (Duration: {duration:.2f}s)")
-    print("=" * 60)
+    print(f"Received {bytes_received() / 1024:.1f} KB from Google APIs")
+    print_finished(start_time, "successfully", args.metrics_dir)
 
 if __name__ == '__main__':
     main()
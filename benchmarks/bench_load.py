@@ -0,0 +1,113 @@
+"""
+Load benchmarks.
+
+Runs the real processor against the in-memory Gmail and Calendar fakes, with
+injected per-call latency, to compare engines (one by one, batched, threaded)
+on thousands of emails and many calendars without a network:
+
+    python3 benchmarks/bench_load.py
+    python3 benchmarks/bench_load.py --emails 2000 --calendars 20 --latency 0.05
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.append(os.path.dirname(__file__))
+
+from gmail_service import search_schedule_emails
+from processor import process_messages, CalendarTarget
+from corpus import generate_email
+from fake_google import FakeGmail, FakeCalendar
+from bench_parser import _git_commit
+
+# Engine name -> CalendarTarget options
+ENGINES = {
+    'sequential': {'batch_writes': False, 'workers': 1},
+    'batched': {'batch_writes': True, 'workers': 1},
+    'threaded': {'batch_writes': True, 'workers': 8},
+}
+
+FIRST_INTERNAL_DATE = 1704067200000  # 2024-01-01, in milliseconds
+DAY_MS = 86400000
+
+def build_mailbox(emails, seed, **fake_options):
+    """
+    Fills a fake mailbox with weekly schedule emails, some of which revise an
+    earlier week, like the real sender does.
+    """
+    rng = random.Random(seed)
+    gmail = FakeGmail(**fake_options)
+    for i in range(emails):
+        week = i - 1 if i and rng.random() < 0.3 else i
+        html, _ = generate_email(rng, 7, start_date=date(2024, 1, 1) + timedelta(weeks=week))
+        gmail.add_email(html, FIRST_INTERNAL_DATE + i * DAY_MS)
+    return gmail
+
+def run(engines, emails, calendars, latency, seed):
+    results = []
+    for name in engines:
+        gmail = build_mailbox(emails, seed, latency=latency)
+        calendar = FakeCalendar(latency=latency)
+        calendar_ids = [calendar.add_calendar(f"Schedule {i}") for i in range(calendars)]
+
+        start = time.perf_counter()
+        messages = search_schedule_emails(gmail)
+        totals = [0, 0, 0, 0]
+        # The fakes print nothing, but the processor reports every write
+        with redirect_stdout(io.StringIO()):
+            for calendar_id in calendar_ids:
+                target = CalendarTarget(calendar, calendar_id, 'Shift', **ENGINES[name])
+                counts = process_messages(gmail, messages, [target], workers=ENGINES[name]['workers'])
+                totals = [total + count for total, count in zip(totals, counts)]
+        elapsed = time.perf_counter() - start
+
+        results.append({
+            'engine': name,
+            'emails': emails,
+            'calendars': calendars,
+            'latency': latency,
+            'seconds': round(elapsed, 3),
+            'added': totals[0],
+            'updated': totals[1],
+            'deleted': totals[2],
+            'gmail_calls': dict(gmail.calls),
+            'calendar_calls': dict(calendar.calls),
+        })
+        print(f"{name:12} {elapsed:9.2f}s  added {totals[0]:6}  "
+              f"gmail calls {sum(gmail.calls.values()):6}  calendar calls {sum(calendar.calls.values()):6}")
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the processor against in-memory Google APIs.")
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES),
+                        help="Engines to compare (default: all).")
+    parser.add_argument('--emails', type=int, default=500, help="Number of schedule emails in the mailbox.")
+    parser.add_argument('--calendars', type=int, default=3, help="Number of calendars the emails are applied to.")
+    parser.add_argument('--latency', type=float, default=0.01, help="Seconds of latency per API round trip.")
+    parser.add_argument('--seed', type=int, default=0, help="Mailbox seed, keep it fixed to compare commits.")
+    parser.add_argument('--output', default='bench_output.txt', help="File the JSON results are appended to.")
+    args = parser.parse_args(argv)
+
+    results = run(args.engines, args.emails, args.calendars, args.latency, args.seed)
+    record = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'seed': args.seed,
+        'results': results,
+    }
+    with open(args.output, 'a') as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"Results appended to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Parser benchmarks.
+
+Times parse_schedule_email and get_email_content decoding on a synthetic,
+seeded corpus and reports emails/sec and peak memory per email size.
+Results are appended as JSON lines (with the git commit) so runs can be
+compared across commits:
+
+    python3 benchmarks/bench_parser.py
+    python3 benchmarks/bench_parser.py --sizes small huge --output bench_output.txt
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.append(os.path.dirname(__file__))
+
+from email_parser import parse_schedule_email
+from gmail_service import get_email_content
+from corpus import SIZES, generate_corpus, to_gmail_message
+
+# Emails per size, chosen so every case runs for a comparable amount of time
+DEFAULT_COUNTS = {'small': 2000, 'medium': 1000, 'large': 100, 'huge': 3}
+
+class _StubRequest:
+    def __init__(self, message):
+        self.message = message
+
+    def execute(self):
+        return self.message
+
+class _StubGmail:
+    """
+    Just enough of the Gmail service for get_email_content, without any network.
+    """
+    def __init__(self, messages):
+        self.messages_by_id = messages
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def get(self, userId, id, fields=None):
+        return _StubRequest(self.messages_by_id[id])
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _measure(func, items, repeat):
+    """
+    Returns (best seconds per pass over items, peak bytes allocated during one pass).
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    # Measure memory in a separate pass, tracemalloc slows everything down
+    tracemalloc.start()
+    for item in items:
+        func(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def run(sizes, repeat, seed):
+    results = []
+    for size in sizes:
+        corpus = generate_corpus(size, DEFAULT_COUNTS[size], seed=seed)
+        bodies = [html for html, _ in corpus]
+        total_bytes = sum(len(html.encode('utf-8')) for html in bodies)
+
+        # Sanity check: a fast but wrong parser is not an improvement
+        for html, expected in corpus:
+            parsed = [(event.start, event.end) for event in parse_schedule_email(html)]
+            if parsed != expected:
+                raise AssertionError(f"Parser output does not match the corpus ({size})")
+
+        gmail = _StubGmail({str(i): to_gmail_message(html) for i, html in enumerate(bodies)})
+        cases = [
+            ('parse_schedule_email', parse_schedule_email, bodies),
+            ('get_email_content', lambda msg_id: get_email_content(gmail, msg_id), list(gmail.messages_by_id)),
+        ]
+        for name, func, items in cases:
+            seconds, peak = _measure(func, items, repeat)
+            results.append({
+                'benchmark': name,
+                'size': size,
+                'rows_per_email': SIZES[size],
+                'emails': len(items),
+                'avg_email_bytes': total_bytes // len(items),
+                'emails_per_sec': round(len(items) / seconds, 1),
+                'mb_per_sec': round(total_bytes / seconds / 1e6, 2),
+                'peak_memory_bytes': peak,
+            })
+            print(f"{name:22} {size:7} {len(items) / seconds:12.1f} emails/s "
+                  f"{total_bytes / seconds / 1e6:8.2f} MB/s  peak {peak / 1024:10.1f} KB")
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the schedule email parser.")
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES),
+                        help="Email sizes to benchmark (default: all).")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed passes per case; the best one counts.")
+    parser.add_argument('--seed', type=int, default=0, help="Corpus seed, keep it fixed to compare commits.")
+    parser.add_argument('--output', default='bench_output.txt', help="File the JSON results are appended to.")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat, args.seed)
+    record = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    with open(args.output, 'a') as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"Results appended to {args.output}")
+
+if __name__ == '__main__':
+    main()
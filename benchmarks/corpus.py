@@ -0,0 +1,93 @@
+"""
+Synthetic corpus of Hungarian schedule emails, shaped like the ones
+mymenu-support@ext.mcdonalds.com sends.
+"""
+import base64
+import random
+from datetime import date, datetime, timedelta
+
+DAY_NAMES = ['Hétfő', 'Kedd', 'Szerda', 'Csütörtök', 'Péntek', 'Szombat', 'Vasárnap']
+DAYS_OFF = ['PN', 'Szabi', 'Beteg']
+SHIFTS = ['06:00-14:00', '08:00-16:00', '10:00-22:00', '12:00-22:00', '14:00-23:00', '16:00-23:00', '7:00-15:00']
+
+# Named sizes (number of schedule rows); 'huge' produces a multi-MB body
+SIZES = {
+    'small': 7,
+    'medium': 31,
+    'large': 365,
+    'huge': 30000,
+}
+
+def _emphasize(rng, text):
+    """
+    Wraps text in the nested tags the real emails use to highlight changed days.
+    """
+    roll = rng.random()
+    if roll < 0.2:
+        return f"<strong><em>{text}</em></strong>"
+    if roll < 0.3:
+        return f"<strong>{text}</strong>"
+    return text
+
+def generate_email(rng, rows, start_date=date(2025, 11, 1), changed=True):
+    """
+    Generates one schedule email with the given number of rows.
+    Returns a tuple (html, expected) where expected lists the (start, end)
+    datetimes the parser should produce for it.
+    """
+    if changed:
+        intro = "<p>Beoszt&aacute;sod megv&aacute;ltozott:</p>"
+    else:
+        intro = "<p>Aktu&aacute;lis beoszt&aacute;sod a k&ouml;vetkező:</p>"
+    lines = [
+        "<p>Kedves Kolléga!</p>",
+        intro,
+        '<table style="float: none;" border="1" cellspacing="0" cellpadding="3">',
+        "<tbody>",
+        "<tr>",
+        "<td><strong>Nap</strong></td>",
+        "<td><strong>D&aacute;tum</strong></td>",
+        "<td><strong>Beoszt&aacute;s</strong></td>",
+        "</tr>",
+    ]
+    expected = []
+
+    for offset in range(rows):
+        day = start_date + timedelta(days=offset)
+        date_str = day.strftime('%Y.%m.%d')
+        if offset == 0 and changed:
+            date_str += " (ma)"
+        if rng.random() < 0.3:
+            schedule = rng.choice(DAYS_OFF)
+        else:
+            schedule = rng.choice(SHIFTS)
+            start_str, end_str = schedule.split('-')
+            start = datetime.combine(day, datetime.strptime(start_str, '%H:%M').time())
+            end = datetime.combine(day, datetime.strptime(end_str, '%H:%M').time())
+            expected.append((start - timedelta(minutes=20), end))
+
+        lines += [
+            "<tr>",
+            f"<td>{_emphasize(rng, DAY_NAMES[day.weekday()])}</td>",
+            f"<td>{_emphasize(rng, date_str)}</td>",
+            f"<td>{_emphasize(rng, schedule)}</td>",
+            "</tr>",
+        ]
+
+    lines += ["</tbody>", "</table>", "<p>Üdvözlettel,<br>MyMenu</p>"]
+    return "\n".join(lines), expected
+
+def generate_corpus(size, count, seed=0):
+    """
+    Generates `count` emails of a named size. The same seed always gives the same corpus.
+    """
+    rng = random.Random(seed)
+    rows = SIZES[size]
+    return [generate_email(rng, rows, changed=rng.random() < 0.5) for _ in range(count)]
+
+def to_gmail_message(html, internal_date=0):
+    """
+    Wraps an email body into a Gmail API message resource, as messages().get returns it.
+    """
+    data = base64.urlsafe_b64encode(html.encode('utf-8')).decode('ascii')
+    return {'internalDate': str(internal_date), 'payload': {'body': {'data': data}}}
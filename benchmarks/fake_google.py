@@ -0,0 +1,403 @@
+"""
+In-memory stand-ins for the Gmail and Calendar API clients that build() returns.
+
+They implement the parts of the APIs this project uses, with pagination,
+configurable per-call latency, error injection and call accounting, so the
+real processor, main.py and backfill.py can run end to end, and be load
+tested, without a network:
+
+    gmail = FakeGmail(latency=0.05)
+    gmail.add_email(html, internal_date)
+    calendar = FakeCalendar(latency=0.05)
+    process_messages(gmail, search_schedule_emails(gmail), [CalendarTarget(calendar, 'primary', 'Shift')])
+    print(gmail.calls, calendar.calls)
+"""
+import base64
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+def make_http_error(status, reason='backendError', message='Injected error'):
+    """
+    Builds an HttpError like the ones googleapiclient raises.
+    """
+    resp = httplib2.Response({'status': str(status), 'reason': message})
+    content = json.dumps({'error': {'code': status, 'message': message,
+                                    'errors': [{'reason': reason, 'message': message}]}})
+    return HttpError(resp, content.encode('utf-8'))
+
+class FakeRequest:
+    """
+    A request that is only run when executed, like googleapiclient's HttpRequest.
+    """
+    def __init__(self, service, method_id, handler):
+        self.service = service
+        self.method_id = method_id
+        # The shared executor applies quotas only to requests that name their method
+        self.methodId = method_id if service.quota_limits else None
+        self.handler = handler
+
+    def execute(self, http=None, num_retries=0):
+        self.service._sleep()
+        return self.service._call(self.method_id, self.handler)
+
+class FakeBatch:
+    """
+    A batch request: one round trip (and one latency) for all of its requests.
+    """
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if request_id is None:
+            request_id = str(len(self.requests))
+        self.requests.append((request_id, request, callback or self.callback))
+
+    def execute(self, http=None):
+        self.service._sleep()
+        self.service._count('batch')
+        for request_id, request, callback in self.requests:
+            try:
+                response = self.service._call(request.method_id, request.handler)
+            except HttpError as e:
+                callback(request_id, None, e)
+            else:
+                callback(request_id, response, None)
+
+class _FakeService:
+    """
+    Shared plumbing: latency, error injection, call accounting and locking.
+    """
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0, page_size=100, quota_limits=False):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.page_size = page_size
+        self.quota_limits = quota_limits
+        self.calls = Counter()
+        self.injected_errors = {}
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+
+    def inject_error(self, method_id, status=503, reason='backendError', times=1, applied=False):
+        """
+        Makes the next `times` calls of a method fail with the given status.
+        With applied=True the calls still take effect and only their responses
+        are lost, like a request that times out after the server acted on it.
+        """
+        with self.lock:
+            self.injected_errors.setdefault(method_id, []).extend(
+                [(make_http_error(status, reason), applied)] * times)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    def _sleep(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _count(self, method_id):
+        with self.lock:
+            self.calls[method_id] += 1
+
+    def _call(self, method_id, handler):
+        with self.lock:
+            self.calls[method_id] += 1
+            queued = self.injected_errors.get(method_id)
+            if queued:
+                error, applied = queued.pop(0)
+                if applied:
+                    handler()
+                raise error
+            if self.error_rate and self.random.random() < self.error_rate:
+                raise make_http_error(503)
+            return handler()
+
+    def _request(self, method_id, handler):
+        return FakeRequest(self, method_id, handler)
+
+    def _page(self, items, page_token):
+        """
+        Returns (page, next_page_token) for a list of items.
+        """
+        start = int(page_token or 0)
+        end = start + self.page_size
+        return items[start:end], (str(end) if end < len(items) else None)
+
+class FakeGmail(_FakeService):
+    """
+    Stand-in for build('gmail', 'v1').
+    Every message in the mailbox is treated as a schedule email unless it was
+    added with schedule=False, in which case searches skip it.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.messages_by_id = {}
+        self.history_id = 1000
+        # History records older than this have expired (history.list returns 404)
+        self.oldest_history_id = self.history_id
+        self._ids = itertools.count(1)
+
+    def add_email(self, html, internal_date, schedule=True):
+        """
+        Delivers an email. internal_date is in milliseconds since the epoch.
+        Returns the new message ID.
+        """
+        with self.lock:
+            msg_id = f"msg{next(self._ids):06d}"
+            self.history_id += 1
+            self.messages_by_id[msg_id] = {
+                'id': msg_id,
+                'internalDate': str(internal_date),
+                'historyId': self.history_id,
+                'schedule': schedule,
+                'data': base64.urlsafe_b64encode(html.encode('utf-8')).decode('ascii'),
+            }
+            return msg_id
+
+    def expire_history(self):
+        """
+        Makes every history ID handed out so far too old to use.
+        """
+        with self.lock:
+            self.history_id += 1
+            self.oldest_history_id = self.history_id
+
+    # users() -> self, so users().messages(), users().history() and
+    # users().getProfile() all resolve here
+    def users(self):
+        return self
+
+    def messages(self):
+        return _GmailMessages(self)
+
+    def history(self):
+        return _GmailHistory(self)
+
+    def getProfile(self, userId, fields=None):
+        return self._request('gmail.users.getProfile', lambda: {'historyId': str(self.history_id)})
+
+class _GmailMessages:
+    def __init__(self, gmail):
+        self.gmail = gmail
+
+    def list(self, userId, q=None, pageToken=None, maxResults=None, fields=None):
+        gmail = self.gmail
+
+        def handler():
+            matches = sorted((m for m in gmail.messages_by_id.values() if m['schedule'] or not q),
+                             key=lambda m: int(m['internalDate']), reverse=True)
+            refs = [{'id': m['id'], 'threadId': m['id']} for m in matches]
+            start = int(pageToken or 0)
+            size = min(maxResults or gmail.page_size, gmail.page_size)
+            page = refs[start:start + size]
+            result = {'resultSizeEstimate': len(refs)}
+            if page:
+                result['messages'] = page
+            if start + size < len(refs):
+                result['nextPageToken'] = str(start + size)
+            return result
+
+        return gmail._request('gmail.users.messages.list', handler)
+
+    def get(self, userId, id, fields=None, format=None):
+        gmail = self.gmail
+
+        def handler():
+            message = gmail.messages_by_id.get(id)
+            if message is None:
+                raise make_http_error(404, 'notFound', 'Requested entity was not found.')
+            return {'id': id, 'internalDate': message['internalDate'],
+                    'payload': {'mimeType': 'text/html', 'body': {'data': message['data']}}}
+
+        return gmail._request('gmail.users.messages.get', handler)
+
+class _GmailHistory:
+    def __init__(self, gmail):
+        self.gmail = gmail
+
+    def list(self, userId, startHistoryId, historyTypes=None, pageToken=None, fields=None):
+        gmail = self.gmail
+
+        def handler():
+            if int(startHistoryId) < gmail.oldest_history_id:
+                raise make_http_error(404, 'notFound', 'Requested entity was not found.')
+            added = sorted((m for m in gmail.messages_by_id.values() if m['historyId'] > int(startHistoryId)),
+                           key=lambda m: m['historyId'])
+            records = [{'id': str(m['historyId']), 'messagesAdded': [{'message': {'id': m['id']}}]}
+                       for m in added]
+            page, next_token = gmail._page(records, pageToken)
+            result = {'historyId': str(gmail.history_id)}
+            if page:
+                result['history'] = page
+            if next_token:
+                result['nextPageToken'] = next_token
+            return result
+
+        return gmail._request('gmail.users.history.list', handler)
+
+def _parse_time(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+class FakeCalendar(_FakeService):
+    """
+    Stand-in for build('calendar', 'v3').
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calendar_entries = {'primary': {'id': 'primary', 'summary': 'Primary'}}
+        # calendar_id -> {event_id: event}; deleted events stay as cancelled tombstones
+        self.events_by_calendar = {'primary': {}}
+        self.sequence = 0
+        self._ids = itertools.count(1)
+
+    def add_calendar(self, summary):
+        """
+        Adds a calendar directly (no API call is counted). Returns its ID.
+        """
+        with self.lock:
+            calendar_id = f"cal{next(self._ids):06d}@group.calendar.google.com"
+            self.calendar_entries[calendar_id] = {'id': calendar_id, 'summary': summary}
+            self.events_by_calendar[calendar_id] = {}
+            return calendar_id
+
+    def live_events(self, calendar_id):
+        """
+        Returns the calendar's events that are not deleted, in start time order.
+        """
+        with self.lock:
+            events = [e for e in self.events_by_calendar[calendar_id].values() if e['status'] != 'cancelled']
+            return sorted(events, key=lambda e: _parse_time(e['start']['dateTime']))
+
+    def _events(self, calendar_id):
+        events = self.events_by_calendar.get(calendar_id)
+        if events is None:
+            raise make_http_error(404, 'notFound', 'Not Found')
+        return events
+
+    def _store(self, calendar_id, event_id, body):
+        self.sequence += 1
+        event = dict(body, id=event_id, status='confirmed', sequence_number=self.sequence,
+                     htmlLink=f"https://calendar.example/{event_id}")
+        self._events(calendar_id)[event_id] = event
+        return {key: value for key, value in event.items() if key != 'sequence_number'}
+
+    def calendarList(self):
+        return _CalendarList(self)
+
+    def calendars(self):
+        return _Calendars(self)
+
+    def events(self):
+        return _Events(self)
+
+class _CalendarList:
+    def __init__(self, calendar):
+        self.calendar = calendar
+
+    def list(self, pageToken=None, fields=None):
+        calendar = self.calendar
+
+        def handler():
+            page, next_token = calendar._page(list(calendar.calendar_entries.values()), pageToken)
+            result = {'items': [dict(entry) for entry in page]}
+            if next_token:
+                result['nextPageToken'] = next_token
+            return result
+
+        return calendar._request('calendar.calendarList.list', handler)
+
+class _Calendars:
+    def __init__(self, calendar):
+        self.calendar = calendar
+
+    def insert(self, body, fields=None):
+        calendar = self.calendar
+
+        def handler():
+            calendar_id = f"cal{next(calendar._ids):06d}@group.calendar.google.com"
+            calendar.calendar_entries[calendar_id] = {'id': calendar_id, 'summary': body['summary']}
+            calendar.events_by_calendar[calendar_id] = {}
+            return {'id': calendar_id, 'summary': body['summary']}
+
+        return calendar._request('calendar.calendars.insert', handler)
+
+class _Events:
+    def __init__(self, calendar):
+        self.calendar = calendar
+
+    def list(self, calendarId, timeMin=None, timeMax=None, singleEvents=None, orderBy=None,
+             pageToken=None, syncToken=None, fields=None, showDeleted=None):
+        calendar = self.calendar
+
+        def handler():
+            events = calendar._events(calendarId)
+            if syncToken is not None:
+                token_calendar, _, token_sequence = syncToken.rpartition(':')
+                if token_calendar != calendarId or not token_sequence.isdigit():
+                    raise make_http_error(410, 'fullSyncRequired', 'Sync token is no longer valid.')
+                # Incremental sync includes deletions
+                items = [e for e in events.values() if e['sequence_number'] > int(token_sequence)]
+            else:
+                items = [e for e in events.values() if e['status'] != 'cancelled']
+                if timeMin:
+                    items = [e for e in items if _parse_time(e['end']['dateTime']) > _parse_time(timeMin)]
+                if timeMax:
+                    items = [e for e in items if _parse_time(e['start']['dateTime']) < _parse_time(timeMax)]
+            items.sort(key=lambda e: (e['status'] == 'cancelled', e.get('start') and _parse_time(e['start']['dateTime'])))
+
+            page, next_token = calendar._page(items, pageToken)
+            result = {'items': [{key: value for key, value in e.items() if key != 'sequence_number'} for e in page]}
+            if next_token:
+                result['nextPageToken'] = next_token
+            else:
+                result['nextSyncToken'] = f"{calendarId}:{calendar.sequence}"
+            return result
+
+        return calendar._request('calendar.events.list', handler)
+
+    def insert(self, calendarId, body, fields=None):
+        calendar = self.calendar
+
+        def handler():
+            event_id = body.get('id') or f"evt{next(calendar._ids):06d}"
+            # Like the real API, IDs of deleted events stay taken
+            if event_id in calendar._events(calendarId):
+                raise make_http_error(409, 'duplicate', 'The requested identifier already exists.')
+            return calendar._store(calendarId, event_id, body)
+
+        return calendar._request('calendar.events.insert', handler)
+
+    def update(self, calendarId, eventId, body, fields=None):
+        calendar = self.calendar
+
+        def handler():
+            event = calendar._events(calendarId).get(eventId)
+            # A deleted event can only be restored by setting its status back
+            if event is None or (event['status'] == 'cancelled' and body.get('status') != 'confirmed'):
+                raise make_http_error(404, 'notFound', 'Not Found')
+            return calendar._store(calendarId, eventId, body)
+
+        return calendar._request('calendar.events.update', handler)
+
+    def delete(self, calendarId, eventId):
+        calendar = self.calendar
+
+        def handler():
+            event = calendar._events(calendarId).get(eventId)
+            if event is None or event['status'] == 'cancelled':
+                raise make_http_error(410, 'deleted', 'Resource has been deleted')
+            calendar.sequence += 1
+            calendar._events(calendarId)[eventId] = {'id': eventId, 'status': 'cancelled',
+                                                      'sequence_number': calendar.sequence}
+            return ''
+
+        return calendar._request('calendar.events.delete', handler)
@@ -0,0 +1,152 @@
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from gmail_service import get_gmail_service
+from calendar_service import get_calendar_service, get_or_create_calendar, parse_calendar_targets
+from services import drop_services
+from sync import sync_new_emails, calendar_destination
+from transport import bytes_received
+from metrics import get_metrics, write_metrics
+from tenants import load_roster, ROSTER_FILE
+
+# A failing account is retried after RETRY_DELAY seconds, doubling up to MAX_RETRY_DELAY
+RETRY_DELAY = 60
+MAX_RETRY_DELAY = 3600
+
+def log(tenant, message):
+    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} [{tenant['name']}] {message}")
+
+def open_services(tenant):
+    """
+    Returns the account's Gmail and Calendar services. They are built once
+    and share the account's credentials, which are refreshed ahead of expiry.
+    Never starts an interactive login.
+    """
+    return (get_gmail_service(tenant['token_file'], interactive=False),
+            get_calendar_service(tenant['token_file'], interactive=False))
+
+def sync_tenant(tenant, session):
+    """
+    Syncs one account. session is a dict that keeps the account's calendar
+    IDs between syncs, so they are only looked up once.
+    Any error is logged and dropped, so it can't affect other accounts.
+    Returns True if the sync succeeded.
+    """
+    try:
+        gmail_service, calendar_service = open_services(tenant)
+
+        def open_calendar():
+            if 'targets' not in session:
+                session['targets'] = parse_calendar_targets(tenant['calendar_id']) or [
+                    (get_or_create_calendar(calendar_service, tenant['calendar_name']), None)]
+            return calendar_service, session['targets']
+
+        os.makedirs(tenant['state_dir'], exist_ok=True)
+        counts = sync_new_emails(gmail_service, open_calendar, state_dir=tenant['state_dir'],
+                                 summary=tenant['event_summary'],
+                                 destination=calendar_destination(tenant['calendar_id'], tenant['calendar_name']))
+    except Exception as e:
+        log(tenant, f"Sync failed: {e}")
+        # Reload the token and rebuild the services next time, in case they are what broke
+        session.clear()
+        drop_services(tenant['token_file'])
+        return False
+
+    if counts is not None:
+        added, updated, deleted, unchanged = counts
+        log(tenant, f"Added: {added}, Updated: {updated}, Deleted: {deleted}, Unchanged: {unchanged}")
+    return True
+
+def run_daemon(tenants, workers=4, once=False, stop=None, metrics_dir=None):
+    """
+    Syncs every account on its own interval until stop (a threading.Event) is set.
+    Syncs run on a shared pool of `workers` threads, and an account is never
+    synced twice at the same time. Failing accounts are retried with
+    exponential backoff. With once=True, every account is synced once.
+    If metrics_dir is given, the metrics of all syncs so far are written
+    there after every sync.
+    """
+    stop = stop or threading.Event()
+    sessions = {tenant['name']: {} for tenant in tenants}
+    failures = {tenant['name']: 0 for tenant in tenants}
+    next_run = {tenant['name']: time.monotonic() for tenant in tenants}
+    running = {}
+    finished = set()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while not stop.is_set():
+            now = time.monotonic()
+            for tenant in tenants:
+                name = tenant['name']
+                if name in running or next_run[name] > now or (once and name in finished):
+                    continue
+                running[name] = (tenant, pool.submit(sync_tenant, tenant, sessions[name]))
+
+            if once and not running:
+                break
+
+            # Wake up when the next account is due, a sync finishes or at least once a second
+            idle = [next_run[t['name']] for t in tenants if t['name'] not in running]
+            delay = min([1] + [max(0, due - now) for due in idle])
+            if running:
+                done, _ = wait([future for _, future in running.values()], timeout=delay,
+                               return_when=FIRST_COMPLETED)
+            else:
+                stop.wait(delay)
+                done = set()
+
+            now = time.monotonic()
+            for name, (tenant, future) in list(running.items()):
+                if future not in done:
+                    continue
+                del running[name]
+                finished.add(name)
+                if future.result():
+                    failures[name] = 0
+                    next_run[name] = now + tenant['interval']
+                else:
+                    failures[name] += 1
+                    next_run[name] = now + min(MAX_RETRY_DELAY, RETRY_DELAY * 2 ** (failures[name] - 1))
+                    if not once:
+                        log(tenant, f"Retrying in {next_run[name] - now:.0f}s")
+
+            if done and metrics_dir:
+                try:
+                    write_metrics(get_metrics(bytes_received()), metrics_dir, run='daemon')
+                except OSError as e:
+                    print(f"Could not write metrics to {metrics_dir}: {e}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Keep the schedules of many accounts in sync from one process.")
+    parser.add_argument('--roster', default=ROSTER_FILE,
+                        help=f"JSON list of accounts to sync (default: {ROSTER_FILE}).")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="Number of accounts synced at the same time (default: 4).")
+    parser.add_argument('--once', action='store_true',
+                        help="Sync every account once and exit.")
+    parser.add_argument('--metrics-dir', default=None,
+                        help="Directory the JSON and Prometheus metrics files are written to after every sync.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    tenants = load_roster(args.roster)
+    print(f"Syncing {len(tenants)} accounts with {args.workers} workers")
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    run_daemon(tenants, workers=args.workers, once=args.once, stop=stop, metrics_dir=args.metrics_dir)
+    print("Stopped")
+
+if __name__ == '__main__':
+    main()
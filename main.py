@@ -1,3 +1,4 @@
+import argparse
 import sys
 import os
 from datetime import datetime
@@ -9,55 +10,107 @@ load_dotenv()
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
-from gmail_service import get_gmail_service, search_schedule_emails
-from calendar_service import get_calendar_service, get_or_create_calendar
-from processor import process_messages
+from gmail_service import get_gmail_service
+from transport import bytes_received
+from metrics import stage, reset_metrics, get_metrics, format_summary, write_metrics
+from sync import sync_new_emails, calendar_destination
 
-def main():
+def print_finished(start_time, status, metrics_dir=None):
+    end_time = datetime.now()
+    duration = (end_time - start_time).total_seconds()
+    metrics = get_metrics(bytes_received(), duration, succeeded=status == "successfully")
+    print(format_summary(metrics))
+    if metrics_dir:
+        try:
+            write_metrics(metrics, metrics_dir)
+        except OSError as e:
+            print(f"Could not write metrics to {metrics_dir}: {e}")
+    print("=" * 60)
+    print(f"Finished {status}: {end_time.strftime('%Y-%m-%d %H:%M:%S')} (Duration: {duration:.2f}s)")
+    print("=" * 60)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sync schedule emails from Gmail to Google Calendar.")
+    parser.add_argument('--force', action='store_true',
+                        help="Reprocess recent emails even if they were already applied.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of threads used to fetch emails and write events (default: 1).")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Print the calendar changes that would be made without making them.")
+    parser.add_argument('--metrics-dir', default='.',
+                        help="Directory the JSON and Prometheus metrics files are written to (default: current directory).")
+    parser.add_argument('--ics', metavar='PATH',
+                        help="Write the schedule to this .ics file instead of Google Calendar.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    reset_metrics()
     start_time = datetime.now()
     print("=" * 60)
     print(f"Schedule Automation Started: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
     print("=" * 60)
-    
+
     print("Authenticating with Google Services...")
     try:
-        gmail_service = get_gmail_service()
-        calendar_service = get_calendar_service()
-        
-        # Get calendar ID from environment variable or create/find by name
-        calendar_id = os.environ.get('CALENDAR_ID')
-        if calendar_id:
-            print(f"Using calendar ID from CALENDAR_ID env var: {calendar_id}")
+        with stage('auth'):
+            gmail_service = get_gmail_service()
+    except Exception as e:
+        print(f"Authentication/Setup failed: {e}")
+        print("Please ensure you have 'credentials.json' in the project root.")
+        print_finished(start_time, "(with errors)", args.metrics_dir)
+        return
+
+    def open_calendar():
+        # Imported here: runs without new emails never touch the calendar
+        from calendar_service import get_calendar_service, get_or_create_calendar, find_calendar, parse_calendar_targets
+        with stage('auth'):
+            calendar_service = get_calendar_service()
+
+        # Get calendar IDs from environment variable or create/find by name
+        targets = parse_calendar_targets(os.environ.get('CALENDAR_ID'))
+        if targets:
+            print(f"Using calendar IDs from CALENDAR_ID env var: {', '.join(calendar_id for calendar_id, _ in targets)}")
         else:
             calendar_name = os.environ.get('CALENDAR_NAME', 'Work Schedule')
-            calendar_id = get_or_create_calendar(calendar_service, calendar_name)
+            if not args.dry_run:
+                calendar_id = get_or_create_calendar(calendar_service, calendar_name)
+            else:
+                # A dry run makes no writes, so a missing calendar is planned against as empty
+                calendar_id = find_calendar(calendar_service, calendar_name)
+                if calendar_id is None:
+                    print(f"Calendar {calendar_name} doesn't exist yet, it would be created")
             print(f"Using calendar: {calendar_name} (ID: {calendar_id})")
-        
+            targets = [(calendar_id, None)]
+        return calendar_service, targets
+
+    sink = None
+    if args.ics:
+        from ics_sink import IcsSink
+        sink = IcsSink(args.ics, os.environ.get('CALENDAR_NAME', 'Work Schedule'))
+        print(f"Writing the schedule to {args.ics}")
+
+    print("Checking for new schedule emails...")
+    try:
+        destination = calendar_destination(os.environ.get('CALENDAR_ID'),
+                                           os.environ.get('CALENDAR_NAME', 'Work Schedule'))
+        counts = sync_new_emails(gmail_service, open_calendar, force=args.force, workers=args.workers,
+                                 dry_run=args.dry_run, sink=sink, destination=destination)
     except Exception as e:
-        print(f"Authentication/Setup failed: {e}")
-        print("Please ensure you have 'credentials.json' in the project root.")
-        end_time = datetime.now()
-        duration = (end_time - start_time).total_seconds()
-        print("=" * 60)
-        print(f"Finished (with errors): {end_time.strftime('%Y-%m-%d %H:%M:%S')} (Duration: {duration:.2f}s)")
-        print("=" * 60)
+        print(f"Sync failed: {e}")
+        print_finished(start_time, "(with errors)", args.metrics_dir)
         return
 
-    print("Searching for recent schedule emails...")
-    # Search last 2 months, max 10 results
-    messages = search_schedule_emails(gmail_service, max_results=10, newer_than='2m')
-    
-    if not messages:
-        print("No schedule emails found.")
-    else:
-        added, updated, deleted = process_messages(gmail_service, calendar_service, calendar_id, messages)
-        print(f"\nDone! Added: {added}, Updated: {updated}, Deleted: {deleted}")
-    
-    end_time = datetime.now()
-    duration = (end_time - start_time).total_seconds()
-    print("=" * 60)
-    print(f"Finished successfully: {end_time.strftime('%Y-%m-%d %H:%M:%S')} (Duration: {duration:.2f}s)")
-    print("=" * 60)
+    if counts is not None:
+        added, updated, deleted, unchanged = counts
+        if args.dry_run:
+            print(f"\nDry run, nothing was changed. Would add: {added}, update: {updated}, delete: {deleted}, "
+                  f"leave unchanged: {unchanged}")
+        else:
+            print(f"\nDone! Added: {added}, Updated: {updated}, Deleted: {deleted}, Unchanged: {unchanged}")
+
+    print(f"Received {bytes_received() / 1024:.1f} KB from Google APIs")
+    print_finished(start_time, "successfully", args.metrics_dir)
 
 if __name__ == '__main__':
     main()
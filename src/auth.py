@@ -1,7 +1,5 @@
 import os.path
-from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
 
 # If modifying these scopes, delete the file token.json.
 SCOPES = [
@@ -9,30 +7,37 @@ SCOPES = [
     'https://www.googleapis.com/auth/calendar'
 ]
 
-def get_credentials():
-    """Gets valid user credentials from storage or initiates OAuth flow."""
+def get_credentials(token_path='token.json', credentials_path='credentials.json', interactive=True):
+    """Gets valid user credentials from storage or initiates OAuth flow.
+    With interactive=False (e.g. in the daemon) the OAuth flow is never started;
+    an account without a usable token raises PermissionError instead."""
     creds = None
     # The file token.json stores the user's access and refresh tokens, and is
     # created automatically when the authorization flow completes for the first
     # time.
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+    if os.path.exists(token_path):
+        creds = Credentials.from_authorized_user_file(token_path, SCOPES)
     
     # If there are no (valid) credentials available, let the user log in.
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
+            # Imported here: requests is slow to import and most runs have a valid token
+            from google.auth.transport.requests import Request
             creds.refresh(Request())
         else:
-            if not os.path.exists('credentials.json'):
+            if not interactive:
+                raise PermissionError(f"{token_path} is missing or can't be refreshed, log in interactively first.")
+            if not os.path.exists(credentials_path):
                 raise FileNotFoundError(
                     "credentials.json not found. Please download it from Google Cloud Console."
                 )
+            from google_auth_oauthlib.flow import InstalledAppFlow
             flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
+                credentials_path, SCOPES)
             creds = flow.run_local_server(port=0)
         
         # Save the credentials for the next run
-        with open('token.json', 'w') as token:
+        with open(token_path, 'w') as token:
             token.write(creds.to_json())
             
     return creds
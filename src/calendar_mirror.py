@@ -0,0 +1,130 @@
+import json
+import sqlite3
+from datetime import datetime
+from googleapiclient.errors import HttpError
+from calendar_service import get_event_date, EVENT_FIELDS
+from transport import execute
+
+# Stored next to token.json, a local copy of the target calendar's events
+MIRROR_FILE = 'calendar_mirror.db'
+
+def open_mirror(path=MIRROR_FILE):
+    """
+    Opens (and creates if needed) the local calendar mirror.
+    The connection may be handed to another thread, as long as only one
+    thread uses it at a time.
+    """
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS events ('
+        ' calendar_id TEXT NOT NULL,'
+        ' event_id TEXT NOT NULL,'
+        ' summary TEXT,'
+        ' start_date TEXT,'
+        ' start_ts REAL,'
+        ' body TEXT NOT NULL,'
+        ' PRIMARY KEY (calendar_id, event_id))'
+    )
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS sync_tokens ('
+        ' calendar_id TEXT PRIMARY KEY,'
+        ' token TEXT NOT NULL)'
+    )
+    conn.commit()
+    return conn
+
+def _store_event(conn, calendar_id, event):
+    """
+    Inserts or replaces an event in the mirror, or removes it if it was cancelled.
+    """
+    if event.get('status') == 'cancelled' or 'start' not in event:
+        _remove_event(conn, calendar_id, event['id'])
+        return
+    start = event['start']
+    if 'dateTime' in start:
+        start_ts = datetime.fromisoformat(start['dateTime'].replace('Z', '+00:00')).timestamp()
+    else:
+        start_ts = None
+    conn.execute(
+        'INSERT OR REPLACE INTO events (calendar_id, event_id, summary, start_date, start_ts, body)'
+        ' VALUES (?, ?, ?, ?, ?, ?)',
+        (calendar_id, event['id'], event.get('summary'), get_event_date(event).isoformat(),
+         start_ts, json.dumps(event))
+    )
+
+def _remove_event(conn, calendar_id, event_id):
+    conn.execute('DELETE FROM events WHERE calendar_id = ? AND event_id = ?', (calendar_id, event_id))
+
+def sync_mirror(conn, service, calendar_id):
+    """
+    Brings the mirror up to date with the calendar.
+    Uses the saved sync token to download only events changed since the last sync.
+    Does a full sync the first time, or when the token was invalidated (410 Gone).
+    Returns the number of changed events that were downloaded.
+    """
+    row = conn.execute('SELECT token FROM sync_tokens WHERE calendar_id = ?', (calendar_id,)).fetchone()
+    sync_token = row[0] if row else None
+
+    try:
+        changed = _download_changes(conn, service, calendar_id, sync_token)
+    except HttpError as e:
+        if e.resp.status != 410:
+            raise
+        print("Calendar sync token expired, doing a full resync.")
+        conn.rollback()
+        changed = _download_changes(conn, service, calendar_id, None)
+
+    conn.commit()
+    return changed
+
+def _download_changes(conn, service, calendar_id, sync_token):
+    if sync_token is None:
+        # Full sync starts from an empty mirror
+        conn.execute('DELETE FROM events WHERE calendar_id = ?', (calendar_id,))
+
+    changed = 0
+    page_token = None
+    while True:
+        kwargs = {'calendarId': calendar_id, 'singleEvents': True, 'pageToken': page_token,
+                  'fields': f'items({EVENT_FIELDS}),nextPageToken,nextSyncToken'}
+        if sync_token:
+            kwargs['syncToken'] = sync_token
+        result = execute(service.events().list(**kwargs))
+
+        for event in result.get('items', []):
+            _store_event(conn, calendar_id, event)
+            changed += 1
+
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            break
+
+    conn.execute('INSERT OR REPLACE INTO sync_tokens (calendar_id, token) VALUES (?, ?)',
+                 (calendar_id, result['nextSyncToken']))
+    return changed
+
+def get_mirrored_events(conn, calendar_id, start_date, end_date, summary):
+    """
+    Gets all mirrored events with the given summary between two dates (inclusive).
+    Returns event objects in start time order, like get_events_in_range.
+    """
+    rows = conn.execute(
+        'SELECT body FROM events WHERE calendar_id = ? AND summary = ?'
+        ' AND start_date BETWEEN ? AND ? ORDER BY start_ts',
+        (calendar_id, summary, start_date.isoformat(), end_date.isoformat())
+    ).fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+def record_writes(conn, calendar_id, operations, results):
+    """
+    Applies the outcome of calendar writes to the mirror, so later lookups in
+    the same run see them without another sync.
+    """
+    for operation, (response, error) in zip(operations, results):
+        if error is not None:
+            continue
+        if operation[0] == 'delete':
+            _remove_event(conn, calendar_id, operation[1])
+        elif isinstance(response, dict) and 'id' in response:
+            _store_event(conn, calendar_id, response)
+    conn.commit()
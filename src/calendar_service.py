@@ -1,38 +1,104 @@
-from googleapiclient.discovery import build
-from auth import get_credentials
+from services import get_service
+from transport import execute, run_batch
 from datetime import timedelta
 from dateutil import tz
+from googleapiclient.errors import HttpError
+from events import ShiftEvent, CalendarEvent, BUDAPEST
+import base64
+import hashlib
 import os
 
-def get_calendar_service():
-    creds = get_credentials()
-    service = build('calendar', 'v3', credentials=creds)
-    return service
+# Maximum number of calls the Calendar API accepts in one batch request
+BATCH_SIZE = 50
 
-def get_or_create_calendar(service, calendar_name='Work Schedule'):
+# Partial-response masks: only download the fields the code actually reads
+EVENT_FIELDS = 'id,status,htmlLink,summary,description,start,end'
+EVENT_LIST_FIELDS = f'items({EVENT_FIELDS}),nextPageToken'
+
+def get_calendar_service(token_path='token.json', interactive=True):
+    return get_service('calendar', 'v3', token_path, interactive)
+
+def parse_calendar_targets(value):
     """
-    Returns the ID of the calendar with the given name.
-    If it doesn't exist, creates it.
+    Parses a comma-separated list of calendars to write to, e.g.
+    "primary,team@group.calendar.google.com=Team shift". Each entry is a
+    calendar ID, optionally followed by =summary for the title of its events.
+    Returns a list of (calendar_id, summary) tuples; summary is None when not given.
+    """
+    targets = []
+    for entry in (value or '').split(','):
+        calendar_id, _, summary = entry.partition('=')
+        if calendar_id.strip():
+            targets.append((calendar_id.strip(), summary.strip() or None))
+    return targets
+
+def find_calendar(service, calendar_name='Work Schedule'):
+    """
+    Returns the ID of the calendar with the given name, or None if there is none.
     """
-    # List all calendars
     page_token = None
     while True:
-        calendar_list = service.calendarList().list(pageToken=page_token).execute()
+        calendar_list = execute(service.calendarList().list(pageToken=page_token,
+                                                            fields='items(id,summary),nextPageToken'))
         for calendar_list_entry in calendar_list['items']:
             if calendar_list_entry['summary'] == calendar_name:
                 return calendar_list_entry['id']
         page_token = calendar_list.get('nextPageToken')
         if not page_token:
-            break
-            
+            return None
+
+def get_or_create_calendar(service, calendar_name='Work Schedule'):
+    """
+    Returns the ID of the calendar with the given name.
+    If it doesn't exist, creates it.
+    """
+    calendar_id = find_calendar(service, calendar_name)
+    if calendar_id is not None:
+        return calendar_id
+
     # If not found, create it
     calendar = {
         'summary': calendar_name,
         'timeZone': 'Europe/Budapest'
     }
-    created_calendar = service.calendars().insert(body=calendar).execute()
+    created_calendar = execute(service.calendars().insert(body=calendar, fields='id'))
     return created_calendar['id']
 
+def _list_events(service, calendar_id, time_min, time_max):
+    """
+    Lists all events between time_min and time_max (RFC 3339 strings),
+    following nextPageToken so no page of results is dropped.
+    """
+    events = []
+    page_token = None
+    while True:
+        events_result = execute(service.events().list(calendarId=calendar_id, timeMin=time_min,
+                                                      timeMax=time_max, singleEvents=True,
+                                                      orderBy='startTime', pageToken=page_token,
+                                                      fields=EVENT_LIST_FIELDS))
+        events.extend(events_result.get('items', []))
+        page_token = events_result.get('nextPageToken')
+        if not page_token:
+            break
+    return events
+
+def get_event_date(event):
+    """
+    Returns the (Budapest local) date on which a calendar event starts.
+    """
+    return CalendarEvent.of(event).date()
+
+def build_day_index(events):
+    """
+    Indexes calendar events by the date they start on, as lists of
+    CalendarEvent objects (in the order given), so their times are parsed once.
+    """
+    index = {}
+    for event in events:
+        event = CalendarEvent.of(event)
+        index.setdefault(event.date(), []).append(event)
+    return index
+
 def get_existing_event(service, calendar_id, start_time, end_time, summary=None):
     """
     Checks if an event with the same summary exists on the same day.
@@ -41,11 +107,10 @@ def get_existing_event(service, calendar_id, start_time, end_time, summary=None)
     if summary is None:
         summary = os.environ.get('EVENT_SUMMARY', 'Work at McDonald\'s')
     # Ensure start_time and end_time are timezone aware (Budapest)
-    budapest_tz = tz.gettz('Europe/Budapest')
     if start_time.tzinfo is None:
-        start_time = start_time.replace(tzinfo=budapest_tz)
+        start_time = start_time.replace(tzinfo=BUDAPEST)
     if end_time.tzinfo is None:
-        end_time = end_time.replace(tzinfo=budapest_tz)
+        end_time = end_time.replace(tzinfo=BUDAPEST)
         
     # We want to check the whole day to find if there was a previous schedule
     # Construct start and end of the day for the query
@@ -55,10 +120,7 @@ def get_existing_event(service, calendar_id, start_time, end_time, summary=None)
     time_min = day_start.astimezone(tz.UTC).isoformat().replace('+00:00', 'Z')
     time_max = day_end.astimezone(tz.UTC).isoformat().replace('+00:00', 'Z')
     
-    events_result = service.events().list(calendarId=calendar_id, timeMin=time_min,
-                                        timeMax=time_max, singleEvents=True,
-                                        orderBy='startTime').execute()
-    events = events_result.get('items', [])
+    events = _list_events(service, calendar_id, time_min, time_max)
 
     for event in events:
         if event['summary'] == summary:
@@ -74,7 +136,6 @@ def get_events_in_range(service, calendar_id, start_date, end_date, summary=None
     if summary is None:
         summary = os.environ.get('EVENT_SUMMARY', 'Work at McDonald\'s')
     from datetime import datetime
-    budapest_tz = tz.gettz('Europe/Budapest')
     
     # Convert date to datetime if needed
     if not isinstance(start_date, datetime):
@@ -84,9 +145,9 @@ def get_events_in_range(service, calendar_id, start_date, end_date, summary=None
     
     # Ensure dates are timezone aware
     if start_date.tzinfo is None:
-        start_date = start_date.replace(tzinfo=budapest_tz)
+        start_date = start_date.replace(tzinfo=BUDAPEST)
     if end_date.tzinfo is None:
-        end_date = end_date.replace(tzinfo=budapest_tz)
+        end_date = end_date.replace(tzinfo=BUDAPEST)
     
     # Set to start and end of days
     day_start = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -95,10 +156,7 @@ def get_events_in_range(service, calendar_id, start_date, end_date, summary=None
     time_min = day_start.astimezone(tz.UTC).isoformat().replace('+00:00', 'Z')
     time_max = day_end.astimezone(tz.UTC).isoformat().replace('+00:00', 'Z')
     
-    events_result = service.events().list(calendarId=calendar_id, timeMin=time_min,
-                                        timeMax=time_max, singleEvents=True,
-                                        orderBy='startTime').execute()
-    events = events_result.get('items', [])
+    events = _list_events(service, calendar_id, time_min, time_max)
     
     # Filter by summary
     return [event for event in events if event.get('summary') == summary]
@@ -107,37 +165,75 @@ def delete_event(service, calendar_id, event_id):
     """
     Deletes a calendar event.
     """
-    service.events().delete(calendarId=calendar_id, eventId=event_id).execute()
+    execute(service.events().delete(calendarId=calendar_id, eventId=event_id))
     print(f"Event deleted: {event_id}")
 
-def update_event(service, calendar_id, event_id, event_data):
+def build_event_body(event_data):
     """
-    Updates an existing calendar event.
+    Builds the Calendar API event resource for the given event data
+    (a ShiftEvent, or a dict with the same keys).
     """
-    start_dt = event_data['start']
-    end_dt = event_data['end']
-    
-    # Ensure timezone awareness
-    budapest_tz = tz.gettz('Europe/Budapest')
-    if start_dt.tzinfo is None:
-        start_dt = start_dt.replace(tzinfo=budapest_tz)
-    if end_dt.tzinfo is None:
-        end_dt = end_dt.replace(tzinfo=budapest_tz)
-
-    event = {
-        'summary': event_data['summary'],
-        'description': event_data['description'],
+    shift = ShiftEvent.of(event_data)
+    return {
+        'summary': shift.summary,
+        'description': shift.description,
         'start': {
-            'dateTime': start_dt.isoformat(),
+            'dateTime': shift.aware_start.isoformat(),
             'timeZone': 'Europe/Budapest',
         },
         'end': {
-            'dateTime': end_dt.isoformat(),
+            'dateTime': shift.aware_end.isoformat(),
             'timeZone': 'Europe/Budapest',
         },
     }
+
+def event_id(calendar_id, event_data):
+    """
+    Returns the ID a new event is created with. It is derived from the
+    calendar, date and summary, so an insert that is retried after it already
+    went through is rejected as a duplicate instead of adding a second event.
+    Event IDs use the base32hex alphabet (a-v, 0-9).
+    """
+    shift = ShiftEvent.of(event_data)
+    key = f"{calendar_id}|{shift.date().isoformat()}|{shift.summary}"
+    digest = hashlib.sha1(key.encode('utf-8')).digest()
+    return base64.b32hexencode(digest).decode('ascii').lower().rstrip('=')
+
+def _insert_body(calendar_id, event_data):
+    body = build_event_body(event_data)
+    body['id'] = event_id(calendar_id, event_data)
+    return body
+
+def _is_duplicate(error):
+    """
+    Checks if an insert failed because an event with its ID already exists.
+    """
+    return isinstance(error, HttpError) and error.resp.status == 409
+
+def _overwrite_request(service, calendar_id, body):
+    """
+    Builds the update that writes an insert's body over the existing event
+    with the same ID: the insert itself on a retry, or an event deleted since,
+    which the confirmed status restores.
+    """
+    return service.events().update(calendarId=calendar_id, eventId=body['id'],
+                                   body=dict(body, status='confirmed'), fields=EVENT_FIELDS)
+
+def event_matches(event, event_data):
+    """
+    Checks if a calendar event already has the start, end, summary and
+    description of the given event data, so updating it would be a no-op.
+    """
+    return CalendarEvent.of(event).matches(ShiftEvent.of(event_data))
+
+def update_event(service, calendar_id, event_id, event_data):
+    """
+    Updates an existing calendar event.
+    """
+    event = build_event_body(event_data)
     
-    updated_event = service.events().update(calendarId=calendar_id, eventId=event_id, body=event).execute()
+    updated_event = execute(service.events().update(calendarId=calendar_id, eventId=event_id, body=event,
+                                                    fields=EVENT_FIELDS))
     print(f"Event updated: {updated_event.get('htmlLink')}")
     return updated_event
 
@@ -146,29 +242,49 @@ def create_event(service, calendar_id, event_data):
     Creates a calendar event.
     event_data: {'summary': str, 'start': datetime, 'end': datetime, 'description': str}
     """
-    start_dt = event_data['start']
-    end_dt = event_data['end']
-    
-    # Ensure timezone awareness
-    budapest_tz = tz.gettz('Europe/Budapest')
-    if start_dt.tzinfo is None:
-        start_dt = start_dt.replace(tzinfo=budapest_tz)
-    if end_dt.tzinfo is None:
-        end_dt = end_dt.replace(tzinfo=budapest_tz)
-
-    event = {
-        'summary': event_data['summary'],
-        'description': event_data['description'],
-        'start': {
-            'dateTime': start_dt.isoformat(),
-            'timeZone': 'Europe/Budapest',
-        },
-        'end': {
-            'dateTime': end_dt.isoformat(),
-            'timeZone': 'Europe/Budapest',
-        },
-    }
+    body = _insert_body(calendar_id, event_data)
     
-    event = service.events().insert(calendarId=calendar_id, body=event).execute()
+    try:
+        event = execute(service.events().insert(calendarId=calendar_id, body=body, fields=EVENT_FIELDS))
+    except HttpError as e:
+        if not _is_duplicate(e):
+            raise
+        event = execute(_overwrite_request(service, calendar_id, body))
     print(f"Event created: {event.get('htmlLink')}")
     return event
+
+def _build_write_request(service, calendar_id, operation):
+    """
+    Builds (without executing) the API request for a single write operation.
+    """
+    action = operation[0]
+    if action == 'create':
+        return service.events().insert(calendarId=calendar_id, body=_insert_body(calendar_id, operation[1]),
+                                       fields=EVENT_FIELDS)
+    if action == 'update':
+        return service.events().update(calendarId=calendar_id, eventId=operation[1],
+                                       body=build_event_body(operation[2]), fields=EVENT_FIELDS)
+    if action == 'delete':
+        return service.events().delete(calendarId=calendar_id, eventId=operation[1])
+    raise ValueError(f"Unknown calendar operation: {action}")
+
+def execute_batch(service, calendar_id, operations, batch_size=BATCH_SIZE):
+    """
+    Applies calendar write operations using HTTP batch requests.
+    operations: list of ('create', event_data), ('update', event_id, event_data)
+                or ('delete', event_id) tuples.
+    Returns a list of (response, exception) tuples in the same order as operations.
+    Exactly one of the two is set for each operation.
+    Creates that fail because their event already exists are written over it.
+    """
+    requests = [_build_write_request(service, calendar_id, operation) for operation in operations]
+    results = run_batch(service, requests, batch_size)
+
+    duplicates = [index for index, (_, error) in enumerate(results)
+                  if operations[index][0] == 'create' and _is_duplicate(error)]
+    if duplicates:
+        overwrites = [_overwrite_request(service, calendar_id, _insert_body(calendar_id, operations[index][1]))
+                      for index in duplicates]
+        for index, result in zip(duplicates, run_batch(service, overwrites, batch_size)):
+            results[index] = result
+    return results
@@ -0,0 +1,54 @@
+import os
+from datetime import date
+from sync_state import load_state, save_state
+
+# Written by backfill.py after every applied page of emails, removed once the backfill finishes
+CHECKPOINT_FILE = 'backfill_checkpoint.json'
+
+def save_checkpoint(message_id, position, counts, settled, path=CHECKPOINT_FILE):
+    """
+    Records that every email up to and including message_id (the position-th
+    email, newest first) was applied, with the cumulative counts and the
+    dates those emails settled.
+    """
+    save_state({
+        'message_id': message_id,
+        'position': position,
+        'counts': list(counts),
+        'settled': sorted(day.isoformat() for day in settled),
+    }, path)
+
+def load_checkpoint(path=CHECKPOINT_FILE):
+    """
+    Loads the last checkpoint. Returns None if there is none.
+    The counts come back as a tuple and the settled dates as a set of dates.
+    """
+    checkpoint = load_state(path)
+    if not checkpoint.get('message_id'):
+        return None
+    checkpoint['counts'] = tuple(checkpoint['counts'])
+    checkpoint['settled'] = {date.fromisoformat(day) for day in checkpoint['settled']}
+    return checkpoint
+
+def clear_checkpoint(path=CHECKPOINT_FILE):
+    if os.path.exists(path):
+        os.remove(path)
+
+def skip_to_checkpoint(pages, message_id):
+    """
+    Drops every message up to and including message_id from a stream of
+    message pages (newest first), so a resumed backfill starts right after
+    the last applied email.
+    """
+    found = False
+    for page in pages:
+        if not found:
+            ids = [msg['id'] for msg in page]
+            if message_id not in ids:
+                continue
+            found = True
+            page = page[ids.index(message_id) + 1:]
+        if page:
+            yield page
+    if not found:
+        print(f"Checkpoint email {message_id} was not found, nothing was resumed. Run without --resume to start over.")
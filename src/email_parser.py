@@ -1,81 +1,109 @@
 import re
 import os
 from datetime import datetime, timedelta
+from events import ShiftEvent
+
+# Patterns are compiled once at import time
+TAG_RE = re.compile(r'<.*?>')
+# Opening or closing <tr>/<td> tags, with or without attributes
+TABLE_TAG_RE = re.compile(r'<(/?)(tr|td)\b[^>]*>', re.IGNORECASE)
+DATE_RE = re.compile(r'(\d{4})\.(\d{2})\.(\d{2})')
+TIME_RANGE_RE = re.compile(r'(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})')
+
+# Shifts start 20 minutes before the scheduled time, so you arrive early
+START_OFFSET = timedelta(minutes=20)
+
+# Bump whenever a change makes the parser return different events for the
+# same email, so shifts cached by an older version are parsed again
+PARSER_VERSION = 1
 
 def clean_html(raw_html):
     """
     Removes HTML tags from a string.
     """
-    cleanr = re.compile('<.*?>')
-    cleantext = re.sub(cleanr, '', raw_html)
-    return cleantext.strip()
+    return TAG_RE.sub('', raw_html).strip()
 
-def parse_schedule_email(email_body):
+def _parse_row(cells, summary):
+    """
+    Turns the three cells of a schedule row into a ShiftEvent, or None if
+    the row is a header, a day off ("PN", "Szabi", "Beteg") or malformed.
+    """
+    # Clean up HTML tags from cells (e.g. <strong>, <em>)
+    day_name = clean_html(cells[0].replace('\n', ''))
+    date_str = clean_html(cells[1].replace('\n', ''))
+    schedule_str = clean_html(cells[2].replace('\n', ''))
+
+    # Skip header row
+    if "Nap" in day_name or "Dátum" in date_str:
+        return None
+
+    # Parse Date
+    # Format: 2025.11.02 (ma) -> remove (ma)
+    date_str = date_str.split(' ')[0].strip()
+
+    # Check for valid date format YYYY.MM.DD
+    date_match = DATE_RE.match(date_str)
+    if not date_match:
+        return None
+
+    # We only care about time ranges like "12:00-22:00"
+    time_match = TIME_RANGE_RE.search(schedule_str)
+    if not time_match:
+        return None
+
+    try:
+        if len(date_str) != 10:
+            raise ValueError(f"unconverted data remains: {date_str[10:]}")
+        year, month, day = (int(part) for part in date_match.groups())
+        start_hour, start_minute, end_hour, end_minute = (int(part) for part in time_match.groups())
+        # Construct full datetime objects
+        start_dt = datetime(year, month, day, start_hour, start_minute) - START_OFFSET
+        end_dt = datetime(year, month, day, end_hour, end_minute)
+    except ValueError as e:
+        print(f"Error parsing date/time: {e}")
+        return None
+
+    return ShiftEvent(start_dt, end_dt, summary, f"{day_name}: {schedule_str}")
+
+def event_summary(summary=None):
+    """
+    Returns the summary events get: the given one, or EVENT_SUMMARY from the environment.
+    """
+    if summary is None:
+        summary = os.environ.get('EVENT_SUMMARY', 'Work at McDonald\'s')
+    return summary
+
+def parse_schedule_email(email_body, summary=None):
     """
     Parses the email body (HTML) to extract schedule entries.
-    Returns a list of dictionaries with 'start', 'end', 'summary', 'description'.
+    Events get the given summary, or EVENT_SUMMARY from the environment if it is None.
+    Returns a list of ShiftEvent objects.
+    The body is scanned once, tag by tag; rows with exactly three cells are schedule rows.
     """
     events = []
-    
-    # Normalize newlines and spaces
-    content = email_body.replace('\n', '')
-    
-    # Find all table rows
-    # We look for <tr>...</tr>. Non-greedy match.
-    rows = re.findall(r'<tr>(.*?)</tr>', content, re.IGNORECASE | re.DOTALL)
-    
-    for row in rows:
-        # Extract cells <td>...</td>
-        cells = re.findall(r'<td>(.*?)</td>', row, re.IGNORECASE | re.DOTALL)
-        
-        if len(cells) != 3:
-            continue
-            
-        # Clean up HTML tags from cells (e.g. <strong>, <em>)
-        day_name = clean_html(cells[0])
-        date_str = clean_html(cells[1])
-        schedule_str = clean_html(cells[2])
-        
-        # Skip header row
-        if "Nap" in day_name or "Dátum" in date_str:
-            continue
-            
-        # Parse Date
-        # Format: 2025.11.02 (ma) -> remove (ma)
-        date_str = date_str.split(' ')[0].strip()
-        
-        # Check for valid date format YYYY.MM.DD
-        if not re.match(r'\d{4}\.\d{2}\.\d{2}', date_str):
-            continue
-            
-        # Check Schedule
-        # Ignore "PN" (Pihenőnap), "Szabi" (Holiday), "Beteg" (Sick)
-        # We only care about time ranges like "12:00-22:00"
-        
-        time_match = re.search(r'(\d{1,2}:\d{2})-(\d{1,2}:\d{2})', schedule_str)
-        if time_match:
-            start_time_str = time_match.group(1)
-            end_time_str = time_match.group(2)
-            
-            try:
-                # Construct full datetime objects
-                start_dt = datetime.strptime(f"{date_str} {start_time_str}", "%Y.%m.%d %H:%M")
-                end_dt = datetime.strptime(f"{date_str} {end_time_str}", "%Y.%m.%d %H:%M")
-                
-                # Adjust start time: subtract 20 minutes
-                start_dt = start_dt - timedelta(minutes=20)
-                
-                # Get summary from env var or default
-                summary = os.environ.get('EVENT_SUMMARY', 'Work at McDonald\'s')
-                
-                events.append({
-                    'summary': summary,
-                    'start': start_dt,
-                    'end': end_dt,
-                    'description': f"{day_name}: {schedule_str}"
-                })
-            except ValueError as e:
-                print(f"Error parsing date/time: {e}")
-                continue
-            
+
+    summary = event_summary(summary)
+
+    cells = None  # Cells of the current row, None outside a row
+    cell_start = None  # Offset where the current cell's content starts
+
+    for match in TABLE_TAG_RE.finditer(email_body):
+        closing = match.group(1)
+        if match.group(2).lower() == 'tr':
+            if not closing:
+                cells = []
+                cell_start = None
+            elif cells is not None:
+                if len(cells) == 3:
+                    event = _parse_row(cells, summary)
+                    if event:
+                        events.append(event)
+                cells = None
+        elif cells is not None:
+            if not closing:
+                cell_start = match.end()
+            elif cell_start is not None:
+                cells.append(email_body[cell_start:match.start()])
+                cell_start = None
+
     return events
@@ -0,0 +1,125 @@
+from datetime import date, datetime
+from dateutil import tz
+
+# Shift times in the emails are Budapest wall-clock times
+BUDAPEST = tz.gettz('Europe/Budapest')
+
+SHIFT_FIELDS = ('summary', 'description', 'start', 'end')
+
+class ShiftEvent:
+    """
+    One shift parsed from a schedule email. Immutable, hashable and compared
+    by value, so shifts can be used as dict keys and in sets.
+    start and end are the (naive) Budapest times from the email; aware_start
+    and aware_end are the same times made timezone aware once, up front.
+    day is the date of the shift as an integer (date.toordinal()).
+    Fields can also be read like a dict (event['start']).
+    """
+    __slots__ = ('summary', 'description', 'start', 'end', 'aware_start', 'aware_end', 'day', '_hash')
+
+    def __init__(self, start, end, summary, description):
+        aware_start = start if start.tzinfo is not None else start.replace(tzinfo=BUDAPEST)
+        aware_end = end if end.tzinfo is not None else end.replace(tzinfo=BUDAPEST)
+        for name, value in (('summary', summary), ('description', description), ('start', start), ('end', end),
+                            ('aware_start', aware_start), ('aware_end', aware_end),
+                            ('day', aware_start.astimezone(BUDAPEST).toordinal()),
+                            ('_hash', hash((start, end, summary, description)))):
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def of(cls, event):
+        """
+        Returns event as a ShiftEvent; dicts with the same keys are converted.
+        """
+        if isinstance(event, cls):
+            return event
+        return cls(event['start'], event['end'], event['summary'], event['description'])
+
+    def replace(self, **changes):
+        """
+        Returns a copy with some of summary, description, start and end changed.
+        """
+        fields = {name: getattr(self, name) for name in SHIFT_FIELDS}
+        fields.update(changes)
+        return ShiftEvent(**fields)
+
+    def date(self):
+        return date.fromordinal(self.day)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ShiftEvent is immutable")
+
+    def __getitem__(self, key):
+        if key not in SHIFT_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __eq__(self, other):
+        if not isinstance(other, ShiftEvent):
+            return NotImplemented
+        return (self.start == other.start and self.end == other.end and self.summary == other.summary
+                and self.description == other.description)
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return (f"ShiftEvent(start={self.start!r}, end={self.end!r}, summary={self.summary!r}, "
+                f"description={self.description!r})")
+
+def _parse_api_time(value):
+    if 'dateTime' in value:
+        return datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+    return None
+
+class CalendarEvent:
+    """
+    An event read from a calendar, with its start and end parsed once.
+    start and end are timezone aware (None for all-day events) and day is
+    the Budapest date it starts on, as an integer (date.toordinal()).
+    Reads like the Calendar API resource it wraps (event['id'],
+    event.get('sequence')), which stays available as resource.
+    """
+    __slots__ = ('resource', 'id', 'summary', 'description', 'start', 'end', 'day')
+
+    def __init__(self, resource):
+        self.resource = resource
+        self.id = resource.get('id')
+        self.summary = resource.get('summary')
+        self.description = resource.get('description', '')
+        start = resource.get('start', {})
+        self.start = _parse_api_time(start)
+        self.end = _parse_api_time(resource.get('end', {}))
+        if self.start is not None:
+            self.day = self.start.astimezone(BUDAPEST).toordinal()
+        else:
+            # All-day event
+            self.day = date.fromisoformat(start['date']).toordinal()
+
+    @classmethod
+    def of(cls, event):
+        """
+        Returns event as a CalendarEvent; API resources (dicts) are wrapped.
+        """
+        return event if isinstance(event, cls) else cls(event)
+
+    def date(self):
+        return date.fromordinal(self.day)
+
+    def matches(self, shift):
+        """
+        Checks if the event already has the start, end, summary and
+        description of a shift, so updating it would be a no-op.
+        """
+        # Aware datetimes compare as instants, whatever offset the API returned
+        return (self.summary == shift.summary and self.description == shift.description
+                and self.start == shift.aware_start and self.end == shift.aware_end)
+
+    def __getitem__(self, key):
+        return self.resource[key]
+
+    def get(self, key, default=None):
+        return self.resource.get(key, default)
+
+    def __repr__(self):
+        return f"CalendarEvent({self.resource!r})"
@@ -1,60 +1,171 @@
-from googleapiclient.discovery import build
-from auth import get_credentials
+from googleapiclient.errors import HttpError
+from services import get_service
+from transport import execute, run_batch
 import base64
 
-def get_gmail_service():
-    creds = get_credentials()
-    service = build('gmail', 'v1', credentials=creds)
-    return service
+# Maximum number of calls the Gmail API accepts in one batch request
+BATCH_SIZE = 100
 
-def search_schedule_emails(service, sender="mymenu-support@ext.mcdonalds.com", max_results=None, newer_than=None):
+# Messages per page of search results; Gmail allows up to 500
+SEARCH_PAGE_SIZE = 100
+
+# Partial-response masks: only download the fields the code actually reads
+MESSAGE_FIELDS = 'internalDate,payload(body/data,parts/body/data)'
+
+def get_gmail_service(token_path='token.json', interactive=True):
+    return get_service('gmail', 'v1', token_path, interactive)
+
+def iter_schedule_email_pages(service, sender="mymenu-support@ext.mcdonalds.com", newer_than=None,
+                              page_size=SEARCH_PAGE_SIZE):
     """
     Searches for emails from the specified sender with relevant subjects.
+    Yields the found messages page by page, newest first, as each page
+    arrives, so callers can start on the newest emails before the search
+    has finished and never hold the whole result list.
     Args:
-        max_results: Max number of emails to return. If None, returns all.
         newer_than: Time filter (e.g., '2m'). If None, searches all time.
+        page_size: Max number of messages per page (at most 500).
     """
     query = f'from:{sender} subject:("Beosztásod megváltozott" OR "Új beosztásod")'
     
     if newer_than:
         query += f' newer_than:{newer_than}'
     
-    messages = []
     page_token = None
-    
     while True:
-        # If max_results is set and small (like 10), we can just pass it to API if we don't loop.
-        # But if we want robust "get all", we loop.
-        
-        kwargs = {'userId': 'me', 'q': query, 'pageToken': page_token}
-        if max_results and not page_token:
-             # Only apply maxResults to the first call if we just want a few
-             # But if max_results is large, this logic is tricky.
-             # For our use case: main.py wants 10, backfill wants ALL.
-             if max_results <= 500:
-                 kwargs['maxResults'] = max_results
-        
-        results = service.users().messages().list(**kwargs).execute()
-        batch = results.get('messages', [])
-        messages.extend(batch)
-        
+        results = execute(service.users().messages().list(
+            userId='me', q=query, pageToken=page_token, maxResults=page_size,
+            fields='messages/id,nextPageToken'))
+        page = results.get('messages', [])
+        if page:
+            yield page
+            
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+
+def search_schedule_emails(service, sender="mymenu-support@ext.mcdonalds.com", max_results=None, newer_than=None):
+    """
+    Searches for emails from the specified sender with relevant subjects.
+    Args:
+        max_results: Max number of emails to return. If None, returns all.
+        newer_than: Time filter (e.g., '2m'). If None, searches all time.
+    """
+    # For our use case: main.py wants 10, backfill wants ALL
+    page_size = max_results if max_results and max_results <= 500 else SEARCH_PAGE_SIZE
+    messages = []
+    for page in iter_schedule_email_pages(service, sender, newer_than, page_size):
+        messages.extend(page)
         if max_results and len(messages) >= max_results:
             messages = messages[:max_results]
             break
             
+    return messages
+
+def get_current_history_id(service):
+    """
+    Returns the current history ID of the mailbox.
+    """
+    profile = execute(service.users().getProfile(userId='me', fields='historyId'))
+    return profile['historyId']
+
+def get_added_message_ids(service, start_history_id):
+    """
+    Lists the IDs of messages added to the mailbox since start_history_id.
+    Returns a tuple (message_ids, latest_history_id).
+    Raises HttpError with status 404 if start_history_id is too old.
+    """
+    message_ids = set()
+    latest_history_id = start_history_id
+    page_token = None
+    
+    while True:
+        results = execute(service.users().history().list(
+            userId='me',
+            startHistoryId=start_history_id,
+            historyTypes='messageAdded',
+            pageToken=page_token,
+            fields='history/messagesAdded/message/id,historyId,nextPageToken'
+        ))
+        
+        for record in results.get('history', []):
+            for added in record.get('messagesAdded', []):
+                message_ids.add(added['message']['id'])
+        latest_history_id = results.get('historyId', latest_history_id)
+        
         page_token = results.get('nextPageToken')
         if not page_token:
             break
             
-    return messages
+    return message_ids, latest_history_id
 
-def get_email_content(service, msg_id):
+def find_new_schedule_emails(service, history_id=None, max_results=10, newer_than='2m'):
     """
-    Retrieves the body of the email.
+    Incrementally finds schedule emails that arrived since history_id.
+    If history_id is None or has expired, falls back to a regular search.
+    Returns a tuple (messages, new_history_id); save new_history_id for the next run.
     """
-    message = service.users().messages().get(userId='me', id=msg_id).execute()
-    payload = message['payload']
+    if history_id:
+        try:
+            added_ids, new_history_id = get_added_message_ids(service, history_id)
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            print("Saved Gmail history ID has expired, falling back to a full search.")
+        else:
+            if not added_ids:
+                return [], new_history_id
+            # Only a search can tell which of the new messages are schedule emails
+            messages = search_schedule_emails(service, max_results=max_results, newer_than=newer_than)
+            return [msg for msg in messages if msg['id'] in added_ids], new_history_id
     
+    # Read the history ID before searching so no message can slip in between
+    new_history_id = get_current_history_id(service)
+    messages = search_schedule_emails(service, max_results=max_results, newer_than=newer_than)
+    return messages, new_history_id
+
+def get_email(service, msg_id):
+    """
+    Retrieves an email.
+    Returns a dict with the message 'id', its 'internalDate' (milliseconds
+    since the epoch, as an int) and the decoded 'html' body.
+    """
+    message = execute(service.users().messages().get(userId='me', id=msg_id, fields=MESSAGE_FIELDS))
+    return _email_from_message(msg_id, message)
+
+def _email_from_message(msg_id, message):
+    return {
+        'id': msg_id,
+        'internalDate': int(message.get('internalDate', 0)),
+        'html': decode_body(message['payload'])
+    }
+
+def get_emails(service, msg_ids, batch_size=BATCH_SIZE):
+    """
+    Retrieves several emails using HTTP batch requests.
+    Returns a list of (email, exception) tuples in the same order as msg_ids,
+    where email is a dict like the one get_email returns. Exactly one of the
+    two is set for each message.
+    """
+    requests = [service.users().messages().get(userId='me', id=msg_id, fields=MESSAGE_FIELDS)
+                for msg_id in msg_ids]
+    
+    results = []
+    for msg_id, (message, error) in zip(msg_ids, run_batch(service, requests, batch_size)):
+        if error is not None:
+            results.append((None, error))
+            continue
+        try:
+            results.append((_email_from_message(msg_id, message), None))
+        except Exception as e:
+            results.append((None, e))
+    
+    return results
+
+def decode_body(payload):
+    """
+    Decodes the body of a message payload.
+    """
     # The body might be in 'body' or in 'parts'
     if 'parts' in payload:
         parts = payload['parts']
@@ -66,3 +177,9 @@ def get_email_content(service, msg_id):
     decoded_data = base64.b64decode(data)
     
     return decoded_data.decode('utf-8')
+
+def get_email_content(service, msg_id):
+    """
+    Retrieves the body of the email.
+    """
+    return get_email(service, msg_id)['html']
@@ -0,0 +1,206 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from calendar_service import build_event_body, get_event_date
+from email_parser import event_summary
+
+# Default file the feed is written to, e.g. served statically for calendar apps to subscribe to
+ICS_FILE = 'schedule.ics'
+
+PRODID = '-//schedule_to_calendar//Schedule Sync//EN'
+UID_DOMAIN = 'schedule-to-calendar'
+
+# RFC 5545 lines are at most 75 octets long, longer ones are folded
+MAX_LINE_OCTETS = 75
+
+def _escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def _unescape(text):
+    result = []
+    chars = iter(text)
+    for char in chars:
+        if char == '\\':
+            char = next(chars, '')
+            result.append('\n' if char in ('n', 'N') else char)
+        else:
+            result.append(char)
+    return ''.join(result)
+
+def _fold(line):
+    """
+    Splits a content line into chunks of at most 75 octets, never inside a
+    UTF-8 character. Continuation lines start with a space.
+    """
+    chunks = []
+    current = ''
+    limit = MAX_LINE_OCTETS
+    for char in line:
+        if len((current + char).encode('utf-8')) > limit:
+            chunks.append(current)
+            current = ''
+            limit = MAX_LINE_OCTETS - 1
+        current += char
+    chunks.append(current)
+    return '\r\n '.join(chunks)
+
+def _format_time(iso_value):
+    dt = datetime.fromisoformat(iso_value.replace('Z', '+00:00'))
+    return dt.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+def _parse_time(value):
+    return datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc).isoformat()
+
+def _now_stamp():
+    return datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+def event_uid(day, summary):
+    """
+    Returns the UID of the event for a date and summary. It stays the same
+    when the shift changes, so subscribed calendars update the event instead
+    of adding a second one.
+    """
+    digest = hashlib.sha1(summary.encode('utf-8')).hexdigest()[:8]
+    return f"{day.strftime('%Y%m%d')}-{digest}@{UID_DOMAIN}"
+
+def load_ics(path):
+    """
+    Reads the events of an .ics file written by IcsSink.
+    Returns {uid: event}, where events look like Calendar API event resources.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8', newline='') as f:
+        content = f.read()
+
+    # Unfold continuation lines first
+    lines = []
+    for line in content.replace('\r\n', '\n').split('\n'):
+        if line[:1] in (' ', '\t') and lines:
+            lines[-1] += line[1:]
+        elif line:
+            lines.append(line)
+
+    events = {}
+    event = None
+    for line in lines:
+        name, _, value = line.partition(':')
+        name = name.split(';', 1)[0].upper()
+        if name == 'BEGIN' and value == 'VEVENT':
+            event = {}
+        elif name == 'END' and value == 'VEVENT' and event is not None:
+            if 'id' in event and 'start' in event and 'end' in event:
+                events[event['id']] = event
+            event = None
+        elif event is None:
+            continue
+        elif name == 'UID':
+            event['id'] = value
+        elif name == 'SUMMARY':
+            event['summary'] = _unescape(value)
+        elif name == 'DESCRIPTION':
+            event['description'] = _unescape(value)
+        elif name == 'DTSTART':
+            event['start'] = {'dateTime': _parse_time(value)}
+        elif name == 'DTEND':
+            event['end'] = {'dateTime': _parse_time(value)}
+        elif name == 'SEQUENCE':
+            event['sequence'] = int(value)
+        elif name == 'DTSTAMP':
+            event['dtstamp'] = value
+    return events
+
+class IcsSink:
+    """
+    Output sink that keeps the schedule in an RFC 5545 .ics file instead of a
+    Google calendar, so applying a schedule uses no Calendar API quota.
+    It offers the same reads and plan execution as processor.CalendarTarget,
+    so process_messages can use it as a target. Events get the given summary
+    (EVENT_SUMMARY if it is None).
+    """
+    def __init__(self, path=ICS_FILE, name='Work Schedule', summary=None):
+        self.path = path
+        # Keys the ledger outcomes and Gmail cursor of this file, apart from the calendars'
+        self.key = f"ics:{os.path.abspath(path)}"
+        self.name = name
+        self.summary = event_summary(summary)
+        self.events = load_ics(path)
+
+    def get_events(self, start_date, end_date, summary):
+        """
+        Returns the events with the given summary between two dates (inclusive),
+        in start time order, like get_events_in_range.
+        """
+        events = [event for event in self.events.values()
+                  if event.get('summary') == summary and start_date <= get_event_date(event) <= end_date]
+        return sorted(events, key=lambda event: event['start']['dateTime'])
+
+    def apply_plan(self, plan):
+        """
+        Applies the writes of a reconciliation plan and rewrites the file once.
+        Returns a list of (entry, response, exception) tuples for the written
+        entries, like processor.apply_plan.
+        """
+        results = []
+        stamp = _now_stamp()
+        for entry in plan.writes():
+            if entry.existing is not None:
+                self.events.pop(entry.existing['id'], None)
+            if entry.event is None:
+                results.append((entry, '', None))
+                continue
+            body = build_event_body(entry.event)
+            uid = event_uid(entry.day, entry.event.summary)
+            sequence = entry.existing.get('sequence', 0) + 1 if entry.existing is not None else 0
+            event = {
+                'id': uid,
+                'summary': body['summary'],
+                'description': body['description'],
+                'start': {'dateTime': body['start']['dateTime']},
+                'end': {'dateTime': body['end']['dateTime']},
+                'sequence': sequence,
+                'dtstamp': stamp,
+            }
+            self.events[uid] = event
+            results.append((entry, event, None))
+        if results:
+            self.save()
+        return results
+
+    def render(self):
+        """
+        Returns the calendar as RFC 5545 text.
+        """
+        lines = [
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            f'PRODID:{PRODID}',
+            'CALSCALE:GREGORIAN',
+            'METHOD:PUBLISH',
+            f'X-WR-CALNAME:{_escape(self.name)}',
+            'X-WR-TIMEZONE:Europe/Budapest',
+        ]
+        for event in sorted(self.events.values(), key=lambda event: event['start']['dateTime']):
+            lines += [
+                'BEGIN:VEVENT',
+                f"UID:{event['id']}",
+                f"DTSTAMP:{event.get('dtstamp') or _now_stamp()}",
+                f"SEQUENCE:{event.get('sequence', 0)}",
+                f"DTSTART:{_format_time(event['start']['dateTime'])}",
+                f"DTEND:{_format_time(event['end']['dateTime'])}",
+                f"SUMMARY:{_escape(event.get('summary', ''))}",
+                f"DESCRIPTION:{_escape(event.get('description', ''))}",
+                'END:VEVENT',
+            ]
+        lines.append('END:VCALENDAR')
+        return ''.join(_fold(line) + '\r\n' for line in lines)
+
+    def save(self):
+        """
+        Writes the file atomically, so subscribers never download half of it.
+        """
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,80 @@
+import hashlib
+import sqlite3
+from datetime import datetime
+
+# Stored next to token.json, records which Gmail messages were already applied, and where
+LEDGER_FILE = 'ledger.db'
+
+# Outcomes that mean a message does not need to be processed again
+DONE_OUTCOMES = ('applied', 'empty')
+
+def open_ledger(path=LEDGER_FILE):
+    """
+    Opens (and creates if needed) the processed-message ledger.
+    Outcomes are kept per target (a calendar ID, or a sink's target such as
+    an .ics file), so an email applied to one target is still applied to a
+    calendar added later.
+    Applied emails also keep their internal date and the days they cover
+    (date ordinals), so older emails can't overwrite their dates later.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS message_outcomes ('
+        ' message_id TEXT NOT NULL,'
+        ' target TEXT NOT NULL,'
+        ' content_hash TEXT,'
+        ' outcome TEXT NOT NULL,'
+        ' processed_at TEXT NOT NULL,'
+        ' internal_date INTEGER,'
+        ' first_day INTEGER,'
+        ' last_day INTEGER,'
+        ' PRIMARY KEY (message_id, target))'
+    )
+    conn.commit()
+    return conn
+
+def content_hash(content):
+    """
+    Returns a stable hash of an email body.
+    """
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def get_outcome(conn, message_id, target):
+    """
+    Returns the recorded outcome for a message and target, or None if it was never processed.
+    """
+    row = conn.execute('SELECT outcome FROM message_outcomes WHERE message_id = ? AND target = ?',
+                       (message_id, target)).fetchone()
+    return row[0] if row else None
+
+def is_done(conn, message_id, target):
+    """
+    Checks if a message was already processed successfully for a target.
+    """
+    return get_outcome(conn, message_id, target) in DONE_OUTCOMES
+
+def record_outcome(conn, message_id, target, body_hash, outcome, internal_date=None, days=None):
+    """
+    Records the outcome of processing a message for a target.
+    outcome: 'applied', 'empty' (no shifts in the email) or 'failed'.
+    days: (first_day, last_day) date ordinals the email covers, for applied emails.
+    """
+    first_day, last_day = days or (None, None)
+    conn.execute(
+        'INSERT OR REPLACE INTO message_outcomes'
+        ' (message_id, target, content_hash, outcome, processed_at, internal_date, first_day, last_day)'
+        ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        (message_id, target, body_hash, outcome, datetime.now().isoformat(timespec='seconds'),
+         internal_date, first_day, last_day)
+    )
+    conn.commit()
+
+def get_applied_ranges(conn, target, first_day, last_day):
+    """
+    Returns (internal_date, first_day, last_day) for the emails applied to a
+    target that cover any day between first_day and last_day (date ordinals).
+    """
+    return conn.execute(
+        'SELECT internal_date, first_day, last_day FROM message_outcomes'
+        " WHERE target = ? AND outcome = 'applied' AND first_day <= ? AND last_day >= ?",
+        (target, last_day, first_day)).fetchall()
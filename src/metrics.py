@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Files written by write_metrics, named after the kind of run ('sync',
+# 'backfill'); the .prom file is meant for the node_exporter textfile collector
+JSON_FILE = 'schedule_{run}_metrics.json'
+PROMETHEUS_FILE = 'schedule_{run}.prom'
+
+# Stages in the order a run goes through them
+STAGES = ('auth', 'search', 'fetch', 'parse', 'calendar_read', 'calendar_write')
+
+# Requests that don't name their API method (e.g. test doubles) are counted as this
+UNKNOWN_METHOD = 'unknown'
+
+_stage_seconds = Counter()
+_calls = Counter()
+_retries = Counter()
+_lock = threading.Lock()
+
+def reset_metrics():
+    with _lock:
+        _stage_seconds.clear()
+        _calls.clear()
+        _retries.clear()
+
+@contextmanager
+def stage(name):
+    """
+    Adds the wall time spent in the block to a stage. Stages that run on
+    several threads at once add up the time of every thread.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _stage_seconds[name] += elapsed
+
+def method_id_of(request):
+    method_id = getattr(request, 'methodId', None)
+    return method_id if isinstance(method_id, str) else UNKNOWN_METHOD
+
+def record_call(method_id):
+    """
+    Counts one API call (a request sent to Google, including retries).
+    """
+    with _lock:
+        _calls[method_id] += 1
+
+def record_retry(method_id):
+    """
+    Counts one retry of a failed API call.
+    """
+    with _lock:
+        _retries[method_id] += 1
+
+def get_metrics(bytes_received=0, run_seconds=None, succeeded=None):
+    """
+    Returns the metrics of this process as a dict.
+    """
+    with _lock:
+        return {
+            'timestamp': time.time(),
+            'run_seconds': run_seconds,
+            'succeeded': succeeded,
+            'stage_seconds': {name: round(seconds, 6) for name, seconds in _stage_seconds.items()},
+            'api_calls': dict(_calls),
+            'api_retries': dict(_retries),
+            'bytes_received': bytes_received,
+        }
+
+def format_summary(metrics):
+    """
+    Returns a one-line, human readable summary of the metrics.
+    """
+    stages = metrics['stage_seconds']
+    timings = ', '.join(f"{name} {stages[name]:.2f}s" for name in STAGES if name in stages)
+    calls = sum(metrics['api_calls'].values())
+    retries = sum(metrics['api_retries'].values())
+    return f"Stages: {timings or 'none'} | API calls: {calls} ({retries} retries)"
+
+def _prometheus_lines(metrics, run):
+    def sample(name, value, **labels):
+        labels = dict(run=run, **labels)
+        label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+        return f"schedule_sync_{name}{{{label_text}}} {value}"
+
+    def family(name, help_text, samples):
+        return [f"# HELP schedule_sync_{name} {help_text}", f"# TYPE schedule_sync_{name} gauge"] + samples
+
+    lines = family('stage_seconds', 'Wall time spent in each stage.',
+                   [sample('stage_seconds', seconds, stage=name)
+                    for name, seconds in sorted(metrics['stage_seconds'].items())])
+    lines += family('api_calls', 'Google API calls made, by method.',
+                    [sample('api_calls', count, method=method)
+                     for method, count in sorted(metrics['api_calls'].items())])
+    lines += family('api_retries', 'Retried Google API calls, by method.',
+                    [sample('api_retries', count, method=method)
+                     for method, count in sorted(metrics['api_retries'].items())])
+    lines += family('bytes_received', 'Response bytes received from Google APIs.',
+                    [sample('bytes_received', metrics['bytes_received'])])
+    lines += family('last_run_timestamp_seconds', 'When the metrics were written.',
+                    [sample('last_run_timestamp_seconds', f"{metrics['timestamp']:.0f}")])
+    if metrics['succeeded'] is not None:
+        lines += family('success', 'Whether the run finished without errors.',
+                        [sample('success', int(metrics['succeeded']))])
+    if metrics['run_seconds'] is not None:
+        lines += family('run_seconds', 'Wall time of the run.',
+                        [sample('run_seconds', metrics['run_seconds'])])
+    return lines
+
+def _write_atomically(path, content):
+    # The textfile collector may read the file at any time, never let it see half of it
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def write_metrics(metrics, directory='.', run='sync'):
+    """
+    Writes the metrics as a JSON summary and a Prometheus textfile into directory.
+    run names the kind of run; it is part of the file names and a label on every sample.
+    """
+    _write_atomically(os.path.join(directory, JSON_FILE.format(run=run)),
+                      json.dumps(dict(metrics, run=run), indent=2) + "\n")
+    _write_atomically(os.path.join(directory, PROMETHEUS_FILE.format(run=run)),
+                      "\n".join(_prometheus_lines(metrics, run)) + "\n")
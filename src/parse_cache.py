@@ -0,0 +1,105 @@
+import json
+import sqlite3
+import time
+import zlib
+from datetime import datetime, timedelta
+from events import ShiftEvent
+
+# Stored next to ledger.db, keeps the parsed shifts of every schedule email seen
+PARSE_CACHE_FILE = 'parse_cache.db'
+
+# Once the stored shift lists grow past this, the least recently used are evicted
+MAX_CACHE_BYTES = 4 * 1024 * 1024
+
+EPOCH = datetime(1970, 1, 1)
+MINUTE = timedelta(minutes=1)
+
+def open_parse_cache(path=PARSE_CACHE_FILE):
+    """
+    Opens (and creates if needed) the parsed-schedule cache.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS parsed_schedules ('
+        ' message_id TEXT NOT NULL,'
+        ' parser_version INTEGER NOT NULL,'
+        ' internal_date INTEGER NOT NULL,'
+        ' content_hash TEXT,'
+        ' events BLOB NOT NULL,'
+        ' last_used REAL NOT NULL,'
+        ' PRIMARY KEY (message_id, parser_version))'
+    )
+    conn.commit()
+    return conn
+
+def encode_events(events):
+    """
+    Packs parsed events into a compressed blob. Shift times are stored as
+    minutes since the epoch; the summary is left out and set again on load,
+    since it comes from the configuration rather than the email.
+    """
+    rows = [[(event.start - EPOCH) // MINUTE, (event.end - EPOCH) // MINUTE, event.description]
+            for event in map(ShiftEvent.of, events)]
+    return zlib.compress(json.dumps(rows, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+
+def decode_events(blob, summary):
+    """
+    Unpacks a blob written by encode_events into the events parse_schedule_email returns.
+    """
+    return [ShiftEvent(EPOCH + start * MINUTE, EPOCH + end * MINUTE, summary, description)
+            for start, end, description in json.loads(zlib.decompress(blob).decode('utf-8'))]
+
+def get_cached_schedules(conn, message_ids, parser_version, summary):
+    """
+    Looks up the parsed shifts of several messages.
+    Returns {message_id: (internal_date, content_hash, events)} for the cache hits.
+    """
+    hits = {}
+    for message_id in message_ids:
+        row = conn.execute(
+            'SELECT internal_date, content_hash, events FROM parsed_schedules'
+            ' WHERE message_id = ? AND parser_version = ?',
+            (message_id, parser_version)).fetchone()
+        if row:
+            hits[message_id] = (row[0], row[1], decode_events(row[2], summary))
+    if hits:
+        now = time.time()
+        conn.executemany('UPDATE parsed_schedules SET last_used = ? WHERE message_id = ? AND parser_version = ?',
+                         [(now, message_id, parser_version) for message_id in hits])
+        conn.commit()
+    return hits
+
+def store_schedules(conn, schedules, parser_version, max_bytes=MAX_CACHE_BYTES):
+    """
+    Stores parsed shifts, then evicts the least recently used entries if
+    the cache has grown past max_bytes.
+    schedules: list of (message_id, internal_date, content_hash, events) tuples.
+    """
+    if not schedules:
+        return
+    now = time.time()
+    conn.executemany(
+        'INSERT OR REPLACE INTO parsed_schedules'
+        ' (message_id, parser_version, internal_date, content_hash, events, last_used)'
+        ' VALUES (?, ?, ?, ?, ?, ?)',
+        [(message_id, parser_version, internal_date, body_hash, encode_events(events), now)
+         for message_id, internal_date, body_hash, events in schedules])
+    evict(conn, max_bytes)
+    conn.commit()
+
+def evict(conn, max_bytes=MAX_CACHE_BYTES):
+    """
+    Deletes the least recently used entries until the stored shift lists
+    take up at most max_bytes. Returns the number of deleted entries.
+    """
+    total = conn.execute('SELECT COALESCE(SUM(LENGTH(events)), 0) FROM parsed_schedules').fetchone()[0]
+    if total <= max_bytes:
+        return 0
+    to_delete = []
+    for rowid, size in conn.execute('SELECT rowid, LENGTH(events) FROM parsed_schedules ORDER BY last_used, rowid'):
+        if total <= max_bytes:
+            break
+        to_delete.append((rowid,))
+        total -= size
+    conn.executemany('DELETE FROM parsed_schedules WHERE rowid = ?', to_delete)
+    return len(to_delete)
@@ -1,72 +1,332 @@
-from gmail_service import get_email_content
-from email_parser import parse_schedule_email
-from calendar_service import get_existing_event, get_events_in_range, create_event, update_event, delete_event
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from gmail_service import get_emails, BATCH_SIZE as GMAIL_BATCH_SIZE
+from email_parser import parse_schedule_email, event_summary, PARSER_VERSION
+from calendar_service import get_events_in_range, build_day_index, create_event, update_event, delete_event, execute_batch, BATCH_SIZE as CALENDAR_BATCH_SIZE
+from ledger import content_hash, is_done, record_outcome, get_applied_ranges
+from parse_cache import get_cached_schedules, store_schedules
+from calendar_mirror import get_mirrored_events, record_writes
+from reconcile import coalesce_schedules, build_plan, CREATE, UPDATE, DELETE, NOOP
+from transport import credentials_of, worker_http
+from events import ShiftEvent
+from rate_limit import is_retryable
+from metrics import stage
 
-def process_messages(gmail_service, calendar_service, calendar_id, messages):
+# Worker pools live as long as the process, so the http objects worker_http
+# caches per thread, and their keep-alive connections, are reused by every call.
+# Targets and chunks get separate pools: a target's thread waits for its chunks.
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _pool(name, workers):
+    """
+    Returns the long-lived pool called name, with at least `workers` threads.
+    """
+    with _pools_lock:
+        pool, size = _pools.get(name, (None, 0))
+        if size < workers:
+            if pool is not None:
+                # Tasks already running on the smaller pool still finish
+                pool.shutdown(wait=False)
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-worker")
+            _pools[name] = (pool, workers)
+        return pool
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def _run_chunked(func, items, workers, max_chunk_size, credentials):
+    """
+    Runs func over items, split into up to `workers` chunks that run in parallel.
+    func takes a list of items and returns a list of results for them.
+    Returns the results of all chunks in the order of items.
+    """
+    if workers <= 1 or len(items) <= 1:
+        return func(items)
+
+    size = min(max_chunk_size, -(-len(items) // workers))
+
+    def run(chunk):
+        with worker_http(credentials):
+            return func(chunk)
+
+    return [result for chunk_results in _pool('chunk', workers).map(run, _chunks(items, size))
+            for result in chunk_results]
+
+def _apply_operations(calendar_service, calendar_id, operations, batch_writes, workers=1):
+    """
+    Applies the collected write operations, either one by one or in batch requests,
+    using up to `workers` threads.
+    Returns a list of (response, exception) tuples in the same order as operations.
+    """
+    if batch_writes:
+        return _run_chunked(lambda chunk: execute_batch(calendar_service, calendar_id, chunk),
+                            operations, workers, CALENDAR_BATCH_SIZE, credentials_of(calendar_service))
+
+    def apply_one_by_one(chunk):
+        results = []
+        for operation in chunk:
+            action = operation[0]
+            try:
+                if action == 'create':
+                    response = create_event(calendar_service, calendar_id, operation[1])
+                elif action == 'update':
+                    response = update_event(calendar_service, calendar_id, operation[1], operation[2])
+                else:
+                    response = delete_event(calendar_service, calendar_id, operation[1])
+                results.append((response, None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+
+    return _run_chunked(apply_one_by_one, operations, workers, 1, credentials_of(calendar_service))
+
+def _fetch_and_parse(gmail_service, msg_ids, summary=None):
+    """
+    Fetches a group of emails and parses them.
+    Returns a list of (email, events, exception) tuples in the same order as msg_ids.
+    """
+    with stage('fetch'):
+        emails = get_emails(gmail_service, msg_ids)
+
+    parsed = []
+    with stage('parse'):
+        for email, error in emails:
+            events = None
+            if error is None:
+                try:
+                    events = parse_schedule_email(email['html'], summary)
+                except Exception as e:
+                    error = e
+            parsed.append((email, events, error))
+    return parsed
+
+def apply_plan(plan, calendar_service, calendar_id, batch_writes=False, workers=1, mirror=None):
+    """
+    Executes the writes of a reconciliation plan, either one by one or in
+    batch requests, using up to `workers` threads.
+    If a calendar mirror is given, it is kept up to date with the writes.
+    Returns a list of (entry, response, exception) tuples for the written entries.
+    """
+    entries = plan.writes()
+    operations = [entry.operation() for entry in entries]
+    results = _apply_operations(calendar_service, calendar_id, operations, batch_writes, workers)
+    if mirror is not None:
+        record_writes(mirror, calendar_id, operations, results)
+    return [(entry, response, error) for entry, (response, error) in zip(entries, results)]
+
+class CalendarTarget:
+    """
+    A Google calendar to apply schedules to, with the summary its events get.
+    Reads come from the calendar mirror if one is given; writes are sent in
+    batch requests if batch_writes is True, using up to `workers` threads.
+    Offers the same reads and plan execution as ics_sink.IcsSink.
+    A calendar_id of None stands for a calendar that doesn't exist yet (in
+    dry runs), which reads as empty.
+    """
+    def __init__(self, service, calendar_id, summary, mirror=None, batch_writes=False, workers=1):
+        self.service = service
+        self.calendar_id = calendar_id
+        self.summary = summary
+        self.mirror = mirror
+        self.batch_writes = batch_writes
+        self.workers = workers
+        # Keys the ledger outcomes of this calendar
+        self.key = calendar_id
+
+    def get_events(self, start_date, end_date, summary):
+        if self.calendar_id is None:
+            return []
+        if self.mirror is not None:
+            return get_mirrored_events(self.mirror, self.calendar_id, start_date, end_date, summary)
+        return get_events_in_range(self.service, self.calendar_id, start_date, end_date, summary)
+
+    def apply_plan(self, plan):
+        return apply_plan(plan, self.service, self.calendar_id, self.batch_writes, self.workers, self.mirror)
+
+def _apply_to_target(final, target, dry_run, label=""):
     """
-    Processes a list of Gmail messages, parses them, and updates the calendar.
-    Also deletes calendar events that are no longer in the schedule.
-    Returns a tuple (added_count, updated_count, deleted_count).
+    Plans and applies the final schedule to one target. Output lines start with label.
+    Returns a tuple ((added, updated, deleted, unchanged), failed_message_ids).
+    """
+    added = updated = deleted = unchanged = 0
+    failed_messages = set()
+    summary = target.summary
+    final = {day: (event.replace(summary=summary) if event is not None and event.summary != summary else event,
+                   msg_id)
+             for day, (event, msg_id) in final.items()}
+    try:
+        # Read the calendar once for the whole date range covered by the emails
+        with stage('calendar_read'):
+            calendar_events = target.get_events(min(final), max(final), summary)
+        plan = build_plan(final, build_day_index(calendar_events))
+        unchanged = plan.count(NOOP)
+
+        if dry_run:
+            print(f"{label}Dry run, these changes would be made:")
+            for line in plan.describe():
+                print(f"{label}{line}")
+            return (plan.count(CREATE), plan.count(UPDATE), plan.count(DELETE), unchanged), failed_messages
+
+        for entry in plan.writes():
+            if entry.action == DELETE:
+                print(f"{label}    Deleting removed shift on {entry.day}")
+
+        with stage('calendar_write'):
+            results = target.apply_plan(plan)
+
+        for entry, response, error in results:
+            if error is not None:
+                print(f"{label}    Error applying {entry.action}: {error}")
+                failed_messages.add(entry.source)
+            elif entry.action == CREATE:
+                print(f"{label}    Added: {entry.event.start} - {entry.event.summary}")
+                added += 1
+            elif entry.action == UPDATE:
+                updated += 1
+            else:
+                deleted += 1
+
+    except Exception as e:
+        print(f"{label}  Error updating calendar: {e}")
+        failed_messages.update(msg_id for _, msg_id in final.values())
+
+    return (added, updated, deleted, unchanged), failed_messages
+
+def _without_claimed_dates(final, internal_dates, ledger, target):
+    """
+    Leaves out the dates of the final schedule that an email applied to the
+    target on an earlier run covers, if it is newer than the email that won
+    them here. That email may not be part of this run at all, e.g. when it
+    was skipped as already applied, or when main.py only sees new emails.
+    """
+    claims = get_applied_ranges(ledger, target, min(final).toordinal(), max(final).toordinal())
+    return {day: (event, msg_id) for day, (event, msg_id) in final.items()
+            if not any(first <= day.toordinal() <= last and claimed_date > internal_dates[msg_id]
+                       for claimed_date, first, last in claims)}
+
+def process_messages(gmail_service, messages, targets, ledger=None, force=False, workers=1, dry_run=False,
+                     parse_cache=None, settled=None, retry=None):
+    """
+    Fetches and parses Gmail messages and applies them to every target (a
+    CalendarTarget, or a sink such as IcsSink); the newest email wins each date.
+    Messages the ledger records as done for every target are skipped unless force.
+    settled and retry are filled in for the callers in sync.py.
+    Returns a tuple (added_count, updated_count, deleted_count, unchanged_count),
+    summed over all targets.
     """
     added = 0
     updated = 0
     deleted = 0
-    
+    unchanged = 0
+    # The first target's summary is used for parsing, so its events need no retitling
+    summary = targets[0].summary
+    target_keys = [target.key for target in targets]
+
     total = len(messages)
     print(f"Processing {total} emails...")
-    
+
+    # Fetch and parse every email before touching the calendar
+    to_fetch = []
     for i, msg in enumerate(messages):
-        print(f"[{i+1}/{total}] Processing email ID: {msg['id']}")
-        try:
-            content = get_email_content(gmail_service, msg['id'])
-            events = parse_schedule_email(content)
-            
-            if not events:
-                continue
-            
-            # Track which dates are in this email's schedule
-            event_dates = set()
-            
-            for event in events:
-                event_dates.add(event['start'].date())
-                existing_event = get_existing_event(calendar_service, calendar_id, event['start'], event['end'], event['summary'])
-                
-                if existing_event:
-                    # Update it
-                    update_event(calendar_service, calendar_id, existing_event['id'], event)
-                    updated += 1
-                else:
-                    create_event(calendar_service, calendar_id, event)
-                    print(f"    Added: {event['start']} - {event['summary']}")
-                    added += 1
-            
-            # Check for deletions: get the date range covered by this email
-            if event_dates:
-                min_date = min(event_dates)
-                max_date = max(event_dates)
-                
-                # Get all calendar events in this date range
-                calendar_events = get_events_in_range(
-                    calendar_service, 
-                    calendar_id, 
-                    min_date, 
-                    max_date,
-                    events[0]['summary']  # Use the summary from parsed events
-                )
-                
-                # Delete events that are in the calendar but not in the email
-                for cal_event in calendar_events:
-                    # Extract the date from the calendar event
-                    from datetime import datetime
-                    event_start = datetime.fromisoformat(cal_event['start']['dateTime'].replace('Z', '+00:00'))
-                    event_date = event_start.date()
-                    
-                    if event_date not in event_dates:
-                        print(f"    Deleting removed shift on {event_date}")
-                        delete_event(calendar_service, calendar_id, cal_event['id'])
-                        deleted += 1
-                    
-        except Exception as e:
-            print(f"  Error processing email {msg['id']}: {e}")
-            
-    return added, updated, deleted
+        if (ledger is not None and not force
+                and all(is_done(ledger, msg['id'], key) for key in target_keys)):
+            print(f"[{i+1}/{total}] Skipping already applied email ID: {msg['id']}")
+        else:
+            to_fetch.append(msg['id'])
+
+    # A dry run applies nothing, so it records nothing either
+    outcome_ledger = None if dry_run else ledger
+
+    # Emails parsed on an earlier run need neither a download nor parsing
+    cached = {}
+    if parse_cache is not None:
+        cached = get_cached_schedules(parse_cache, to_fetch, PARSER_VERSION, event_summary(summary))
+    to_download = [msg_id for msg_id in to_fetch if msg_id not in cached]
+
+    print(f"Fetching {len(to_download)} emails ({len(cached)} cached)...")
+    parsed = []
+    if to_download:
+        parsed = _run_chunked(lambda chunk: _fetch_and_parse(gmail_service, chunk, summary),
+                              to_download, workers, GMAIL_BATCH_SIZE, credentials_of(gmail_service))
+
+    results = dict(cached)  # {msg_id: (internal_date, body_hash, events)} or an exception
+    new_entries = []
+    for msg_id, (email, events, error) in zip(to_download, parsed):
+        body_hash = content_hash(email['html']) if email is not None else None
+        if error is not None:
+            results[msg_id] = (None, body_hash, error)
+        else:
+            results[msg_id] = (email['internalDate'], body_hash, events)
+            new_entries.append((msg_id, email['internalDate'], body_hash, events))
+    if parse_cache is not None:
+        store_schedules(parse_cache, new_entries, PARSER_VERSION)
+
+    schedules = []
+    body_hashes = {}
+    for i, msg_id in enumerate(to_fetch):
+        print(f"[{i+1}/{len(to_fetch)}] Processing email ID: {msg_id}")
+        internal_date, body_hashes[msg_id], events = results[msg_id]
+        if isinstance(events, Exception):
+            print(f"  Error processing email {msg_id}: {events}")
+            if retry is not None and is_retryable(events):
+                retry.add(msg_id)
+            if outcome_ledger is not None:
+                for key in target_keys:
+                    record_outcome(outcome_ledger, msg_id, key, body_hashes[msg_id], 'failed')
+            continue
+
+        if events:
+            schedules.append((msg_id, internal_date, events))
+        elif outcome_ledger is not None:
+            for key in target_keys:
+                record_outcome(outcome_ledger, msg_id, key, body_hashes[msg_id], 'empty')
+
+    if not schedules:
+        return added, updated, deleted, unchanged
+
+    final = coalesce_schedules(schedules)
+    if settled is not None:
+        # Newer emails from earlier chunks already decided these dates
+        covered = set(final)
+        final = {day: value for day, value in final.items() if day not in settled}
+        settled.update(covered)
+    internal_dates = {msg_id: internal_date for msg_id, internal_date, _ in schedules}
+    finals = [_without_claimed_dates(final, internal_dates, ledger, key) if ledger is not None and final else final
+              for key in target_keys]
+    failed_messages = [set() for _ in target_keys]
+
+    if any(finals):
+        def apply_target(target, target_final):
+            if not target_final:
+                return (0, 0, 0, 0), set()
+            label = f"[{target.key}] " if len(targets) > 1 else ""
+            return _apply_to_target(target_final, target, dry_run, label)
+
+        if len(targets) == 1:
+            outcomes = [apply_target(targets[0], finals[0])]
+        else:
+            def run(target, target_final):
+                with worker_http(credentials_of(getattr(target, 'service', None))):
+                    return apply_target(target, target_final)
+
+            outcomes = list(_pool('target', len(targets)).map(run, targets, finals))
+
+        for (counts, target_failed), messages_failed in zip(outcomes, failed_messages):
+            added, updated, deleted, unchanged = (total + count for total, count
+                                                  in zip((added, updated, deleted, unchanged), counts))
+            messages_failed.update(target_failed)
+            if retry is not None:
+                retry.update(target_failed)
+
+    if outcome_ledger is not None:
+        for key, messages_failed in zip(target_keys, failed_messages):
+            for msg_id, internal_date, events in schedules:
+                if msg_id in messages_failed:
+                    record_outcome(outcome_ledger, msg_id, key, body_hashes[msg_id], 'failed')
+                    continue
+                days = [ShiftEvent.of(event).day for event in events]
+                record_outcome(outcome_ledger, msg_id, key, body_hashes[msg_id], 'applied',
+                               internal_date, (min(days), max(days)))
+
+    return added, updated, deleted, unchanged
@@ -0,0 +1,149 @@
+import json
+import random
+import threading
+import time
+from googleapiclient.errors import HttpError
+
+# Gmail allows 250 quota units per user per second; methods cost different amounts
+GMAIL_UNITS_PER_SECOND = 250
+GMAIL_METHOD_COSTS = {
+    'gmail.users.getProfile': 1,
+    'gmail.users.history.list': 2,
+    'gmail.users.messages.list': 5,
+    'gmail.users.messages.get': 5,
+}
+GMAIL_DEFAULT_COST = 5
+
+# Calendar allows 600 queries per user per minute; the burst lets a full batch through
+CALENDAR_REQUESTS_PER_SECOND = 10
+CALENDAR_BURST = 50
+
+# Start value and bounds for the number of requests in flight per API and user
+INITIAL_CONCURRENCY = 8
+MAX_CONCURRENCY = 16
+
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+class TokenBucket:
+    """
+    Token bucket that refills at `rate` tokens per second up to `capacity`.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, cost=1):
+        """
+        Takes `cost` tokens, sleeping until enough are available.
+        A cost larger than the capacity (e.g. a big batch request) waits for
+        a full bucket and leaves it in debt, so the requests after it wait
+        until the whole cost has been refilled.
+        """
+        needed = min(cost, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= needed:
+                    self.tokens -= cost
+                    return
+                wait = (needed - self.tokens) / self.rate
+            time.sleep(wait)
+
+class AdaptiveConcurrency:
+    """
+    Limits the number of requests in flight. The limit is halved whenever the
+    API throttles and grows by one after a full window of successful requests
+    (additive increase, multiplicative decrease).
+    """
+    def __init__(self, limit=INITIAL_CONCURRENCY, max_limit=MAX_CONCURRENCY):
+        self.limit = limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self.successes = 0
+        self.condition = threading.Condition()
+
+    def __enter__(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def succeeded(self):
+        with self.condition:
+            self.successes += 1
+            if self.successes >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self.successes = 0
+                self.condition.notify_all()
+
+    def throttled(self):
+        with self.condition:
+            self.limit = max(1, self.limit // 2)
+            self.successes = 0
+
+def is_rate_limit_error(error):
+    """
+    Checks if an API error means the caller is sending requests too fast.
+    """
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status == 429:
+        return True
+    if error.resp.status != 403:
+        return False
+    try:
+        details = json.loads(error.content.decode('utf-8'))['error']['errors']
+    except (ValueError, KeyError, TypeError):
+        return False
+    return any(detail.get('reason') in RATE_LIMIT_REASONS for detail in details)
+
+def is_retryable(error):
+    """
+    Checks if a failed request may succeed when it is retried later.
+    """
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRYABLE_STATUSES or is_rate_limit_error(error)
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+def backoff_delay(attempt, base=1.0, cap=32.0):
+    """
+    Exponential backoff with full jitter: a random delay of up to base * 2^attempt seconds.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+_limits = {}
+_limits_lock = threading.Lock()
+
+def get_limits(api, user_key):
+    """
+    Returns the shared (TokenBucket, AdaptiveConcurrency) pair for an API and user.
+    """
+    with _limits_lock:
+        if (api, user_key) not in _limits:
+            if api == 'gmail':
+                bucket = TokenBucket(GMAIL_UNITS_PER_SECOND, GMAIL_UNITS_PER_SECOND)
+            else:
+                bucket = TokenBucket(CALENDAR_REQUESTS_PER_SECOND, CALENDAR_BURST)
+            _limits[(api, user_key)] = (bucket, AdaptiveConcurrency())
+        return _limits[(api, user_key)]
+
+def request_cost(method_id):
+    """
+    Returns (api, cost) for an API method ID like 'gmail.users.messages.get'.
+    """
+    api = method_id.split('.', 1)[0]
+    if api == 'gmail':
+        return api, GMAIL_METHOD_COSTS.get(method_id, GMAIL_DEFAULT_COST)
+    return api, 1
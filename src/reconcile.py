@@ -0,0 +1,125 @@
+from datetime import date
+from calendar_service import event_matches
+from events import ShiftEvent
+
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+NOOP = 'noop'
+
+class PlanEntry:
+    """
+    One date of a plan: what to do (CREATE, UPDATE, DELETE or NOOP), the
+    desired event (None for DELETE), the existing calendar event (None for
+    CREATE) and the message ID of the email the desired state came from.
+    """
+    def __init__(self, action, day, event, existing, source):
+        self.action = action
+        self.day = day
+        self.event = event
+        self.existing = existing
+        self.source = source
+
+    def operation(self):
+        """
+        Returns the write operation tuple execute_batch takes, or None for NOOP.
+        """
+        if self.action == CREATE:
+            return ('create', self.event)
+        if self.action == UPDATE:
+            return ('update', self.existing['id'], self.event)
+        if self.action == DELETE:
+            return ('delete', self.existing['id'])
+        return None
+
+    def describe(self):
+        if self.event is not None:
+            times = f"{self.event.start.strftime('%H:%M')}-{self.event.end.strftime('%H:%M')}"
+            return f"{self.action:6} {self.day} {times} {self.event.summary}"
+        return f"{self.action:6} {self.day} (event {self.existing['id']})"
+
+    def __repr__(self):
+        return f"PlanEntry({self.describe()!r})"
+
+class Plan:
+    """
+    The changes that bring the calendar from its actual to its desired state,
+    one entry per date and existing event, in date order.
+    """
+    def __init__(self, entries):
+        self.entries = sorted(entries, key=lambda entry: entry.day)
+
+    def writes(self):
+        """
+        Returns the entries that need a write, in date order. An existing
+        event is written at most once, even if several entries target it.
+        """
+        writes = []
+        written_ids = set()
+        for entry in self.entries:
+            if entry.action == NOOP:
+                continue
+            if entry.existing is not None:
+                if entry.existing['id'] in written_ids:
+                    continue
+                written_ids.add(entry.existing['id'])
+            writes.append(entry)
+        return writes
+
+    def count(self, action):
+        return sum(1 for entry in self.entries if entry.action == action)
+
+    def describe(self):
+        """
+        Returns the plan as printable lines: every write, then a summary.
+        """
+        lines = [f"  {entry.describe()}" for entry in self.writes()]
+        lines.append(f"Plan: {self.count(CREATE)} to create, {self.count(UPDATE)} to update, "
+                     f"{self.count(DELETE)} to delete, {self.count(NOOP)} unchanged")
+        return lines
+
+def coalesce_schedules(schedules):
+    """
+    Works out the final schedule per date from several parsed emails.
+    schedules: list of (message_id, internal_date, events) tuples; events are
+    ShiftEvent objects (dicts with the same keys are converted).
+    Every email covers the days from its first to its last shift; for each
+    covered day the newest email (by internal_date) wins, either with its
+    shift for that day or with None when it has no shift there (day off).
+    Returns a dict {date: (ShiftEvent or None, message_id)}.
+    """
+    final = {}
+    for msg_id, internal_date, events in sorted(schedules, key=lambda s: s[1], reverse=True):
+        events_by_day = {event.day: event for event in map(ShiftEvent.of, events)}
+        for day in range(min(events_by_day), max(events_by_day) + 1):
+            if day not in final:
+                final[day] = (events_by_day.get(day), msg_id)
+    return {date.fromordinal(day): value for day, value in final.items()}
+
+def build_plan(desired, actual):
+    """
+    Diffs the desired state against the actual state of the calendar.
+    desired: {date: (event or None, message_id)}, as coalesce_schedules returns.
+    actual: {date: [calendar events]}, as build_day_index returns.
+    Dates that should be free but have no event need nothing and are left
+    out of the plan. A date with several events keeps only its first one;
+    the others are deleted (ahead of the first one's entry).
+    Returns a Plan.
+    """
+    entries = []
+    for day, (event, msg_id) in desired.items():
+        existing_events = actual.get(day, [])
+        if event is None:
+            for existing in existing_events:
+                entries.append(PlanEntry(DELETE, day, None, existing, msg_id))
+            continue
+        for extra in existing_events[1:]:
+            entries.append(PlanEntry(DELETE, day, None, extra, msg_id))
+        existing = existing_events[0] if existing_events else None
+        if existing and event_matches(existing, event):
+            entries.append(PlanEntry(NOOP, day, event, existing, msg_id))
+        elif existing:
+            entries.append(PlanEntry(UPDATE, day, event, existing, msg_id))
+        else:
+            entries.append(PlanEntry(CREATE, day, event, None, msg_id))
+    return Plan(entries)
@@ -0,0 +1,83 @@
+import threading
+from datetime import datetime, timedelta, timezone
+import google_auth_httplib2
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from auth import get_credentials
+from transport import build_http
+
+# Credentials that expire within this margin are refreshed before they are
+# used, so a long run never has its requests rejected halfway through
+REFRESH_MARGIN = timedelta(minutes=10)
+
+# (api, version) -> discovery document, as bundled with googleapiclient
+_discovery_docs = {}
+
+# token_path -> {'lock', 'credentials', 'http', 'services'}
+_sessions = {}
+_lock = threading.Lock()
+
+def get_discovery_doc(api, version):
+    """
+    Returns the discovery document of an API. It is read from the copy
+    bundled with googleapiclient (never fetched over the network), and only
+    once per process.
+    """
+    with _lock:
+        if (api, version) not in _discovery_docs:
+            doc = get_static_doc(api, version)
+            if doc is None:
+                raise ValueError(f"No discovery document for {api} {version}")
+            _discovery_docs[(api, version)] = doc
+        return _discovery_docs[(api, version)]
+
+def refresh_if_expiring(credentials, http, token_path=None):
+    """
+    Refreshes credentials that expire within REFRESH_MARGIN, over the given
+    httplib2.Http so the token endpoint connection is pooled too.
+    Saves refreshed credentials to token_path if it is given.
+    Returns True if the credentials were refreshed.
+    """
+    if credentials.expiry is None or not credentials.refresh_token:
+        return False
+    # google-auth keeps expiry as a naive UTC datetime
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    if credentials.expiry - now > REFRESH_MARGIN:
+        return False
+    credentials.refresh(google_auth_httplib2.Request(http))
+    if token_path:
+        with open(token_path, 'w') as token:
+            token.write(credentials.to_json())
+    return True
+
+def _session(token_path):
+    with _lock:
+        return _sessions.setdefault(token_path, {'lock': threading.Lock()})
+
+def get_service(api, version, token_path='token.json', interactive=True):
+    """
+    Returns the service for an API and account, built only once per process.
+    All services of an account share one copy of its credentials (read from
+    token_path once) and one pooled, keep-alive http object, so TLS handshakes
+    happen once per host instead of once per service.
+    """
+    session = _session(token_path)
+    with session['lock']:
+        if 'credentials' not in session:
+            credentials = get_credentials(token_path, interactive=interactive)
+            session.update(credentials=credentials, http=build_http(credentials), services={})
+        refresh_if_expiring(session['credentials'], session['http'].http, token_path)
+
+        services = session['services']
+        if (api, version) not in services:
+            services[(api, version)] = build_from_document(get_discovery_doc(api, version),
+                                                           http=session['http'])
+        return services[(api, version)]
+
+def drop_services(token_path='token.json'):
+    """
+    Forgets the credentials and services of an account, so the next
+    get_service call loads and builds them again.
+    """
+    with _lock:
+        _sessions.pop(token_path, None)
@@ -0,0 +1,152 @@
+import os
+from gmail_service import find_new_schedule_emails
+from sync_state import load_state, save_state, STATE_FILE
+from metrics import stage
+
+def _open_synced_mirror(path, calendar_service, calendar_id):
+    """
+    Opens the calendar mirror and syncs it with a calendar.
+    Returns the mirror, or None if it can't be synced.
+    """
+    from calendar_mirror import open_mirror, sync_mirror
+
+    mirror = open_mirror(path)
+    print(f"Syncing local calendar mirror of {calendar_id}...")
+    try:
+        with stage('calendar_read'):
+            changed = sync_mirror(mirror, calendar_service, calendar_id)
+        print(f"Calendar mirror up to date ({changed} changed events downloaded)")
+        return mirror
+    except Exception as e:
+        print(f"Calendar mirror sync failed, reading the calendar directly: {e}")
+        mirror.close()
+        return None
+
+def apply_message_pages(gmail_service, calendar_service, targets, pages, state_dir='.', force=False,
+                        workers=1, summary=None, dry_run=False, settled=None, on_page=None, retry=None):
+    """
+    Applies schedule emails using the ledger, parse cache and calendar mirror
+    kept in state_dir. With dry_run=True the changes are only printed.
+    targets: (calendar_id, summary) tuples, as parse_calendar_targets returns
+    (a summary of None means the summary argument; a calendar_id of None, a
+    calendar a dry run would create), or sinks such as IcsSink.
+    The emails are parsed once and applied to every target concurrently.
+    Calendars are read from the mirror, or directly if it can't be synced.
+    pages: lists of messages, newest first, as iter_schedule_email_pages yields
+    them. Each page is applied as soon as it arrives; dates a newer page
+    already covered are left alone, so the newest email still wins. Pass
+    settled to start from the dates an earlier, interrupted run settled.
+    on_page, if given, is called as on_page(page, totals) after every page
+    has been applied, with the counts so far.
+    If a retry set is given, the IDs of the failed messages a later run may
+    still apply are added to it (see process_messages).
+    Returns a tuple (added_count, updated_count, deleted_count, unchanged_count).
+    """
+    # Imported here so runs without new emails never load the processing stack
+    from processor import process_messages, CalendarTarget
+    from ledger import open_ledger, LEDGER_FILE
+    from parse_cache import open_parse_cache, PARSE_CACHE_FILE
+    from calendar_mirror import MIRROR_FILE
+    from email_parser import event_summary
+
+    ledger = open_ledger(os.path.join(state_dir, LEDGER_FILE))
+    parse_cache = open_parse_cache(os.path.join(state_dir, PARSE_CACHE_FILE))
+    synced_targets = []
+    try:
+        for target in targets:
+            if not isinstance(target, tuple):
+                synced_targets.append(target)
+                continue
+            # Every calendar gets its own mirror connection, so they can be written concurrently
+            calendar_id, target_summary = target
+            mirror = None
+            if calendar_id is not None:
+                mirror = _open_synced_mirror(os.path.join(state_dir, MIRROR_FILE), calendar_service, calendar_id)
+            synced_targets.append(CalendarTarget(calendar_service, calendar_id, event_summary(target_summary or summary),
+                                                 mirror, batch_writes=True, workers=workers))
+
+        totals = (0, 0, 0, 0)
+        settled = set() if settled is None else settled
+        for page in pages:
+            counts = process_messages(gmail_service, page, synced_targets, ledger=ledger, force=force,
+                                      workers=workers, dry_run=dry_run, parse_cache=parse_cache,
+                                      settled=settled, retry=retry)
+            totals = tuple(total + count for total, count in zip(totals, counts))
+            if on_page is not None:
+                on_page(page, totals)
+        return totals
+    finally:
+        ledger.close()
+        parse_cache.close()
+        for target in synced_targets:
+            if getattr(target, 'mirror', None) is not None:
+                target.mirror.close()
+
+def apply_messages(gmail_service, calendar_service, targets, messages, state_dir='.', force=False,
+                   workers=1, summary=None, dry_run=False, retry=None):
+    """
+    Applies a list of schedule emails in one go, see apply_message_pages.
+    Returns a tuple (added_count, updated_count, deleted_count, unchanged_count).
+    """
+    return apply_message_pages(gmail_service, calendar_service, targets, [messages], state_dir,
+                               force=force, workers=workers, summary=summary, dry_run=dry_run, retry=retry)
+
+def calendar_destination(calendar_ids, calendar_name):
+    """
+    Returns the destination sync_new_emails keeps the Gmail cursor of a
+    calendar configuration under: the CALENDAR_ID setting (which may list
+    several calendars), or the calendar name if there is none.
+    """
+    if calendar_ids:
+        return 'calendar:' + ','.join(part.strip() for part in calendar_ids.split(','))
+    return f'calendar-name:{calendar_name}'
+
+def sync_new_emails(gmail_service, open_calendar, state_dir='.', force=False, workers=1, summary=None,
+                    dry_run=False, sink=None, destination='calendar'):
+    """
+    Applies the schedule emails that arrived since the last sync of this account.
+    Only looks at messages added since the Gmail history ID saved in
+    state_dir; the first sync (or an expired history ID, or force) searches
+    the last 2 months, max 10 results.
+    Every destination keeps its own history ID, so emails one destination
+    consumed are still applied to another: destination names the calendars
+    (see calendar_destination), and a sink uses sink.key instead.
+    open_calendar is called only when there are new emails, and returns a
+    tuple (calendar_service, targets), where targets is a list of
+    (calendar_id, summary) tuples (see apply_message_pages). It is never called when the emails
+    go to a sink instead (see apply_messages).
+    With dry_run=True the changes are only printed, and the saved history ID
+    is left alone so the next real sync still sees the same emails. It is
+    also left alone when an email failed in a way a later sync may fix (a
+    retryable error, or a calendar write), so the next sync retries it; the
+    ledger skips the ones that were applied. Emails that can never be
+    applied (e.g. deleted, or not parseable) don't hold the sync back.
+    Returns the tuple apply_messages returns, or None if there were no new emails.
+    """
+    if sink is not None:
+        destination = sink.key
+    state_path = os.path.join(state_dir, STATE_FILE)
+    state = load_state(state_path)
+    cursors = state.setdefault('history_ids', {})
+    with stage('search'):
+        messages, history_id = find_new_schedule_emails(
+            gmail_service, None if force else cursors.get(destination),
+            max_results=10, newer_than='2m')
+
+    counts = None
+    retry = set()
+    if not messages:
+        print("No schedule emails found.")
+    else:
+        calendar_service, targets = open_calendar() if sink is None else (None, [sink])
+        counts = apply_messages(gmail_service, calendar_service, targets, messages, state_dir,
+                                force=force, workers=workers, summary=summary, dry_run=dry_run,
+                                retry=retry)
+
+    # Only advance the cursor once the new messages have been applied
+    if retry and not dry_run:
+        print(f"{len(retry)} emails failed, they will be retried on the next run")
+    elif not dry_run:
+        cursors[destination] = history_id
+        save_state(state, state_path)
+    return counts
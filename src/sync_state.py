@@ -0,0 +1,30 @@
+import json
+import os
+
+# Stored next to token.json, holds cursors that let runs pick up where the last one stopped
+STATE_FILE = 'sync_state.json'
+
+def load_state(path=STATE_FILE):
+    """
+    Loads the saved sync state. Returns an empty dict if there is none yet.
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not read sync state from {path}, starting fresh: {e}")
+        return {}
+
+def save_state(state, path=STATE_FILE):
+    """
+    Saves the sync state atomically and durably, so a crash never leaves a
+    half-written file or loses a state that was reported as saved.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
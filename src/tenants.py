@@ -0,0 +1,55 @@
+import json
+import os
+
+# The daemon's list of accounts, see load_roster
+ROSTER_FILE = 'tenants.json'
+
+# Seconds between two syncs of an account
+DEFAULT_INTERVAL = 300
+
+def load_roster(path=ROSTER_FILE):
+    """
+    Loads the roster of accounts the daemon syncs. The roster is a JSON list
+    of objects like:
+        {"name": "anna", "token_file": "tokens/anna.json",
+         "calendar_id": "...@group.calendar.google.com",
+         "event_summary": "Work at McDonald's", "interval": 300}
+    Only name and token_file are required. calendar_name (default "Work
+    Schedule") is used when calendar_id is missing. Like CALENDAR_ID,
+    calendar_id may list several calendars, e.g. "primary,team@...=Team shift".
+    state_dir (default state/<name>) holds the account's sync state, ledger
+    and calendar mirror.
+    Relative paths are relative to the roster file.
+    Returns a list of tenant dicts with every key filled in.
+    Raises ValueError if the roster is invalid.
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError(f"{path} must contain a JSON list of accounts")
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    tenants = []
+    names = set()
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get('name') or not entry.get('token_file'):
+            raise ValueError(f"Every account in {path} needs a name and a token_file: {entry}")
+        name = entry['name']
+        if name in names:
+            raise ValueError(f"Account {name} is listed twice in {path}")
+        names.add(name)
+
+        interval = entry.get('interval', DEFAULT_INTERVAL)
+        if not isinstance(interval, (int, float)) or interval <= 0:
+            raise ValueError(f"Account {name} has an invalid interval: {interval}")
+
+        tenants.append({
+            'name': name,
+            'token_file': os.path.join(base_dir, entry['token_file']),
+            'calendar_id': entry.get('calendar_id'),
+            'calendar_name': entry.get('calendar_name', 'Work Schedule'),
+            'event_summary': entry.get('event_summary', 'Work at McDonald\'s'),
+            'interval': interval,
+            'state_dir': os.path.join(base_dir, entry.get('state_dir', os.path.join('state', name))),
+        })
+    return tenants
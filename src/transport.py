@@ -0,0 +1,227 @@
+import threading
+import time
+from contextlib import contextmanager
+import httplib2
+import google_auth_httplib2
+import google.auth.credentials
+from googleapiclient.http import BatchHttpRequest
+from rate_limit import get_limits, request_cost, is_retryable, is_rate_limit_error, backoff_delay
+from metrics import method_id_of, record_call, record_retry
+
+# How many times a failed request is retried before giving up
+MAX_RETRIES = 5
+
+# Body bytes read from the network (before gzip decompression) in this process
+_bytes_received = 0
+_lock = threading.Lock()
+
+# httplib2 connections are not thread safe, so worker threads get their own
+_local = threading.local()
+
+def _count_bytes(n):
+    global _bytes_received
+    with _lock:
+        _bytes_received += n
+
+def bytes_received():
+    """
+    Returns the number of response body bytes received over the network so far.
+    """
+    return _bytes_received
+
+def reset_bytes_received():
+    global _bytes_received
+    with _lock:
+        _bytes_received = 0
+
+class _CountingHTTPSConnection(httplib2.HTTPSConnectionWithTimeout):
+    """
+    HTTPS connection that counts the raw (still compressed) response bytes.
+    """
+    def getresponse(self):
+        response = super().getresponse()
+        read = response.read
+
+        def counting_read(*args, **kwargs):
+            data = read(*args, **kwargs)
+            _count_bytes(len(data))
+            return data
+
+        response.read = counting_read
+        return response
+
+class GzipHttp(httplib2.Http):
+    """
+    httplib2.Http that asks Google APIs for gzip-compressed responses and
+    counts the bytes received. Google only compresses responses when the
+    user agent contains "gzip" as well as sending Accept-Encoding.
+    """
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS, connection_type=None):
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        headers.setdefault('accept-encoding', 'gzip')
+        user_agent = headers.get('user-agent', '')
+        if 'gzip' not in user_agent:
+            headers['user-agent'] = f"{user_agent} (gzip)".strip()
+        if connection_type is None and uri.startswith('https:'):
+            connection_type = _CountingHTTPSConnection
+        return super().request(uri, method=method, body=body, headers=headers,
+                               redirections=redirections, connection_type=connection_type)
+
+def build_http(credentials):
+    """
+    Returns an authorized http object for googleapiclient's build().
+    """
+    return google_auth_httplib2.AuthorizedHttp(credentials, http=GzipHttp())
+
+def credentials_of(service):
+    """
+    Returns the credentials a service built with build_http uses, or None.
+    """
+    credentials = getattr(getattr(service, '_http', None), 'credentials', None)
+    if isinstance(credentials, google.auth.credentials.Credentials):
+        return credentials
+    return None
+
+@contextmanager
+def worker_http(credentials):
+    """
+    Makes requests executed on the current thread use an http object owned by
+    this thread (and reused by it across tasks), authorized with credentials.
+    With credentials None, requests use the http object of their service.
+    """
+    previous = getattr(_local, 'http', None)
+    if credentials is None:
+        _local.http = None
+    else:
+        cache = _local.__dict__.setdefault('cache', {})
+        if id(credentials) not in cache:
+            cache[id(credentials)] = build_http(credentials)
+        _local.http = cache[id(credentials)]
+    try:
+        yield
+    finally:
+        _local.http = previous
+
+class _Unlimited:
+    """
+    Stand-in limits for requests whose API is unknown (e.g. test doubles).
+    """
+    def acquire(self, cost=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def succeeded(self):
+        pass
+
+    def throttled(self):
+        pass
+
+def _inner_requests(request):
+    """
+    Returns the requests a batch request sends, or [request] for a single request.
+    """
+    if isinstance(request, BatchHttpRequest):
+        return [request._requests[request_id] for request_id in request._order]
+    return [request]
+
+def _limits_for(request, http):
+    """
+    Returns (bucket, concurrency, cost) for a request or batch request.
+    Limits are shared per API and per user (credentials).
+    """
+    inner = _inner_requests(request)
+    method_ids = [getattr(r, 'methodId', None) for r in inner]
+    if not inner or not all(isinstance(method_id, str) for method_id in method_ids):
+        return _Unlimited(), _Unlimited(), 0
+
+    api = request_cost(method_ids[0])[0]
+    cost = sum(request_cost(method_id)[1] for method_id in method_ids)
+    credentials = getattr(http or getattr(inner[0], 'http', None), 'credentials', None)
+    bucket, concurrency = get_limits(api, id(credentials))
+    return bucket, concurrency, cost
+
+def execute(request, max_retries=MAX_RETRIES):
+    """
+    Executes an API request (or batch request) on the current thread's http object.
+    Waits for the per-user quota of the API and retries throttled or failed
+    requests with exponential backoff and jitter, up to max_retries times.
+    """
+    http = getattr(_local, 'http', None)
+    bucket, concurrency, cost = _limits_for(request, http)
+    method_ids = [method_id_of(r) for r in _inner_requests(request)]
+    attempt = 0
+    while True:
+        bucket.acquire(cost)
+        for method_id in method_ids:
+            record_call(method_id)
+        try:
+            with concurrency:
+                if http is None:
+                    response = request.execute()
+                else:
+                    response = request.execute(http=http)
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            if is_rate_limit_error(e):
+                concurrency.throttled()
+            for method_id in method_ids:
+                record_retry(method_id)
+            delay = backoff_delay(attempt)
+            print(f"  Request failed ({e}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+            attempt += 1
+        else:
+            concurrency.succeeded()
+            return response
+
+def run_batch(service, requests, batch_size):
+    """
+    Executes requests in HTTP batch requests of up to batch_size calls.
+    Items that fail with a retryable error are retried in a later batch.
+    Returns a list of (response, exception) tuples in the same order as requests.
+    Exactly one of the two is set for each request.
+    """
+    results = [None] * len(requests)
+
+    def callback(request_id, response, exception):
+        results[int(request_id)] = (response, exception)
+
+    pending = list(range(len(requests)))
+    attempt = 0
+    while True:
+        for offset in range(0, len(pending), batch_size):
+            chunk = pending[offset:offset + batch_size]
+            batch = service.new_batch_http_request(callback=callback)
+            for index in chunk:
+                batch.add(requests[index], request_id=str(index))
+            try:
+                # Not retried here: the failed items are retried below, like throttled ones
+                execute(batch, max_retries=0)
+            except Exception as e:
+                # The whole batch failed (e.g. network error); mark the unanswered items
+                for index in chunk:
+                    if results[index] is None:
+                        results[index] = (None, e)
+
+        retry = [index for index in pending if is_retryable(results[index][1])]
+        if not retry or attempt >= MAX_RETRIES:
+            return results
+
+        if any(is_rate_limit_error(results[index][1]) for index in retry):
+            _, concurrency, _ = _limits_for(requests[retry[0]], getattr(_local, 'http', None))
+            concurrency.throttled()
+        delay = backoff_delay(attempt)
+        print(f"  {len(retry)} batched requests failed, retrying in {delay:.1f}s...")
+        time.sleep(delay)
+        for index in retry:
+            results[index] = None
+            record_retry(method_id_of(requests[index]))
+        pending = retry
+        attempt += 1
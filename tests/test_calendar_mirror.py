@@ -0,0 +1,103 @@
+import unittest
+from unittest.mock import Mock, patch
+from datetime import date
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from googleapiclient.errors import HttpError
+from calendar_mirror import open_mirror, sync_mirror, get_mirrored_events, record_writes
+
+def make_event(event_id, start, summary='Work at McDonald\'s'):
+    return {'id': event_id, 'summary': summary, 'start': {'dateTime': start}, 'end': {'dateTime': start}}
+
+class TestCalendarMirror(unittest.TestCase):
+    def setUp(self):
+        """Set up an in-memory mirror and a mock service for testing"""
+        self.mirror = open_mirror(':memory:')
+        self.service = Mock()
+        self.calendar_id = 'test_calendar_id'
+        
+    def tearDown(self):
+        self.mirror.close()
+        
+    def test_full_sync_then_incremental(self):
+        """Test the first full sync and a following incremental sync"""
+        # Full sync over two pages
+        self.service.events().list().execute.side_effect = [
+            {'items': [make_event('event1', '2025-11-27T11:40:00+01:00')], 'nextPageToken': 'page2'},
+            {'items': [make_event('event2', '2025-11-28T15:40:00+01:00')], 'nextSyncToken': 'token1'},
+        ]
+        self.assertEqual(sync_mirror(self.mirror, self.service, self.calendar_id), 2)
+        self.assertNotIn('syncToken', self.service.events().list.call_args[1])
+        
+        # Incremental sync: event1 was cancelled, event3 is new
+        self.service.events().list().execute.side_effect = [
+            {'items': [{'id': 'event1', 'status': 'cancelled'},
+                       make_event('event3', '2025-11-29T09:40:00+01:00')],
+             'nextSyncToken': 'token2'},
+        ]
+        self.assertEqual(sync_mirror(self.mirror, self.service, self.calendar_id), 2)
+        self.assertEqual(self.service.events().list.call_args[1]['syncToken'], 'token1')
+        
+        events = get_mirrored_events(self.mirror, self.calendar_id, date(2025, 11, 1), date(2025, 11, 30),
+                                     'Work at McDonald\'s')
+        self.assertEqual([event['id'] for event in events], ['event2', 'event3'])
+        
+    def test_expired_sync_token_triggers_full_resync(self):
+        """Test recovering from a 410 Gone response"""
+        self.service.events().list().execute.side_effect = [
+            {'items': [make_event('stale', '2025-11-27T11:40:00+01:00')], 'nextSyncToken': 'token1'},
+        ]
+        sync_mirror(self.mirror, self.service, self.calendar_id)
+        
+        self.service.events().list().execute.side_effect = [
+            HttpError(Mock(status=410, reason='Gone'), b''),
+            {'items': [make_event('fresh', '2025-11-28T11:40:00+01:00')], 'nextSyncToken': 'token2'},
+        ]
+        with patch('builtins.print'):
+            sync_mirror(self.mirror, self.service, self.calendar_id)
+        
+        events = get_mirrored_events(self.mirror, self.calendar_id, date(2025, 11, 1), date(2025, 11, 30),
+                                     'Work at McDonald\'s')
+        self.assertEqual([event['id'] for event in events], ['fresh'])
+        
+    def test_range_query_filters_dates_and_summary(self):
+        """Test that only events on the requested days with the summary are returned"""
+        self.service.events().list().execute.side_effect = [
+            {'items': [
+                make_event('inside', '2025-11-27T11:40:00+01:00'),
+                make_event('other', '2025-11-27T10:00:00+01:00', summary='Doctor Appointment'),
+                # 23:30 UTC on Nov 30 is already Dec 1 in Budapest
+                make_event('outside', '2025-11-30T23:30:00Z'),
+            ], 'nextSyncToken': 'token1'},
+        ]
+        sync_mirror(self.mirror, self.service, self.calendar_id)
+        
+        events = get_mirrored_events(self.mirror, self.calendar_id, date(2025, 11, 27), date(2025, 11, 30),
+                                     'Work at McDonald\'s')
+        self.assertEqual([event['id'] for event in events], ['inside'])
+        
+    def test_record_writes(self):
+        """Test that successful writes are reflected in the mirror"""
+        self.service.events().list().execute.side_effect = [
+            {'items': [make_event('event1', '2025-11-27T11:40:00+01:00')], 'nextSyncToken': 'token1'},
+        ]
+        sync_mirror(self.mirror, self.service, self.calendar_id)
+        
+        operations = [('delete', 'event1'), ('create', {}), ('create', {})]
+        results = [
+            ('', None),
+            (make_event('event2', '2025-11-28T11:40:00+01:00'), None),
+            (None, Exception('Backend Error')),
+        ]
+        record_writes(self.mirror, self.calendar_id, operations, results)
+        
+        events = get_mirrored_events(self.mirror, self.calendar_id, date(2025, 11, 1), date(2025, 11, 30),
+                                     'Work at McDonald\'s')
+        self.assertEqual([event['id'] for event in events], ['event2'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,7 +7,7 @@ import os
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
 
-from calendar_service import get_events_in_range, delete_event
+from calendar_service import get_events_in_range, get_existing_event, build_day_index, event_matches, delete_event, execute_batch, parse_calendar_targets, event_id
 
 class TestCalendarService(unittest.TestCase):
     def setUp(self):
@@ -71,6 +71,93 @@ class TestCalendarService(unittest.TestCase):
         # Assert
         self.assertEqual(len(events), 0)
         
+    def test_get_events_in_range_follows_pages(self):
+        """Test that every page of results is read, not only the first"""
+        # Setup
+        start_date = datetime(2025, 11, 1)
+        end_date = datetime(2025, 11, 30)
+        
+        # Mock two pages of results
+        self.service.events().list().execute.side_effect = [
+            {
+                'items': [{'id': 'event1', 'summary': 'Work at McDonald\'s'}],
+                'nextPageToken': 'page2'
+            },
+            {
+                'items': [{'id': 'event2', 'summary': 'Work at McDonald\'s'}]
+            }
+        ]
+        
+        # Execute
+        events = get_events_in_range(self.service, self.calendar_id, start_date, end_date)
+        
+        # Assert
+        self.assertEqual([event['id'] for event in events], ['event1', 'event2'])
+        self.assertEqual(self.service.events().list.call_args[1]['pageToken'], 'page2')
+        
+    def test_get_existing_event_follows_pages(self):
+        """Test that a matching event on a later page is found"""
+        # Mock two pages of results, the work event is on the second one
+        self.service.events().list().execute.side_effect = [
+            {
+                'items': [{'id': 'event1', 'summary': 'Other Event'}],
+                'nextPageToken': 'page2'
+            },
+            {
+                'items': [{'id': 'event2', 'summary': 'Work at McDonald\'s'}]
+            }
+        ]
+        
+        # Execute
+        event = get_existing_event(self.service, self.calendar_id,
+                                   datetime(2025, 11, 27, 11, 40), datetime(2025, 11, 27, 22, 0))
+        
+        # Assert
+        self.assertEqual(event['id'], 'event2')
+        
+    def test_parse_calendar_targets(self):
+        """Test parsing a list of calendar IDs with optional summaries"""
+        self.assertEqual(parse_calendar_targets('primary'), [('primary', None)])
+        self.assertEqual(parse_calendar_targets(' primary , team@group.calendar.google.com=Team shift,'),
+                         [('primary', None), ('team@group.calendar.google.com', 'Team shift')])
+        self.assertEqual(parse_calendar_targets(None), [])
+        
+    def test_build_day_index(self):
+        """Test indexing events by their Budapest start date"""
+        events = [
+            {'id': 'event1', 'start': {'dateTime': '2025-11-27T11:40:00+01:00'}},
+            # 23:30 UTC on Nov 27 is already Nov 28 in Budapest
+            {'id': 'event2', 'start': {'dateTime': '2025-11-27T23:30:00Z'}},
+            {'id': 'event3', 'start': {'dateTime': '2025-11-27T15:40:00+01:00'}},
+        ]
+        
+        index = build_day_index(events)
+        
+        self.assertEqual([event['id'] for event in index[datetime(2025, 11, 27).date()]], ['event1', 'event3'])
+        self.assertEqual([event['id'] for event in index[datetime(2025, 11, 28).date()]], ['event2'])
+        self.assertEqual(len(index), 2)
+        
+    def test_event_matches(self):
+        """Test comparing a calendar event with parsed event data across timezones"""
+        event_data = {
+            'summary': 'Work at McDonald\'s',
+            'start': datetime(2025, 11, 27, 11, 40),
+            'end': datetime(2025, 11, 27, 22, 0),
+            'description': 'Csütörtök: 12:00-22:00'
+        }
+        event = {
+            'id': 'event1',
+            'summary': 'Work at McDonald\'s',
+            'description': 'Csütörtök: 12:00-22:00',
+            'start': {'dateTime': '2025-11-27T11:40:00+01:00', 'timeZone': 'Europe/Budapest'},
+            'end': {'dateTime': '2025-11-27T21:00:00Z'}
+        }
+        
+        self.assertTrue(event_matches(event, event_data))
+        self.assertFalse(event_matches(dict(event, end={'dateTime': '2025-11-27T22:00:00Z'}), event_data))
+        self.assertFalse(event_matches(dict(event, description='Csütörtök: 13:00-22:00'), event_data))
+        self.assertFalse(event_matches(dict(event, summary='Other Event'), event_data))
+        
     def test_delete_event(self):
         """Test deleting an event"""
         # Setup
@@ -116,5 +203,64 @@ class TestCalendarService(unittest.TestCase):
         for event in events:
             self.assertEqual(event['summary'], 'Work at McDonald\'s')
 
+    def test_event_id(self):
+        """Test that new events get a stable, valid ID per calendar, date and summary"""
+        event_data = {
+            'summary': 'Work at McDonald\'s',
+            'start': datetime(2025, 11, 27, 11, 40),
+            'end': datetime(2025, 11, 27, 22, 0),
+            'description': 'Csütörtök: 12:00-22:00'
+        }
+        moved = dict(event_data, start=datetime(2025, 11, 27, 7, 0))
+        next_day = dict(event_data, start=datetime(2025, 11, 28, 11, 40), end=datetime(2025, 11, 28, 22, 0))
+
+        self.assertRegex(event_id('primary', event_data), r'^[a-v0-9]{5,1024}$')
+        self.assertEqual(event_id('primary', event_data), event_id('primary', moved))
+        self.assertNotEqual(event_id('primary', event_data), event_id('primary', next_day))
+        self.assertNotEqual(event_id('primary', event_data), event_id('other', event_data))
+        self.assertNotEqual(event_id('primary', event_data), event_id('primary', dict(event_data, summary='Shift')))
+
+    def test_execute_batch(self):
+        """Test that write operations are split into batches and results keep their order"""
+        # Setup
+        event_data = {
+            'summary': 'Work at McDonald\'s',
+            'start': datetime(2025, 11, 27, 11, 40),
+            'end': datetime(2025, 11, 27, 22, 0),
+            'description': 'Csütörtök: 12:00-22:00'
+        }
+        operations = [('create', event_data), ('update', 'event1', event_data), ('delete', 'event2')]
+        
+        batches = []
+        
+        def new_batch(callback):
+            batch = Mock()
+            batch.added = []
+            batch.add.side_effect = lambda request, request_id: batch.added.append(request_id)
+            
+            def execute():
+                # Answer in reverse order, failing the update
+                for request_id in reversed(batch.added):
+                    if request_id == '1':
+                        callback(request_id, None, Exception('Backend Error'))
+                    else:
+                        callback(request_id, {'id': f'response{request_id}'}, None)
+            
+            batch.execute.side_effect = execute
+            batches.append(batch)
+            return batch
+        
+        self.service.new_batch_http_request.side_effect = new_batch
+        
+        # Execute
+        results = execute_batch(self.service, self.calendar_id, operations, batch_size=2)
+        
+        # Assert
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(results[0], ({'id': 'response0'}, None))
+        self.assertIsNone(results[1][0])
+        self.assertEqual(str(results[1][1]), 'Backend Error')
+        self.assertEqual(results[2], ({'id': 'response2'}, None))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from unittest.mock import patch
+from datetime import date
+import os
+import sys
+import tempfile
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from checkpoint import save_checkpoint, load_checkpoint, clear_checkpoint, skip_to_checkpoint
+
+def page(*ids):
+    return [{'id': msg_id} for msg_id in ids]
+
+class TestCheckpoint(unittest.TestCase):
+    def test_round_trip_and_clear(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'checkpoint.json')
+            self.assertIsNone(load_checkpoint(path))
+
+            save_checkpoint('msg7', 7, (3, 1, 0, 2), {date(2025, 11, 2), date(2025, 11, 1)}, path)
+            checkpoint = load_checkpoint(path)
+
+            self.assertEqual(checkpoint['message_id'], 'msg7')
+            self.assertEqual(checkpoint['position'], 7)
+            self.assertEqual(checkpoint['counts'], (3, 1, 0, 2))
+            self.assertEqual(checkpoint['settled'], {date(2025, 11, 1), date(2025, 11, 2)})
+
+            clear_checkpoint(path)
+            self.assertFalse(os.path.exists(path))
+
+    def test_skip_to_checkpoint(self):
+        pages = [page('m9', 'm8'), page('m7', 'm6', 'm5'), page('m4')]
+
+        self.assertEqual(list(skip_to_checkpoint(iter(pages), 'm6')), [page('m5'), page('m4')])
+        self.assertEqual(list(skip_to_checkpoint(iter(pages), 'm8')), [page('m7', 'm6', 'm5'), page('m4')])
+
+    def test_missing_checkpoint_message_skips_everything(self):
+        with patch('builtins.print') as mock_print:
+            self.assertEqual(list(skip_to_checkpoint(iter([page('m2', 'm1')]), 'gone')), [])
+        self.assertIn('gone', mock_print.call_args[0][0])
+
+if __name__ == '__main__':
+    unittest.main()
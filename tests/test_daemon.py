@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import patch
+from datetime import date
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+from contextlib import redirect_stdout
+
+# Add src, benchmarks and the project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../benchmarks'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import daemon
+from fake_google import FakeGmail, FakeCalendar
+from corpus import generate_email
+
+NOV_1 = 1761955200000
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.services = {}
+        rng = random.Random(0)
+        self.tenants = []
+        for name in ('anna', 'bela', 'cecil'):
+            gmail = FakeGmail()
+            html, _ = generate_email(rng, 7, start_date=date(2025, 11, 1))
+            gmail.add_email(html, NOV_1)
+            self.services[name] = (gmail, FakeCalendar())
+            self.tenants.append({
+                'name': name,
+                'token_file': os.path.join(self.directory, f"{name}.json"),
+                'calendar_id': 'primary',
+                'calendar_name': 'Work Schedule',
+                'event_summary': f"Shift ({name})",
+                'interval': 300,
+                'state_dir': os.path.join(self.directory, name),
+            })
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def open_services(self, tenant):
+        if tenant['name'] == 'bela':
+            raise PermissionError("token expired")
+        return self.services[tenant['name']]
+
+    def run_daemon(self, **kwargs):
+        with patch.object(daemon, 'open_services', side_effect=self.open_services), \
+             redirect_stdout(io.StringIO()) as output:
+            daemon.run_daemon(self.tenants, **kwargs)
+        return output.getvalue()
+
+    def test_failing_tenant_does_not_stop_the_others(self):
+        output = self.run_daemon(workers=2, once=True)
+
+        self.assertIn("[bela] Sync failed: token expired", output)
+        for name in ('anna', 'cecil'):
+            events = self.services[name][1].live_events('primary')
+            self.assertTrue(events)
+            self.assertTrue(all(event['summary'] == f"Shift ({name})" for event in events))
+            self.assertTrue(os.path.exists(os.path.join(self.directory, name, 'sync_state.json')))
+        self.assertEqual(self.services['bela'][1].live_events('primary'), [])
+
+    def test_idle_tenants_only_check_gmail_history(self):
+        self.run_daemon(workers=3, once=True)
+        for gmail, calendar in self.services.values():
+            gmail.calls.clear()
+            calendar.calls.clear()
+
+        self.run_daemon(workers=3, once=True)
+
+        anna_gmail, anna_calendar = self.services['anna']
+        self.assertEqual(dict(anna_gmail.calls), {'gmail.users.history.list': 1})
+        self.assertEqual(sum(anna_calendar.calls.values()), 0)
+
+    def test_stops_when_asked(self):
+        stop = threading.Event()
+        for tenant in self.tenants:
+            tenant['interval'] = 0.01
+        timer = threading.Timer(0.2, stop.set)
+        timer.start()
+
+        self.run_daemon(workers=2, stop=stop)
+
+        # Healthy tenants were synced on every interval, the failing one backed off
+        self.assertGreater(self.services['anna'][0].calls['gmail.users.history.list'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,410 @@
+import unittest
+from unittest.mock import patch
+from datetime import date, datetime
+from dateutil import tz
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+from contextlib import ExitStack, redirect_stdout
+
+# Add src, benchmarks and the project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../benchmarks'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import main
+import backfill
+from gmail_service import search_schedule_emails
+from processor import process_messages, CalendarTarget
+from transport import execute
+from ics_sink import load_ics
+from ledger import open_ledger, get_outcome
+from fake_google import FakeGmail, FakeCalendar, make_http_error
+from corpus import generate_email
+
+# Milliseconds since the epoch, a day apart
+NOV_1 = 1761955200000
+DAY_MS = 86400000
+
+class TestFakeGoogle(unittest.TestCase):
+    def test_messages_list_paginates_newest_first(self):
+        gmail = FakeGmail(page_size=2)
+        for i in range(5):
+            gmail.add_email(f"<p>{i}</p>", NOV_1 + i * DAY_MS)
+
+        messages = search_schedule_emails(gmail)
+
+        self.assertEqual(len(messages), 5)
+        self.assertEqual(messages[0]['id'], 'msg000005')
+        self.assertEqual(gmail.calls['gmail.users.messages.list'], 3)
+
+    def test_injected_error_is_raised_once(self):
+        gmail = FakeGmail()
+        gmail.inject_error('gmail.users.getProfile', status=500)
+
+        with self.assertRaises(Exception):
+            gmail.users().getProfile(userId='me').execute()
+        self.assertIn('historyId', gmail.users().getProfile(userId='me').execute())
+
+    def test_batch_counts_one_round_trip(self):
+        calendar = FakeCalendar()
+        responses = []
+        batch = calendar.new_batch_http_request(callback=lambda request_id, response, e: responses.append(e))
+        batch.add(calendar.events().delete(calendarId='primary', eventId='missing'))
+        batch.add(calendar.calendarList().list())
+        batch.execute()
+
+        self.assertEqual(calendar.calls['batch'], 1)
+        self.assertEqual(responses[0].resp.status, 410)
+        self.assertIsNone(responses[1])
+
+    def test_sync_token_returns_only_changes(self):
+        calendar = FakeCalendar()
+        body = {'summary': 'Shift', 'start': {'dateTime': '2025-11-27T11:40:00+01:00'},
+                'end': {'dateTime': '2025-11-27T22:00:00+01:00'}}
+        event = calendar.events().insert(calendarId='primary', body=body).execute()
+        token = calendar.events().list(calendarId='primary').execute()['nextSyncToken']
+
+        calendar.events().delete(calendarId='primary', eventId=event['id']).execute()
+        changes = calendar.events().list(calendarId='primary', syncToken=token).execute()
+
+        self.assertEqual([e['status'] for e in changes['items']], ['cancelled'])
+        with self.assertRaises(Exception) as context:
+            calendar.events().list(calendarId='primary', syncToken='bogus').execute()
+        self.assertEqual(context.exception.resp.status, 410)
+
+    @patch('transport.time.sleep')
+    def test_retryable_errors_are_retried_by_the_executor(self, mock_sleep):
+        gmail = FakeGmail()
+        gmail.inject_error('gmail.users.getProfile', status=503, times=2)
+
+        execute(gmail.users().getProfile(userId='me'))
+
+        self.assertEqual(gmail.calls['gmail.users.getProfile'], 3)
+
+    def test_make_http_error_has_reason(self):
+        error = make_http_error(403, 'rateLimitExceeded')
+        self.assertEqual(error.resp.status, 403)
+        self.assertIn(b'rateLimitExceeded', error.content)
+
+class TestEndToEnd(unittest.TestCase):
+    def setUp(self):
+        # main.py and backfill.py keep their state files in the working directory
+        self.previous_cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+        self.env = patch.dict(os.environ, {'CALENDAR_ID': 'primary', 'EVENT_SUMMARY': 'Shift'})
+        self.env.start()
+
+        self.gmail = FakeGmail(page_size=3)
+        self.calendar = FakeCalendar()
+        self.rng = random.Random(0)
+
+    def tearDown(self):
+        self.env.stop()
+        os.chdir(self.previous_cwd)
+        shutil.rmtree(self.directory)
+
+    def add_email(self, start_date, rows, day):
+        html, expected = generate_email(self.rng, rows, start_date=start_date)
+        self.gmail.add_email(html, NOV_1 + day * DAY_MS)
+        return expected
+
+    def run_script(self, module, argv=None):
+        with ExitStack() as stack:
+            stack.enter_context(patch.object(module, 'get_gmail_service', return_value=self.gmail))
+            # main.py only imports the calendar service once it has emails to apply
+            stack.enter_context(patch('calendar_service.get_calendar_service', return_value=self.calendar))
+            if hasattr(module, 'get_calendar_service'):
+                stack.enter_context(patch.object(module, 'get_calendar_service', return_value=self.calendar))
+            output = stack.enter_context(redirect_stdout(io.StringIO()))
+            module.main(argv or [])
+        return output.getvalue()
+
+    def shifts(self):
+        return [(datetime.fromisoformat(e['start']['dateTime']).replace(tzinfo=None),
+                 datetime.fromisoformat(e['end']['dateTime']).replace(tzinfo=None))
+                for e in self.calendar.live_events('primary')]
+
+    def shifts_between(self, expected):
+        # An email only covers the days from its first to its last shift
+        first, last = expected[0][0].date(), expected[-1][0].date()
+        return [shift for shift in self.shifts() if first <= shift[0].date() <= last]
+
+    def test_main_syncs_new_emails_incrementally(self):
+        expected = self.add_email(date(2025, 11, 1), 7, 0)
+
+        self.run_script(main)
+        self.assertEqual(self.shifts(), expected)
+        with open('schedule_sync_metrics.json') as f:
+            metrics = json.load(f)
+        self.assertTrue(metrics['succeeded'])
+        self.assertIn('calendar_write', metrics['stage_seconds'])
+
+        # Nothing new: no email is fetched and the calendar is not touched
+        self.calendar.calls.clear()
+        self.gmail.calls.clear()
+        self.run_script(main)
+        self.assertEqual(self.gmail.calls['gmail.users.messages.get'], 0)
+        self.assertEqual(sum(self.calendar.calls.values()), 0)
+
+        # A newer email for the same week replaces the shifts
+        expected = self.add_email(date(2025, 11, 1), 7, 1)
+        self.run_script(main)
+        self.assertEqual(self.shifts_between(expected), expected)
+        self.assertEqual(self.gmail.calls['gmail.users.messages.get'], 1)
+
+    def test_calendar_found_or_created_by_name(self):
+        del os.environ['CALENDAR_ID']
+        expected = self.add_email(date(2025, 11, 1), 7, 0)
+
+        self.run_script(main)
+
+        self.assertEqual(self.calendar.calls['calendar.calendars.insert'], 1)
+        calendar_id, = [entry['id'] for entry in self.calendar.calendar_entries.values()
+                        if entry['summary'] == 'Work Schedule']
+        self.assertEqual(len(self.calendar.live_events(calendar_id)), len(expected))
+
+        # Later runs find the calendar instead of creating another one
+        expected += self.add_email(date(2025, 11, 8), 7, 1)
+        self.run_script(backfill)
+        self.assertEqual(self.calendar.calls['calendar.calendars.insert'], 1)
+        self.assertEqual(len(self.calendar.live_events(calendar_id)), len(expected))
+
+    def test_dry_run_does_not_create_the_calendar(self):
+        del os.environ['CALENDAR_ID']
+        expected = self.add_email(date(2025, 11, 1), 7, 0)
+
+        for module in (main, backfill):
+            output = self.run_script(module, ['--dry-run'])
+            self.assertIn("Calendar Work Schedule doesn't exist yet, it would be created", output)
+            self.assertIn(f"Would add: {len(expected)},", output)
+
+        self.assertEqual(self.calendar.calls['calendar.calendars.insert'], 0)
+        self.assertEqual(self.calendar.calls['calendar.events.insert'], 0)
+        self.assertEqual(list(self.calendar.calendar_entries), ['primary'])
+
+    def test_dry_run_writes_nothing(self):
+        expected = self.add_email(date(2025, 11, 1), 7, 0)
+
+        self.run_script(main, ['--dry-run'])
+
+        for method in ('insert', 'update', 'delete'):
+            self.assertEqual(self.calendar.calls[f'calendar.events.{method}'], 0)
+        self.assertFalse(os.path.exists('sync_state.json'))
+
+        # The real run still sees the email
+        self.run_script(main)
+        self.assertEqual(self.shifts(), expected)
+
+    def test_main_writes_ics_feed_instead_of_calendar(self):
+        expected = self.add_email(date(2025, 11, 1), 7, 0)
+
+        self.run_script(main, ['--ics', 'schedule.ics'])
+
+        self.assertEqual(sum(self.calendar.calls.values()), 0)
+        budapest = tz.gettz('Europe/Budapest')
+        shifts = sorted((datetime.fromisoformat(e['start']['dateTime']).astimezone(budapest).replace(tzinfo=None),
+                         datetime.fromisoformat(e['end']['dateTime']).astimezone(budapest).replace(tzinfo=None))
+                        for e in load_ics('schedule.ics').values())
+        self.assertEqual(shifts, expected)
+
+    def test_ics_feed_and_calendar_keep_their_own_sync_state(self):
+        expected = self.add_email(date(2025, 11, 1), 7, 0)
+        self.run_script(main, ['--ics', 'schedule.ics'])
+        self.assertEqual(self.shifts(), [])
+
+        # The feed consumed the email, the calendar still gets it
+        self.run_script(main)
+        self.assertEqual(self.shifts(), expected)
+
+        # Adding a calendar applies the email there too
+        team = self.calendar.add_calendar('Team')
+        os.environ['CALENDAR_ID'] = f'primary,{team}'
+        self.calendar.calls.clear()
+        self.run_script(main)
+        self.assertEqual(len(self.calendar.live_events(team)), len(expected))
+        self.assertEqual(self.calendar.calls['calendar.events.update'], 0)
+
+    def test_main_fans_out_to_several_calendars(self):
+        team = self.calendar.add_calendar('Team')
+        os.environ['CALENDAR_ID'] = f'primary,missing@group.calendar.google.com,{team}=Team shift'
+        # Save a history ID first, so the later runs only see what was added since
+        self.run_script(main)
+        expected = self.add_email(date(2025, 11, 1), 7, 0)
+
+        self.run_script(main)
+
+        # Parsed once, applied to every calendar that exists
+        self.assertEqual(self.gmail.calls['gmail.users.messages.get'], 1)
+        self.assertEqual(self.shifts(), expected)
+        team_events = self.calendar.live_events(team)
+        self.assertEqual(len(team_events), len(expected))
+        self.assertEqual({event['summary'] for event in team_events}, {'Team shift'})
+
+        # The missing calendar failed on its own
+        ledger = open_ledger('ledger.db')
+        self.assertEqual(get_outcome(ledger, 'msg000001', 'primary'), 'applied')
+        self.assertEqual(get_outcome(ledger, 'msg000001', 'missing@group.calendar.google.com'), 'failed')
+        ledger.close()
+
+        # Once the calendar exists, the next run applies the email to it alone
+        self.calendar.calendar_entries['missing@group.calendar.google.com'] = {
+            'id': 'missing@group.calendar.google.com', 'summary': 'Missing'}
+        self.calendar.events_by_calendar['missing@group.calendar.google.com'] = {}
+        self.calendar.calls.clear()
+        self.run_script(main)
+        self.assertEqual(len(self.calendar.live_events('missing@group.calendar.google.com')), len(expected))
+        self.assertEqual(self.calendar.calls['calendar.events.insert'], len(expected))
+        ledger = open_ledger('ledger.db')
+        self.assertEqual(get_outcome(ledger, 'msg000001', 'missing@group.calendar.google.com'), 'applied')
+        ledger.close()
+
+        # Nothing failed, so the run after that has nothing to do
+        self.gmail.calls.clear()
+        self.run_script(main)
+        self.assertEqual(self.gmail.calls['gmail.users.messages.list'], 0)
+
+    def test_backfill_lets_the_newest_email_win(self):
+        self.add_email(date(2025, 11, 1), 14, 0)
+        self.add_email(date(2025, 11, 15), 7, 1)
+        newest = self.add_email(date(2025, 11, 1), 7, 2)
+
+        self.run_script(backfill, ['--workers', '4'])
+
+        self.assertEqual(self.shifts_between(newest), newest)
+        self.assertEqual(self.gmail.calls['gmail.users.messages.list'], 1)
+
+        # A second backfill finds everything already applied
+        self.calendar.calls.clear()
+        self.run_script(backfill)
+        self.assertEqual(self.calendar.calls['calendar.events.insert'], 0)
+
+    def test_email_that_can_never_be_fetched_does_not_hold_the_sync_back(self):
+        self.run_script(main)
+        self.add_email(date(2025, 11, 1), 7, 0)
+        self.gmail.inject_error('gmail.users.messages.get', status=404, reason='notFound')
+
+        self.run_script(main)
+        ledger = open_ledger('ledger.db')
+        self.assertEqual(get_outcome(ledger, 'msg000001', 'primary'), 'failed')
+        ledger.close()
+
+        # The history ID moved on, so the next run doesn't list the email again
+        self.gmail.calls.clear()
+        self.run_script(main)
+        self.assertEqual(self.gmail.calls['gmail.users.messages.list'], 0)
+        self.assertEqual(self.gmail.calls['gmail.users.messages.get'], 0)
+
+    def test_older_email_never_overwrites_dates_of_an_applied_newer_one(self):
+        newer = self.add_email(date(2025, 11, 1), 7, 2)
+        self.run_script(main)
+        self.assertEqual(self.shifts(), newer)
+
+        # An older email for two weeks arrives late; the backfill skips the applied newer one
+        older = self.add_email(date(2025, 11, 1), 14, 0)
+        self.run_script(backfill)
+        second_week = [shift for shift in older if shift[0].date() > newer[-1][0].date()]
+        self.assertEqual(self.shifts(), newer + second_week)
+        self.assertEqual(self.calendar.calls['calendar.events.update'], 0)
+        self.assertEqual(self.calendar.calls['calendar.events.delete'], 0)
+
+        # main.py only sees the new email, and still leaves the newer one's dates alone
+        also_older = self.add_email(date(2025, 11, 1), 14, 1)
+        self.run_script(main)
+        third_week = [shift for shift in also_older if shift[0].date() > newer[-1][0].date()]
+        self.assertEqual(self.shifts(), newer + third_week)
+
+    def test_backfill_streams_pages_newest_first(self):
+        older = self.add_email(date(2025, 11, 1), 14, 0)
+        newest = self.add_email(date(2025, 11, 8), 7, 1)
+        # One email per page, so every email is applied on its own
+        self.gmail.page_size = 1
+
+        self.run_script(backfill)
+
+        self.assertEqual(self.gmail.calls['gmail.users.messages.list'], 2)
+        self.assertEqual(self.shifts_between(newest), newest)
+        week_before = [shift for shift in older if shift[0].date() < newest[0][0].date()]
+        self.assertEqual([shift for shift in self.shifts() if shift[0].date() < newest[0][0].date()], week_before)
+        # The older email never touched the dates the newer one had settled
+        self.assertEqual(self.calendar.calls['calendar.events.update'], 0)
+        self.assertEqual(self.calendar.calls['calendar.events.delete'], 0)
+
+    def test_backfill_resumes_after_the_last_applied_page(self):
+        self.add_email(date(2025, 11, 1), 14, 0)
+        self.add_email(date(2025, 11, 8), 14, 1)
+        newest = self.add_email(date(2025, 11, 15), 7, 2)
+        self.gmail.page_size = 1
+        all_pages = backfill.iter_schedule_email_pages
+
+        def crash_after_first_page(service):
+            pages = all_pages(service)
+            yield next(pages)
+            raise RuntimeError('quota exceeded')
+
+        with patch.object(backfill, 'iter_schedule_email_pages', crash_after_first_page):
+            self.run_script(backfill)
+        with open('backfill_checkpoint.json') as f:
+            self.assertEqual(json.load(f)['position'], 1)
+        self.assertEqual(self.gmail.calls['gmail.users.messages.get'], 1)
+
+        self.gmail.calls.clear()
+        self.run_script(backfill, ['--resume'])
+
+        # Only the two older emails are downloaded again
+        self.assertEqual(self.gmail.calls['gmail.users.messages.get'], 2)
+        self.assertEqual(self.shifts_between(newest), newest)
+        self.assertFalse(os.path.exists('backfill_checkpoint.json'))
+
+    def test_processor_survives_injected_write_errors(self):
+        self.add_email(date(2025, 11, 1), 31, 0)
+        self.calendar.inject_error('calendar.events.insert', status=400, reason='invalid', times=2)
+        messages = search_schedule_emails(self.gmail)
+
+        with redirect_stdout(io.StringIO()):
+            added, updated, deleted, unchanged = process_messages(
+                self.gmail, messages, [CalendarTarget(self.calendar, 'primary', 'Shift', batch_writes=True)])
+
+        self.assertEqual(added, len(self.shifts()))
+        self.assertGreater(added, 0)
+        self.assertEqual(self.calendar.calls['calendar.events.insert'], added + 2)
+
+    @patch('transport.time.sleep')
+    def test_retried_insert_that_already_went_through_adds_no_duplicate(self, mock_sleep):
+        expected = self.add_email(date(2025, 11, 1), 31, 0)
+        messages = search_schedule_emails(self.gmail)
+
+        for batch_writes in (False, True):
+            calendar_id = self.calendar.add_calendar(f"Batched {batch_writes}")
+            # The first inserts are stored but their responses are lost, so they are retried
+            self.calendar.inject_error('calendar.events.insert', status=503, times=2, applied=True)
+            with redirect_stdout(io.StringIO()):
+                added, _, _, _ = process_messages(
+                    self.gmail, messages, [CalendarTarget(self.calendar, calendar_id, 'Shift',
+                                                          batch_writes=batch_writes)])
+
+            self.assertEqual(added, len(expected))
+            self.assertEqual(len(self.calendar.live_events(calendar_id)), added)
+
+    def test_shift_deleted_and_added_back_is_created_again(self):
+        self.add_email(date(2025, 11, 1), 7, 0)
+        first = search_schedule_emails(self.gmail)
+        target = CalendarTarget(self.calendar, 'primary', 'Shift', batch_writes=True)
+        with redirect_stdout(io.StringIO()):
+            process_messages(self.gmail, first, [target])
+            created = self.calendar.live_events('primary')
+            for event in created:
+                execute(self.calendar.events().delete(calendarId='primary', eventId=event['id']))
+            added, _, _, _ = process_messages(self.gmail, first, [target], force=True)
+
+        self.assertEqual(added, len(created))
+        self.assertEqual([event['id'] for event in self.calendar.live_events('primary')],
+                         [event['id'] for event in created])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from datetime import date, datetime
+import os
+import sys
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from events import ShiftEvent, CalendarEvent
+
+def make_shift(day=27, start_hour=11, description='Csütörtök: 12:00-22:00'):
+    return ShiftEvent(datetime(2025, 11, day, start_hour, 40), datetime(2025, 11, day, 22, 0),
+                      'Shift', description)
+
+class TestShiftEvent(unittest.TestCase):
+    def test_precomputed_fields(self):
+        shift = make_shift()
+
+        self.assertEqual(shift.aware_start.isoformat(), '2025-11-27T11:40:00+01:00')
+        self.assertEqual(shift.aware_end.isoformat(), '2025-11-27T22:00:00+01:00')
+        self.assertEqual(shift.day, date(2025, 11, 27).toordinal())
+        self.assertEqual(shift.date(), date(2025, 11, 27))
+        self.assertEqual(shift['start'], datetime(2025, 11, 27, 11, 40))
+        # Summer time is picked per date
+        summer = ShiftEvent(datetime(2025, 7, 1, 9, 40), datetime(2025, 7, 1, 18, 0), 'Shift', 'x')
+        self.assertEqual(summer.aware_start.isoformat(), '2025-07-01T09:40:00+02:00')
+
+    def test_value_semantics(self):
+        self.assertEqual(make_shift(), make_shift())
+        self.assertEqual(len({make_shift(), make_shift(), make_shift(day=28)}), 2)
+        self.assertNotEqual(make_shift(), make_shift(description='other'))
+        self.assertEqual(ShiftEvent.of({'start': datetime(2025, 11, 27, 11, 40), 'end': datetime(2025, 11, 27, 22, 0),
+                                        'summary': 'Shift', 'description': 'Csütörtök: 12:00-22:00'}), make_shift())
+
+    def test_immutable(self):
+        shift = make_shift()
+        with self.assertRaises(AttributeError):
+            shift.summary = 'Other'
+        with self.assertRaises(AttributeError):
+            shift.extra = 1
+        other = shift.replace(summary='Other')
+        self.assertEqual((shift.summary, other.summary), ('Shift', 'Other'))
+        self.assertEqual(other.aware_start, shift.aware_start)
+
+class TestCalendarEvent(unittest.TestCase):
+    def test_parses_once_and_reads_like_the_resource(self):
+        resource = {
+            'id': 'event1',
+            'summary': 'Shift',
+            'description': 'Csütörtök: 12:00-22:00',
+            'start': {'dateTime': '2025-11-27T10:40:00Z'},
+            'end': {'dateTime': '2025-11-27T22:00:00+01:00'},
+            'sequence': 2,
+        }
+        event = CalendarEvent(resource)
+
+        self.assertEqual(event.date(), date(2025, 11, 27))
+        self.assertEqual(event['id'], 'event1')
+        self.assertEqual(event.get('sequence'), 2)
+        self.assertIs(CalendarEvent.of(event), event)
+        self.assertTrue(event.matches(make_shift()))
+        self.assertFalse(event.matches(make_shift(start_hour=12)))
+
+    def test_all_day_event(self):
+        event = CalendarEvent({'id': 'event1', 'start': {'date': '2025-11-27'}, 'end': {'date': '2025-11-28'}})
+
+        self.assertEqual(event.date(), date(2025, 11, 27))
+        self.assertFalse(event.matches(make_shift()))
+
+if __name__ == '__main__':
+    unittest.main()
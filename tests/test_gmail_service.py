@@ -0,0 +1,138 @@
+import unittest
+from unittest.mock import Mock, patch
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from googleapiclient.errors import HttpError
+import base64
+from gmail_service import find_new_schedule_emails, get_added_message_ids, get_emails, iter_schedule_email_pages
+
+class TestGmailService(unittest.TestCase):
+    def setUp(self):
+        """Set up mock service for testing"""
+        self.service = Mock()
+        
+    def test_get_added_message_ids_follows_pages(self):
+        """Test collecting added message IDs across history pages"""
+        # Mock two pages of history
+        self.service.users().history().list().execute.side_effect = [
+            {
+                'history': [{'messagesAdded': [{'message': {'id': 'msg1'}}]}],
+                'historyId': '105',
+                'nextPageToken': 'page2'
+            },
+            {
+                'history': [{'messagesAdded': [{'message': {'id': 'msg2'}}, {'message': {'id': 'msg3'}}]}],
+                'historyId': '110'
+            }
+        ]
+        
+        # Execute
+        message_ids, history_id = get_added_message_ids(self.service, '100')
+        
+        # Assert
+        self.assertEqual(message_ids, {'msg1', 'msg2', 'msg3'})
+        self.assertEqual(history_id, '110')
+        
+    def test_iter_schedule_email_pages_is_lazy(self):
+        """Test that search pages are requested only as they are consumed"""
+        self.service.users().messages().list().execute.side_effect = [
+            {'messages': [{'id': 'msg3'}, {'id': 'msg2'}], 'nextPageToken': 'page2'},
+            {'messages': [{'id': 'msg1'}]},
+        ]
+        self.service.users().messages().list.reset_mock()
+
+        pages = iter_schedule_email_pages(self.service, page_size=2)
+
+        self.assertEqual(next(pages), [{'id': 'msg3'}, {'id': 'msg2'}])
+        self.assertEqual(self.service.users().messages().list.call_count, 1)
+        self.assertEqual(next(pages), [{'id': 'msg1'}])
+        self.assertEqual(self.service.users().messages().list.call_args[1]['pageToken'], 'page2')
+        self.assertEqual(list(pages), [])
+
+    @patch('gmail_service.search_schedule_emails')
+    def test_no_new_messages_skips_search(self, mock_search):
+        """Test that a run without new mail only makes the history call"""
+        self.service.users().history().list().execute.return_value = {'historyId': '120'}
+        
+        # Execute
+        messages, history_id = find_new_schedule_emails(self.service, '120')
+        
+        # Assert
+        self.assertEqual(messages, [])
+        self.assertEqual(history_id, '120')
+        mock_search.assert_not_called()
+        
+    @patch('gmail_service.search_schedule_emails')
+    def test_new_messages_are_filtered_by_search(self, mock_search):
+        """Test that only newly added schedule emails are returned"""
+        self.service.users().history().list().execute.return_value = {
+            'history': [{'messagesAdded': [{'message': {'id': 'msg2'}}, {'message': {'id': 'other'}}]}],
+            'historyId': '130'
+        }
+        mock_search.return_value = [{'id': 'msg2'}, {'id': 'msg1'}]
+        
+        # Execute
+        messages, history_id = find_new_schedule_emails(self.service, '120')
+        
+        # Assert
+        self.assertEqual(messages, [{'id': 'msg2'}])
+        self.assertEqual(history_id, '130')
+        
+    @patch('gmail_service.search_schedule_emails')
+    def test_expired_history_falls_back_to_search(self, mock_search):
+        """Test falling back to a regular search when the history ID is too old"""
+        self.service.users().history().list().execute.side_effect = HttpError(
+            Mock(status=404, reason='Not Found'), b'')
+        self.service.users().getProfile().execute.return_value = {'historyId': '200'}
+        mock_search.return_value = [{'id': 'msg1'}]
+        
+        # Execute
+        with patch('builtins.print'):
+            messages, history_id = find_new_schedule_emails(self.service, '1')
+        
+        # Assert
+        self.assertEqual(messages, [{'id': 'msg1'}])
+        self.assertEqual(history_id, '200')
+        mock_search.assert_called_once()
+
+    def test_get_emails_in_batches(self):
+        """Test fetching emails in batches with per-message errors"""
+        def message(html):
+            data = base64.urlsafe_b64encode(html.encode('utf-8')).decode('ascii')
+            return {'internalDate': '1764000000000', 'payload': {'body': {'data': data}}}
+        
+        responses = {
+            'msg1': (message('<p>első</p>'), None),
+            'msg2': (None, Exception('Not Found')),
+            'msg3': ({'internalDate': '1'}, None),  # No payload
+        }
+        batches = []
+        
+        def new_batch(callback):
+            batch = Mock()
+            batch.added = []
+            batch.add.side_effect = lambda request, request_id: batch.added.append(request_id)
+            batch.execute.side_effect = lambda: [callback(request_id, *responses[f'msg{int(request_id) + 1}'])
+                                                 for request_id in batch.added]
+            batches.append(batch)
+            return batch
+        
+        self.service.new_batch_http_request.side_effect = new_batch
+        
+        # Execute
+        results = get_emails(self.service, ['msg1', 'msg2', 'msg3'], batch_size=2)
+        
+        # Assert
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(results[0], ({'id': 'msg1', 'internalDate': 1764000000000, 'html': '<p>első</p>'}, None))
+        self.assertIsNone(results[1][0])
+        self.assertEqual(str(results[1][1]), 'Not Found')
+        self.assertIsNone(results[2][0])
+        self.assertIsInstance(results[2][1], KeyError)
+
+if __name__ == '__main__':
+    unittest.main()
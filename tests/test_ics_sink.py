@@ -0,0 +1,94 @@
+import unittest
+from datetime import date, datetime
+import os
+import sys
+import tempfile
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from ics_sink import IcsSink, load_ics, event_uid, _fold
+from reconcile import coalesce_schedules, build_plan
+from calendar_service import build_day_index
+
+def make_event(day, start_hour, end_hour=22, description='Day: shift'):
+    return {
+        'summary': 'Shift',
+        'start': datetime(2025, 11, day, start_hour, 40),
+        'end': datetime(2025, 11, day, end_hour, 0),
+        'description': description,
+    }
+
+def apply(sink, events, msg_id='msg1'):
+    desired = coalesce_schedules([(msg_id, 100, events)])
+    actual = build_day_index(sink.get_events(min(desired), max(desired), 'Shift'))
+    return sink.apply_plan(build_plan(desired, actual))
+
+class TestIcsSink(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'schedule.ics')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_writes_utc_times_and_round_trips(self):
+        apply(IcsSink(self.path), [make_event(24, 11), make_event(25, 9)])
+
+        with open(self.path, newline='') as f:
+            content = f.read()
+        self.assertTrue(content.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn('X-WR-TIMEZONE:Europe/Budapest\r\n', content)
+        # 11:40 in Budapest (CET) is 10:40 UTC
+        self.assertIn('DTSTART:20251124T104000Z\r\n', content)
+        self.assertEqual(content.count('BEGIN:VEVENT'), 2)
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+        events = IcsSink(self.path).get_events(date(2025, 11, 24), date(2025, 11, 24), 'Shift')
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['id'], event_uid(date(2025, 11, 24), 'Shift'))
+        self.assertEqual(events[0]['description'], 'Day: shift')
+
+    def test_changed_shift_keeps_uid(self):
+        apply(IcsSink(self.path), [make_event(24, 11)])
+        sink = IcsSink(self.path)
+        results = apply(sink, [make_event(24, 7)])
+
+        self.assertEqual([entry.action for entry, _, _ in results], ['update'])
+        events = list(load_ics(self.path).values())
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['id'], event_uid(date(2025, 11, 24), 'Shift'))
+        self.assertEqual(events[0]['sequence'], 1)
+        self.assertEqual(events[0]['start']['dateTime'], '2025-11-24T06:40:00+00:00')
+
+        # Applying the same schedule again is a no-op
+        self.assertEqual(apply(IcsSink(self.path), [make_event(24, 7)]), [])
+
+    def test_day_off_deletes_event(self):
+        apply(IcsSink(self.path), [make_event(24, 11), make_event(25, 11), make_event(26, 11)])
+        results = apply(IcsSink(self.path), [make_event(24, 11), make_event(26, 11)], msg_id='msg2')
+
+        self.assertEqual([entry.action for entry, _, _ in results], ['delete'])
+        days = sorted(event['start']['dateTime'][:10] for event in load_ics(self.path).values())
+        self.assertEqual(days, ['2025-11-24', '2025-11-26'])
+
+    def test_escapes_and_folds_long_text(self):
+        description = 'Day: shift; with, commas\nand a second line ' + 'é' * 80
+        apply(IcsSink(self.path), [make_event(24, 11, description=description)])
+
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        for line in raw.split(b'\r\n'):
+            self.assertLessEqual(len(line), 75)
+        raw.decode('utf-8')  # Folding never splits a character
+
+        events = list(load_ics(self.path).values())
+        self.assertEqual(events[0]['description'], description)
+
+    def test_fold(self):
+        self.assertEqual(_fold('short'), 'short')
+        folded = _fold('x' * 150)
+        self.assertEqual(folded.split('\r\n'), ['x' * 75, ' ' + 'x' * 74, ' x'])
+
+if __name__ == '__main__':
+    unittest.main()
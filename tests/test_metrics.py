@@ -0,0 +1,70 @@
+import unittest
+from unittest.mock import Mock, patch
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from googleapiclient.errors import HttpError
+from metrics import stage, reset_metrics, get_metrics, format_summary, write_metrics, UNKNOWN_METHOD
+from transport import execute
+
+def make_http_error(status):
+    resp = Mock()
+    resp.status = status
+    return HttpError(resp, b'{}')
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        reset_metrics()
+
+    def test_stage_adds_up_wall_time(self):
+        with stage('parse'):
+            time.sleep(0.01)
+        with stage('parse'):
+            pass
+
+        seconds = get_metrics()['stage_seconds']['parse']
+        self.assertGreaterEqual(seconds, 0.01)
+        self.assertIn("parse", format_summary(get_metrics()))
+
+    @patch('transport.time.sleep')
+    def test_execute_counts_calls_and_retries(self, mock_sleep):
+        request = Mock()
+        request.methodId = 'gmail.users.getProfile'
+        request.execute.side_effect = [make_http_error(503), {'historyId': '1'}]
+
+        execute(request)
+        execute(Mock())
+
+        metrics = get_metrics()
+        self.assertEqual(metrics['api_calls'], {'gmail.users.getProfile': 2, UNKNOWN_METHOD: 1})
+        self.assertEqual(metrics['api_retries'], {'gmail.users.getProfile': 1})
+
+    def test_write_metrics(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with stage('fetch'):
+            pass
+        metrics = get_metrics(bytes_received=2048, run_seconds=1.5, succeeded=True)
+
+        write_metrics(metrics, directory, run='backfill')
+
+        with open(os.path.join(directory, 'schedule_backfill_metrics.json')) as f:
+            summary = json.load(f)
+        self.assertEqual(summary['bytes_received'], 2048)
+        self.assertEqual(summary['run'], 'backfill')
+        with open(os.path.join(directory, 'schedule_backfill.prom')) as f:
+            prometheus = f.read()
+        self.assertIn('schedule_sync_stage_seconds{run="backfill",stage="fetch"}', prometheus)
+        self.assertIn('schedule_sync_success{run="backfill"} 1', prometheus)
+        self.assertIn('# TYPE schedule_sync_bytes_received gauge', prometheus)
+        self.assertEqual(sorted(os.listdir(directory)), ['schedule_backfill.prom', 'schedule_backfill_metrics.json'])
+
+if __name__ == '__main__':
+    unittest.main()
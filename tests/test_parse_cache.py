@@ -0,0 +1,54 @@
+import unittest
+from datetime import datetime
+import os
+import sys
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from events import ShiftEvent
+from parse_cache import open_parse_cache, get_cached_schedules, store_schedules, encode_events, decode_events
+
+def make_events(day, count=1):
+    return [ShiftEvent(datetime(2025, 11, day + i, 11, 40), datetime(2025, 11, day + i, 22, 0),
+                       'Shift', f'Day {day + i}: 12:00-22:00') for i in range(count)]
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self.conn = open_parse_cache(':memory:')
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_encode_round_trip(self):
+        events = make_events(1, 5)
+        self.assertEqual(decode_events(encode_events(events), 'Shift'), events)
+        # The summary comes from the configuration, not the cache
+        self.assertEqual(decode_events(encode_events(events), 'Other')[0].summary, 'Other')
+
+    def test_store_and_get(self):
+        store_schedules(self.conn, [('msg1', 100, 'hash1', make_events(1, 2)), ('msg2', 200, 'hash2', [])], 1)
+
+        hits = get_cached_schedules(self.conn, ['msg1', 'msg2', 'msg3'], 1, 'Shift')
+
+        self.assertEqual(hits, {'msg1': (100, 'hash1', make_events(1, 2)), 'msg2': (200, 'hash2', [])})
+
+    def test_other_parser_version_misses(self):
+        store_schedules(self.conn, [('msg1', 100, 'hash1', make_events(1))], 1)
+
+        self.assertEqual(get_cached_schedules(self.conn, ['msg1'], 2, 'Shift'), {})
+
+    def test_evicts_least_recently_used(self):
+        size = len(encode_events(make_events(1, 7)))
+        store_schedules(self.conn, [('old', 100, 'h', make_events(1, 7))], 1, max_bytes=2 * size)
+        store_schedules(self.conn, [('used', 200, 'h', make_events(1, 7))], 1, max_bytes=2 * size)
+        self.conn.execute("UPDATE parsed_schedules SET last_used = 0 WHERE message_id = 'old'")
+        self.conn.execute("UPDATE parsed_schedules SET last_used = 1 WHERE message_id = 'used'")
+
+        store_schedules(self.conn, [('new', 300, 'h', make_events(1, 7))], 1, max_bytes=2 * size)
+
+        hits = get_cached_schedules(self.conn, ['old', 'used', 'new'], 1, 'Shift')
+        self.assertEqual(sorted(hits), ['new', 'used'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,10 +4,12 @@ from datetime import datetime
 import sys
 import os
 
-# Add src to path
+# Add src and benchmarks to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../benchmarks'))
 
 from email_parser import parse_schedule_email
+from corpus import generate_corpus
 
 class TestParser(unittest.TestCase):
     def setUp(self):
@@ -76,5 +78,53 @@ class TestParser(unittest.TestCase):
         self.assertEqual(events[0]['start'], datetime(2025, 11, 6, 11, 40))
         self.assertEqual(events[0]['end'], datetime(2025, 11, 6, 22, 0))
 
+    def test_tags_with_attributes(self):
+        email_text = """
+<table>
+<tbody>
+<tr style="background: #eee;">
+<td class="day"><strong>Nap</strong></td>
+<td class="date"><strong>D&aacute;tum</strong></td>
+<td class="shift"><strong>Beoszt&aacute;s</strong></td>
+</tr>
+<tr class="changed">
+<td valign="top">Vasárnap</td>
+<td valign="top">2025.11.02 (ma)</td>
+<TD VALIGN="top"><strong>6:00-14:00</strong></TD>
+</tr>
+<tr>
+<td>Hétfő</td>
+<td>2025.11.03</td>
+<td>Szabi</td>
+</tr>
+</tbody>
+</table>
+"""
+        events = parse_schedule_email(email_text)
+        self.assertEqual(len(events), 1)
+        
+        # Start time should be 6:00 - 20 mins = 05:40
+        self.assertEqual(events[0]['start'], datetime(2025, 11, 2, 5, 40))
+        self.assertEqual(events[0]['end'], datetime(2025, 11, 2, 14, 0))
+        self.assertEqual(events[0]['description'], 'Vasárnap: 6:00-14:00')
+        self.assertEqual(events[0]['summary'], 'Work at McDonald\'s')
+        
+    def test_invalid_dates_are_skipped(self):
+        email_text = """
+<tr><td>Hétfő</td><td>2025.13.01</td><td>12:00-22:00</td></tr>
+<tr><td>Kedd</td><td>2025.11.04</td><td>12:00-22:00</td><td>extra</td></tr>
+<tr><td>Szerda</td><td>2025.11.05</td><td>12:00-22:00</td></tr>
+"""
+        with patch('builtins.print'):
+            events = parse_schedule_email(email_text)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['start'], datetime(2025, 11, 5, 11, 40))
+
+    def test_benchmark_corpus(self):
+        # The benchmark corpus must parse to exactly the shifts it was generated with
+        for html, expected in generate_corpus('medium', 20, seed=1):
+            events = parse_schedule_email(html)
+            self.assertEqual([(event['start'], event['end']) for event in events], expected)
+
 if __name__ == '__main__':
     unittest.main()
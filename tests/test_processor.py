@@ -1,13 +1,20 @@
 import unittest
 from unittest.mock import Mock, MagicMock, patch
-from datetime import datetime
+from datetime import datetime, date
 import sys
 import os
+import threading
 
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
 
-from processor import process_messages
+import processor
+from processor import process_messages, apply_plan, CalendarTarget, _run_chunked
+from events import ShiftEvent
+from reconcile import Plan, PlanEntry, UPDATE, DELETE
+from ledger import open_ledger, get_outcome, record_outcome
+from parse_cache import open_parse_cache
+from google.oauth2.credentials import Credentials
 
 class TestProcessor(unittest.TestCase):
     def setUp(self):
@@ -15,30 +22,32 @@ class TestProcessor(unittest.TestCase):
         self.gmail_service = Mock()
         self.calendar_service = Mock()
         self.calendar_id = 'test_calendar_id'
+        self.target = self.calendar_target()
+
+    def calendar_target(self, calendar_id=None, summary='Work at McDonald\'s', **options):
+        return CalendarTarget(self.calendar_service, calendar_id or self.calendar_id, summary, **options)
         
-    @patch('processor.get_email_content')
+    @patch('processor.get_emails')
     @patch('processor.parse_schedule_email')
-    @patch('processor.get_existing_event')
     @patch('processor.create_event')
-    def test_process_new_shift(self, mock_create, mock_get_existing, mock_parse, mock_get_email):
+    @patch('processor.get_events_in_range')
+    def test_process_new_shift(self, mock_get_range, mock_create, mock_parse, mock_get_email):
         """Test adding a new shift to the calendar"""
         # Setup
         messages = [{'id': 'msg1'}]
-        mock_get_email.return_value = '<html>email content</html>'
+        mock_get_email.return_value = [({'id': 'msg1', 'internalDate': 1764000000000, 'html': '<html>email content</html>'}, None)]
         mock_parse.return_value = [{
             'start': datetime(2025, 11, 27, 11, 40),
             'end': datetime(2025, 11, 27, 22, 0),
             'summary': 'Work at McDonald\'s',
             'description': 'Wednesday: 12:00-22:00'
         }]
-        mock_get_existing.return_value = None  # No existing event
+        mock_get_range.return_value = []  # No existing event
         
         # Execute
-        added, updated, deleted = process_messages(
+        added, updated, deleted, unchanged = process_messages(
             self.gmail_service, 
-            self.calendar_service, 
-            self.calendar_id, 
-            messages
+            messages, [self.target]
         )
         
         # Assert
@@ -47,29 +56,31 @@ class TestProcessor(unittest.TestCase):
         self.assertEqual(deleted, 0)
         mock_create.assert_called_once()
         
-    @patch('processor.get_email_content')
+    @patch('processor.get_emails')
     @patch('processor.parse_schedule_email')
-    @patch('processor.get_existing_event')
     @patch('processor.update_event')
-    def test_process_updated_shift(self, mock_update, mock_get_existing, mock_parse, mock_get_email):
+    @patch('processor.get_events_in_range')
+    def test_process_updated_shift(self, mock_get_range, mock_update, mock_parse, mock_get_email):
         """Test updating an existing shift with new time"""
         # Setup
         messages = [{'id': 'msg1'}]
-        mock_get_email.return_value = '<html>email content</html>'
+        mock_get_email.return_value = [({'id': 'msg1', 'internalDate': 1764000000000, 'html': '<html>email content</html>'}, None)]
         mock_parse.return_value = [{
             'start': datetime(2025, 11, 27, 11, 40),
             'end': datetime(2025, 11, 27, 22, 0),
             'summary': 'Work at McDonald\'s',
             'description': 'Wednesday: 12:00-22:00'
         }]
-        mock_get_existing.return_value = {'id': 'event123'}  # Existing event found
+        mock_get_range.return_value = [{
+            'id': 'event123',
+            'start': {'dateTime': '2025-11-27T10:40:00Z'},
+            'summary': 'Work at McDonald\'s'
+        }]  # Existing event found
         
         # Execute
-        added, updated, deleted = process_messages(
+        added, updated, deleted, unchanged = process_messages(
             self.gmail_service, 
-            self.calendar_service, 
-            self.calendar_id, 
-            messages
+            messages, [self.target]
         )
         
         # Assert
@@ -77,36 +88,39 @@ class TestProcessor(unittest.TestCase):
         self.assertEqual(updated, 1)
         self.assertEqual(deleted, 0)
         mock_update.assert_called_once()
+        self.assertEqual(mock_update.call_args[0][2], 'event123')
+        mock_get_range.assert_called_once()
         
-    @patch('processor.get_email_content')
+    @patch('processor.get_emails')
     @patch('processor.parse_schedule_email')
-    @patch('processor.get_existing_event')
+    @patch('processor.update_event')
     @patch('processor.create_event')
     @patch('processor.get_events_in_range')
     @patch('processor.delete_event')
-    def test_process_deleted_shift(self, mock_delete, mock_get_range, mock_create, 
-                                   mock_get_existing, mock_parse, mock_get_email):
+    def test_process_deleted_shift(self, mock_delete, mock_get_range, mock_create,
+                                   mock_update, mock_parse, mock_get_email):
         """Test deleting a shift that was removed from the schedule"""
         # Setup
         messages = [{'id': 'msg1'}]
-        mock_get_email.return_value = '<html>email content</html>'
-        
-        # Email only has shift on Nov 27
-        mock_parse.return_value = [{
-            'start': datetime(2025, 11, 27, 11, 40),
-            'end': datetime(2025, 11, 27, 22, 0),
-            'summary': 'Work at McDonald\'s',
-            'description': 'Wednesday: 12:00-22:00'
-        }]
-        mock_get_existing.return_value = None  # No existing event on Nov 27
+        mock_get_email.return_value = [({'id': 'msg1', 'internalDate': 1764000000000, 'html': '<html>email content</html>'}, None)]
         
-        # Calendar has events on both Nov 27 and Nov 28
-        mock_get_range.return_value = [
+        # Email has shifts on Nov 27 and Nov 29, Nov 28 is now a day off
+        mock_parse.return_value = [
             {
-                'id': 'event_nov27',
-                'start': {'dateTime': '2025-11-27T11:40:00+01:00'},
-                'summary': 'Work at McDonald\'s'
+                'start': datetime(2025, 11, 27, 11, 40),
+                'end': datetime(2025, 11, 27, 22, 0),
+                'summary': 'Work at McDonald\'s',
+                'description': 'Wednesday: 12:00-22:00'
             },
+            {
+                'start': datetime(2025, 11, 29, 11, 40),
+                'end': datetime(2025, 11, 29, 22, 0),
+                'summary': 'Work at McDonald\'s',
+                'description': 'Friday: 12:00-22:00'
+            }
+        ]
+        # Calendar only has an event on Nov 28
+        mock_get_range.return_value = [
             {
                 'id': 'event_nov28',
                 'start': {'dateTime': '2025-11-28T11:40:00+01:00'},
@@ -115,34 +129,166 @@ class TestProcessor(unittest.TestCase):
         ]
         
         # Execute
-        added, updated, deleted = process_messages(
+        added, updated, deleted, unchanged = process_messages(
             self.gmail_service, 
-            self.calendar_service, 
-            self.calendar_id, 
-            messages
+            messages, [self.target]
         )
         
         # Assert
-        self.assertEqual(added, 1)  # Nov 27 added
+        self.assertEqual(added, 2)  # Nov 27 and Nov 29 added
         self.assertEqual(updated, 0)
         self.assertEqual(deleted, 1)  # Nov 28 deleted
         mock_delete.assert_called_once()
+        self.assertEqual(mock_delete.call_args[0][2], 'event_nov28')
+        mock_update.assert_not_called()
         
-    @patch('processor.get_email_content')
+    @patch('processor.get_emails')
+    @patch('processor.parse_schedule_email')
+    @patch('processor.update_event')
+    @patch('processor.create_event')
+    @patch('processor.get_events_in_range')
+    @patch('processor.delete_event')
+    def test_process_duplicate_events(self, mock_delete, mock_get_range, mock_create,
+                                      mock_update, mock_parse, mock_get_email):
+        """Test that every extra event on a day is cleaned up, not just the first"""
+        # Setup
+        messages = [{'id': 'msg1'}]
+        mock_get_email.return_value = [({'id': 'msg1', 'internalDate': 1764000000000, 'html': '<html>email content</html>'}, None)]
+        
+        # Email has shifts on Nov 27 and Nov 29, Nov 28 is a day off
+        mock_parse.return_value = [
+            {
+                'start': datetime(2025, 11, 27, 11, 40),
+                'end': datetime(2025, 11, 27, 22, 0),
+                'summary': 'Work at McDonald\'s',
+                'description': 'Wednesday: 12:00-22:00'
+            },
+            {
+                'start': datetime(2025, 11, 29, 11, 40),
+                'end': datetime(2025, 11, 29, 22, 0),
+                'summary': 'Work at McDonald\'s',
+                'description': 'Friday: 12:00-22:00'
+            }
+        ]
+        # Two events on Nov 27 and on Nov 28, none on Nov 29
+        mock_get_range.return_value = [
+            {'id': 'event_nov27a', 'start': {'dateTime': '2025-11-27T07:00:00+01:00'}, 'summary': 'Work at McDonald\'s'},
+            {'id': 'event_nov27b', 'start': {'dateTime': '2025-11-27T11:40:00+01:00'}, 'summary': 'Work at McDonald\'s'},
+            {'id': 'event_nov28a', 'start': {'dateTime': '2025-11-28T07:00:00+01:00'}, 'summary': 'Work at McDonald\'s'},
+            {'id': 'event_nov28b', 'start': {'dateTime': '2025-11-28T11:40:00+01:00'}, 'summary': 'Work at McDonald\'s'},
+        ]
+        
+        # Execute
+        added, updated, deleted, unchanged = process_messages(
+            self.gmail_service,
+            messages, [self.target]
+        )
+        
+        # Assert
+        self.assertEqual((added, updated, deleted, unchanged), (1, 1, 3, 0))
+        self.assertEqual(sorted(call[0][2] for call in mock_delete.call_args_list),
+                         ['event_nov27b', 'event_nov28a', 'event_nov28b'])
+        self.assertEqual(mock_update.call_args[0][2], 'event_nov27a')
+        
+    @patch('processor.get_emails')
+    @patch('processor.parse_schedule_email')
+    @patch('processor.create_event')
+    @patch('processor.delete_event')
+    @patch('processor.get_events_in_range')
+    def test_newest_email_wins_per_date(self, mock_get_range, mock_delete, mock_create,
+                                        mock_parse, mock_get_email):
+        """Test that overlapping emails are coalesced so each date is written once"""
+        def shift(day):
+            return {
+                'start': datetime(2025, 11, day, 11, 40),
+                'end': datetime(2025, 11, day, 22, 0),
+                'summary': 'Work at McDonald\'s',
+                'description': f'Nov {day}: 12:00-22:00'
+            }
+        
+        # Newest first, like the Gmail search returns them
+        messages = [{'id': 'newer'}, {'id': 'older'}]
+        emails = {
+            'older': {'id': 'older', 'internalDate': 1000, 'html': 'older'},
+            'newer': {'id': 'newer', 'internalDate': 2000, 'html': 'newer'},
+        }
+        mock_get_email.side_effect = lambda service, msg_ids: [(emails[msg_id], None) for msg_id in msg_ids]
+        # The older email covers Nov 26-29, the newer one Nov 28-30 with Nov 29 off
+        schedules = {
+            'older': [shift(26), shift(27), shift(28), shift(29)],
+            'newer': [shift(28), shift(30)],
+        }
+        mock_parse.side_effect = lambda html, summary=None: schedules[html]
+        mock_get_range.return_value = [{
+            'id': 'event_nov29',
+            'start': {'dateTime': '2025-11-29T11:40:00+01:00'},
+            'summary': 'Work at McDonald\'s'
+        }]
+        
+        # Execute
+        with patch('builtins.print'):
+            added, updated, deleted, unchanged = process_messages(
+                self.gmail_service,
+                messages, [self.target]
+            )
+        
+        # Assert
+        self.assertEqual((added, updated, deleted, unchanged), (4, 0, 1, 0))
+        created = [c[0][2]['description'] for c in mock_create.call_args_list]
+        self.assertEqual(created, ['Nov 26: 12:00-22:00', 'Nov 27: 12:00-22:00',
+                                   'Nov 28: 12:00-22:00', 'Nov 30: 12:00-22:00'])
+        self.assertEqual(mock_create.call_args_list[2][0][2], ShiftEvent.of(schedules['newer'][0]))
+        mock_delete.assert_called_once()
+        # One calendar read for all emails
+        mock_get_range.assert_called_once()
+        
+    @patch('processor.get_emails')
+    @patch('processor.parse_schedule_email')
+    @patch('processor.update_event')
+    @patch('processor.get_events_in_range')
+    def test_process_unchanged_shift(self, mock_get_range, mock_update, mock_parse, mock_get_email):
+        """Test that an event that already matches the email is not updated"""
+        # Setup
+        messages = [{'id': 'msg1'}]
+        mock_get_email.return_value = [({'id': 'msg1', 'internalDate': 1764000000000, 'html': '<html>email content</html>'}, None)]
+        mock_parse.return_value = [{
+            'start': datetime(2025, 11, 27, 11, 40),
+            'end': datetime(2025, 11, 27, 22, 0),
+            'summary': 'Work at McDonald\'s',
+            'description': 'Wednesday: 12:00-22:00'
+        }]
+        # Same times, returned in UTC by the API
+        mock_get_range.return_value = [{
+            'id': 'event123',
+            'summary': 'Work at McDonald\'s',
+            'description': 'Wednesday: 12:00-22:00',
+            'start': {'dateTime': '2025-11-27T10:40:00Z'},
+            'end': {'dateTime': '2025-11-27T21:00:00Z'}
+        }]
+        
+        # Execute
+        added, updated, deleted, unchanged = process_messages(
+            self.gmail_service,
+            messages, [self.target]
+        )
+        
+        # Assert
+        self.assertEqual((added, updated, deleted, unchanged), (0, 0, 0, 1))
+        mock_update.assert_not_called()
+        
+    @patch('processor.get_emails')
     @patch('processor.parse_schedule_email')
     def test_process_empty_email(self, mock_parse, mock_get_email):
         """Test processing an email with no schedule data"""
         # Setup
         messages = [{'id': 'msg1'}]
-        mock_get_email.return_value = '<html>no schedule here</html>'
+        mock_get_email.return_value = [({'id': 'msg1', 'internalDate': 1764000000000, 'html': '<html>no schedule here</html>'}, None)]
         mock_parse.return_value = []  # No events parsed
         
         # Execute
-        added, updated, deleted = process_messages(
+        added, updated, deleted, unchanged = process_messages(
             self.gmail_service, 
-            self.calendar_service, 
-            self.calendar_id, 
-            messages
+            messages, [self.target]
         )
         
         # Assert
@@ -150,17 +296,16 @@ class TestProcessor(unittest.TestCase):
         self.assertEqual(updated, 0)
         self.assertEqual(deleted, 0)
         
-    @patch('processor.get_email_content')
+    @patch('processor.get_emails')
     @patch('processor.parse_schedule_email')
-    @patch('processor.get_existing_event')
     @patch('processor.create_event')
     @patch('processor.get_events_in_range')
-    def test_process_multiple_shifts(self, mock_get_range, mock_create, 
-                                     mock_get_existing, mock_parse, mock_get_email):
+    def test_process_multiple_shifts(self, mock_get_range, mock_create,
+                                     mock_parse, mock_get_email):
         """Test processing multiple shifts in one email"""
         # Setup
         messages = [{'id': 'msg1'}]
-        mock_get_email.return_value = '<html>email content</html>'
+        mock_get_email.return_value = [({'id': 'msg1', 'internalDate': 1764000000000, 'html': '<html>email content</html>'}, None)]
         mock_parse.return_value = [
             {
                 'start': datetime(2025, 11, 27, 11, 40),
@@ -175,15 +320,12 @@ class TestProcessor(unittest.TestCase):
                 'description': 'Thursday: 16:00-23:00'
             }
         ]
-        mock_get_existing.return_value = None
         mock_get_range.return_value = []
         
         # Execute
-        added, updated, deleted = process_messages(
+        added, updated, deleted, unchanged = process_messages(
             self.gmail_service, 
-            self.calendar_service, 
-            self.calendar_id, 
-            messages
+            messages, [self.target]
         )
         
         # Assert
@@ -191,6 +333,260 @@ class TestProcessor(unittest.TestCase):
         self.assertEqual(updated, 0)
         self.assertEqual(deleted, 0)
         self.assertEqual(mock_create.call_count, 2)
+        # One calendar read covering both days
+        mock_get_range.assert_called_once()
+        self.assertEqual(mock_get_range.call_args[0][2:4],
+                         (datetime(2025, 11, 27).date(), datetime(2025, 11, 28).date()))
+
+    @patch('processor.get_emails')
+    @patch('processor.parse_schedule_email')
+    @patch('processor.get_events_in_range')
+    @patch('processor.execute_batch')
+    def test_process_batch_writes(self, mock_batch, mock_get_range,
+                                  mock_parse, mock_get_email):
+        """Test that batch mode sends all writes of an email in one batch call"""
+        # Setup
+        messages = [{'id': 'msg1'}]
+        mock_get_email.return_value = [({'id': 'msg1', 'internalDate': 1764000000000, 'html': '<html>email content</html>'}, None)]
+        mock_parse.return_value = [
+            {
+                'start': datetime(2025, 11, 27, 11, 40),
+                'end': datetime(2025, 11, 27, 22, 0),
+                'summary': 'Work at McDonald\'s',
+                'description': 'Wednesday: 12:00-22:00'
+            },
+            {
+                'start': datetime(2025, 11, 29, 15, 40),
+                'end': datetime(2025, 11, 29, 23, 0),
+                'summary': 'Work at McDonald\'s',
+                'description': 'Friday: 16:00-23:00'
+            }
+        ]
+        # Nov 27 is new, Nov 29 already exists and Nov 28 was removed
+        mock_get_range.return_value = [
+            {
+                'id': 'event_nov29',
+                'start': {'dateTime': '2025-11-29T15:40:00+01:00'},
+                'summary': 'Work at McDonald\'s'
+            },
+            {
+                'id': 'event_nov28',
+                'start': {'dateTime': '2025-11-28T11:40:00+01:00'},
+                'summary': 'Work at McDonald\'s'
+            }
+        ]
+        # The update fails, the create and delete succeed
+        mock_batch.return_value = [
+            ({'id': 'new_event'}, None),
+            ('', None),
+            (None, Exception('Rate Limit Exceeded')),
+        ]
+        
+        # Execute
+        with patch('builtins.print'):
+            added, updated, deleted, unchanged = process_messages(
+                self.gmail_service,
+                messages, [self.calendar_target(batch_writes=True)]
+            )
+        
+        # Assert
+        mock_batch.assert_called_once()
+        operations = mock_batch.call_args[0][2]
+        self.assertEqual([op[0] for op in operations], ['create', 'delete', 'update'])
+        self.assertEqual(added, 1)
+        self.assertEqual(updated, 0)
+        self.assertEqual(deleted, 1)
+
+    @patch('processor.get_emails')
+    @patch('processor.parse_schedule_email')
+    @patch('processor.create_event')
+    @patch('processor.get_events_in_range')
+    def test_ledger_skips_applied_messages(self, mock_get_range, mock_create,
+                                           mock_parse, mock_get_email):
+        """Test that applied messages are skipped and failed ones are retried"""
+        # Setup
+        ledger = open_ledger(':memory:')
+        record_outcome(ledger, 'msg_applied', self.calendar_id, 'hash1', 'applied')
+        record_outcome(ledger, 'msg_failed', self.calendar_id, 'hash2', 'failed')
+        messages = [{'id': 'msg_applied'}, {'id': 'msg_failed'}, {'id': 'msg_new'}]
+        mock_get_email.side_effect = lambda service, msg_ids: [
+            ({'id': msg_id, 'internalDate': 1764000000000, 'html': '<html>email content</html>'}, None)
+            for msg_id in msg_ids
+        ]
+        mock_parse.return_value = [{
+            'start': datetime(2025, 11, 27, 11, 40),
+            'end': datetime(2025, 11, 27, 22, 0),
+            'summary': 'Work at McDonald\'s',
+            'description': 'Wednesday: 12:00-22:00'
+        }]
+        mock_get_range.return_value = []
+        
+        # Execute
+        with patch('builtins.print'):
+            added, updated, deleted, unchanged = process_messages(
+                self.gmail_service,
+                messages, [self.target],
+                ledger=ledger
+            )
+        
+        # Assert - both emails have the same shift, so it is added once
+        self.assertEqual(added, 1)
+        mock_get_email.assert_called_once()
+        self.assertEqual(mock_get_email.call_args[0][1], ['msg_failed', 'msg_new'])
+        self.assertEqual(get_outcome(ledger, 'msg_failed', self.calendar_id), 'applied')
+        self.assertEqual(get_outcome(ledger, 'msg_new', self.calendar_id), 'applied')
+        
+        # Forcing reprocesses everything
+        with patch('builtins.print'):
+            process_messages(self.gmail_service, messages, [self.target], ledger=ledger, force=True)
+        self.assertEqual(mock_get_email.call_args[0][1], ['msg_applied', 'msg_failed', 'msg_new'])
+        
+    @patch('processor.get_emails')
+    @patch('processor.parse_schedule_email')
+    @patch('processor.create_event')
+    @patch('processor.get_events_in_range')
+    def test_ledger_outcomes_are_per_target(self, mock_get_range, mock_create,
+                                            mock_parse, mock_get_email):
+        """Test that an email applied to one calendar is still applied to a calendar added later"""
+        ledger = open_ledger(':memory:')
+        record_outcome(ledger, 'msg1', 'primary', 'hash1', 'applied')
+        mock_get_email.return_value = [
+            ({'id': 'msg1', 'internalDate': 1764000000000, 'html': '<html>email content</html>'}, None)]
+        mock_parse.return_value = [{
+            'start': datetime(2025, 11, 27, 11, 40),
+            'end': datetime(2025, 11, 27, 22, 0),
+            'summary': 'Work at McDonald\'s',
+            'description': 'Wednesday: 12:00-22:00'
+        }]
+        mock_get_range.return_value = []
+        
+        with patch('builtins.print'):
+            process_messages(self.gmail_service, [{'id': 'msg1'}],
+                             [self.calendar_target('primary')], ledger=ledger)
+        mock_get_email.assert_not_called()
+        
+        with patch('builtins.print'):
+            process_messages(self.gmail_service, [{'id': 'msg1'}],
+                             [self.calendar_target('primary'), self.calendar_target('team')], ledger=ledger)
+        mock_get_email.assert_called_once()
+        self.assertEqual(get_outcome(ledger, 'msg1', 'primary'), 'applied')
+        self.assertEqual(get_outcome(ledger, 'msg1', 'team'), 'applied')
+
+    @patch('processor.get_emails')
+    def test_ledger_records_failures(self, mock_get_email):
+        """Test that a message that could not be fetched is recorded as failed"""
+        ledger = open_ledger(':memory:')
+        mock_get_email.return_value = [(None, Exception('Backend Error'))]
+        
+        with patch('builtins.print'):
+            process_messages(self.gmail_service, [{'id': 'msg1'}], [self.target], ledger=ledger)
+        
+        self.assertEqual(get_outcome(ledger, 'msg1', self.calendar_id), 'failed')
+
+    @patch('processor.get_emails')
+    @patch('processor.parse_schedule_email')
+    @patch('processor.create_event')
+    @patch('processor.get_events_in_range')
+    def test_parse_cache_skips_fetch_and_parse(self, mock_get_range, mock_create,
+                                               mock_parse, mock_get_email):
+        """Test that emails parsed on an earlier run are neither fetched nor parsed again"""
+        parse_cache = open_parse_cache(':memory:')
+        mock_get_email.side_effect = lambda service, msg_ids: [
+            ({'id': msg_id, 'internalDate': 1764000000000, 'html': '<html>email content</html>'}, None)
+            for msg_id in msg_ids
+        ]
+        mock_parse.return_value = [{
+            'start': datetime(2025, 11, 27, 11, 40),
+            'end': datetime(2025, 11, 27, 22, 0),
+            'summary': 'Shift',
+            'description': 'Wednesday: 12:00-22:00'
+        }]
+        mock_get_range.return_value = []
+
+        for _ in range(2):
+            with patch('builtins.print'):
+                added, _, _, _ = process_messages(self.gmail_service, [{'id': 'msg1'}],
+                                                  [self.calendar_target(summary='Shift')],
+                                                  parse_cache=parse_cache)
+            self.assertEqual(added, 1)
+
+        mock_get_email.assert_called_once()
+        mock_parse.assert_called_once()
+        self.assertEqual(mock_create.call_args_list[0], mock_create.call_args_list[1])
+
+    @patch('processor.get_emails')
+    @patch('processor.parse_schedule_email')
+    @patch('processor.get_events_in_range')
+    @patch('processor.execute_batch')
+    def test_process_with_workers(self, mock_batch, mock_get_range, mock_parse, mock_get_email):
+        """Test that the concurrent engine splits the work and keeps results in order"""
+        # Five emails, each with a shift on its own day
+        messages = [{'id': f'msg{day}'} for day in range(1, 6)]
+        mock_get_email.side_effect = lambda service, msg_ids: [
+            ({'id': msg_id, 'internalDate': int(msg_id[3:]), 'html': msg_id}, None) for msg_id in msg_ids
+        ]
+        mock_parse.side_effect = lambda html, summary=None: [{
+            'start': datetime(2025, 11, int(html[3:]), 11, 40),
+            'end': datetime(2025, 11, int(html[3:]), 22, 0),
+            'summary': 'Work at McDonald\'s',
+            'description': html
+        }]
+        mock_get_range.return_value = []
+        mock_batch.side_effect = lambda service, calendar_id, operations: [
+            ({'id': operation[1]['description']}, None) for operation in operations
+        ]
+        
+        # Execute
+        with patch('builtins.print'):
+            added, updated, deleted, unchanged = process_messages(
+                self.gmail_service,
+                messages, [self.calendar_target(batch_writes=True, workers=3)],
+                workers=3
+            )
+        
+        # Assert
+        self.assertEqual((added, updated, deleted, unchanged), (5, 0, 0, 0))
+        fetched = sorted(c[0][1] for c in mock_get_email.call_args_list)
+        self.assertEqual(fetched, [['msg1', 'msg2'], ['msg3', 'msg4'], ['msg5']])
+        written = sorted([op[1]['description'] for op in c[0][2]] for c in mock_batch.call_args_list)
+        self.assertEqual(written, [['msg1', 'msg2'], ['msg3', 'msg4'], ['msg5']])
+
+    @patch('processor.execute_batch')
+    def test_apply_plan_writes_each_event_once(self, mock_batch):
+        """Test that the executor drops a second write to the same event"""
+        event = ShiftEvent(datetime(2025, 11, 27, 11, 40), datetime(2025, 11, 27, 22, 0),
+                           'Shift', 'Wednesday: 12:00-22:00')
+        plan = Plan([
+            PlanEntry(UPDATE, date(2025, 11, 27), event, {'id': 'evt1'}, 'msg1'),
+            PlanEntry(DELETE, date(2025, 11, 28), None, {'id': 'evt1'}, 'msg1'),
+            PlanEntry(DELETE, date(2025, 11, 29), None, {'id': 'evt2'}, 'msg1'),
+        ])
+        mock_batch.side_effect = lambda service, calendar_id, operations: [({}, None) for _ in operations]
+
+        results = apply_plan(plan, self.calendar_service, self.calendar_id, batch_writes=True)
+
+        self.assertEqual(mock_batch.call_args[0][2], [('update', 'evt1', event), ('delete', 'evt2')])
+        self.assertEqual([entry.day.day for entry, _, _ in results], [27, 29])
+
+    @patch.dict(processor._pools, clear=True)
+    @patch('transport.build_http')
+    def test_worker_connections_outlive_each_call(self, mock_build_http):
+        """Test that worker threads, and the http objects they built, are reused across calls"""
+        credentials = Credentials('token')
+        # Hold both chunks of the first call until two threads run them
+        barrier = threading.Barrier(2)
+
+        def first_call(chunk):
+            barrier.wait(timeout=5)
+            return chunk
+
+        _run_chunked(first_call, [1, 2, 3, 4], 2, 2, credentials)
+        built = mock_build_http.call_count
+        results = _run_chunked(lambda chunk: chunk, [1, 2, 3, 4], 2, 2, credentials)
+
+        self.assertEqual(results, [1, 2, 3, 4])
+        self.assertEqual(built, 2)
+        self.assertEqual(mock_build_http.call_count, built)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+from unittest.mock import Mock, patch
+import json
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from googleapiclient.errors import HttpError
+from rate_limit import TokenBucket, AdaptiveConcurrency, is_retryable, is_rate_limit_error, request_cost
+
+def http_error(status, reason=None):
+    content = b''
+    if reason:
+        content = json.dumps({'error': {'errors': [{'reason': reason}], 'message': reason}}).encode('utf-8')
+    return HttpError(Mock(status=status, reason='Error'), content)
+
+class TestRateLimit(unittest.TestCase):
+    def test_retryable_errors(self):
+        """Test which API errors are worth retrying"""
+        self.assertTrue(is_retryable(http_error(429)))
+        self.assertTrue(is_retryable(http_error(503)))
+        self.assertTrue(is_retryable(http_error(403, 'rateLimitExceeded')))
+        self.assertTrue(is_retryable(http_error(403, 'userRateLimitExceeded')))
+        self.assertTrue(is_retryable(ConnectionResetError()))
+        self.assertFalse(is_retryable(http_error(403, 'forbidden')))
+        self.assertFalse(is_retryable(http_error(404)))
+        self.assertFalse(is_retryable(ValueError()))
+        self.assertFalse(is_retryable(None))
+        
+        self.assertTrue(is_rate_limit_error(http_error(429)))
+        self.assertFalse(is_rate_limit_error(http_error(503)))
+        
+    def test_request_cost(self):
+        """Test quota costs per API method"""
+        self.assertEqual(request_cost('gmail.users.messages.get'), ('gmail', 5))
+        self.assertEqual(request_cost('gmail.users.history.list'), ('gmail', 2))
+        self.assertEqual(request_cost('calendar.events.insert'), ('calendar', 1))
+        
+    @patch('rate_limit.time')
+    def test_token_bucket_waits_for_refill(self, mock_time):
+        """Test that the bucket sleeps when it runs out of tokens"""
+        clock = [100.0]
+        mock_time.monotonic.side_effect = lambda: clock[0]
+        mock_time.sleep.side_effect = lambda seconds: clock.__setitem__(0, clock[0] + seconds)
+        
+        bucket = TokenBucket(rate=10, capacity=20)
+        bucket.acquire(20)
+        mock_time.sleep.assert_not_called()
+        
+        bucket.acquire(5)
+        self.assertAlmostEqual(mock_time.sleep.call_args[0][0], 0.5)
+
+    @patch('rate_limit.time')
+    def test_token_bucket_charges_full_cost_of_large_requests(self, mock_time):
+        """Test that a request costing more than the capacity leaves the bucket in debt"""
+        clock = [100.0]
+        mock_time.monotonic.side_effect = lambda: clock[0]
+        mock_time.sleep.side_effect = lambda seconds: clock.__setitem__(0, clock[0] + seconds)
+        
+        bucket = TokenBucket(rate=10, capacity=20)
+        bucket.acquire(50)
+        mock_time.sleep.assert_not_called()
+        
+        # 30 tokens of debt plus 5 for this request
+        bucket.acquire(5)
+        self.assertAlmostEqual(clock[0] - 100.0, 3.5)
+        
+    def test_adaptive_concurrency(self):
+        """Test that the limit halves on throttling and grows back with successes"""
+        concurrency = AdaptiveConcurrency(limit=8, max_limit=10)
+        
+        concurrency.throttled()
+        self.assertEqual(concurrency.limit, 4)
+        concurrency.throttled()
+        concurrency.throttled()
+        concurrency.throttled()
+        self.assertEqual(concurrency.limit, 1)
+        
+        concurrency.succeeded()
+        self.assertEqual(concurrency.limit, 2)
+        concurrency.succeeded()
+        concurrency.succeeded()
+        self.assertEqual(concurrency.limit, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+from datetime import date, datetime
+import os
+import sys
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from events import ShiftEvent
+from reconcile import build_plan, coalesce_schedules, Plan, PlanEntry, CREATE, UPDATE, DELETE, NOOP
+
+def make_event(day, start_hour, end_hour=22):
+    return ShiftEvent(datetime(2025, 11, day, start_hour, 40), datetime(2025, 11, day, end_hour, 0),
+                      'Shift', 'Day: shift')
+
+def make_calendar_event(event_id, event):
+    return {
+        'id': event_id,
+        'summary': event['summary'],
+        'description': event['description'],
+        'start': {'dateTime': event['start'].isoformat() + '+01:00'},
+        'end': {'dateTime': event['end'].isoformat() + '+01:00'},
+    }
+
+class TestReconcile(unittest.TestCase):
+    def test_build_plan(self):
+        desired = coalesce_schedules([
+            ('msg1', 100, [make_event(24, 11), make_event(28, 11)]),
+        ])
+        actual = {
+            date(2025, 11, 24): [make_calendar_event('same', make_event(24, 11))],
+            date(2025, 11, 25): [make_calendar_event('removed', make_event(25, 9))],
+            date(2025, 11, 28): [make_calendar_event('moved', make_event(28, 7))],
+        }
+
+        plan = build_plan(desired, actual)
+
+        self.assertEqual([(entry.action, entry.day.day) for entry in plan.entries],
+                         [(NOOP, 24), (DELETE, 25), (UPDATE, 28)])
+        self.assertEqual([entry.operation()[0] for entry in plan.writes()], ['delete', 'update'])
+        self.assertEqual(plan.writes()[1].operation()[1], 'moved')
+        self.assertTrue(all(entry.source == 'msg1' for entry in plan.entries))
+
+    def test_duplicate_events_on_a_day(self):
+        desired = {date(2025, 11, 25): (None, 'msg1'), date(2025, 11, 26): (make_event(26, 11), 'msg1')}
+        actual = {
+            date(2025, 11, 25): [make_calendar_event('off1', make_event(25, 9)),
+                                 make_calendar_event('off2', make_event(25, 15))],
+            date(2025, 11, 26): [make_calendar_event('first', make_event(26, 7)),
+                                 make_calendar_event('extra', make_event(26, 11))],
+        }
+
+        plan = build_plan(desired, actual)
+
+        self.assertEqual([entry.operation()[:2] for entry in plan.writes()],
+                         [('delete', 'off1'), ('delete', 'off2'), ('delete', 'extra'), ('update', 'first')])
+
+    def test_free_days_without_events_need_nothing(self):
+        desired = {date(2025, 11, 25): (None, 'msg1'), date(2025, 11, 26): (make_event(26, 11), 'msg1')}
+
+        plan = build_plan(desired, {})
+
+        self.assertEqual([entry.action for entry in plan.entries], [CREATE])
+
+    def test_describe(self):
+        plan = Plan([
+            PlanEntry(CREATE, date(2025, 11, 26), make_event(26, 11), None, 'msg1'),
+            PlanEntry(NOOP, date(2025, 11, 24), make_event(24, 11), {'id': 'same'}, 'msg1'),
+        ])
+
+        lines = plan.describe()
+
+        self.assertEqual(lines[0], "  create 2025-11-26 11:40-22:00 Shift")
+        self.assertEqual(lines[-1], "Plan: 1 to create, 0 to update, 0 to delete, 1 unchanged")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from unittest.mock import patch, Mock
+from datetime import datetime, timedelta, timezone
+import os
+import sys
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+import services
+from services import get_service, get_discovery_doc, refresh_if_expiring, drop_services, REFRESH_MARGIN
+from google.oauth2.credentials import Credentials
+
+def make_credentials(expires_in):
+    expiry = datetime.now(timezone.utc).replace(tzinfo=None) + expires_in
+    return Credentials(token='token', refresh_token='refresh', token_uri='https://oauth2.googleapis.com/token',
+                       client_id='id', client_secret='secret', expiry=expiry)
+
+class TestServices(unittest.TestCase):
+    def tearDown(self):
+        drop_services('test_token.json')
+
+    @patch('services.get_credentials')
+    def test_services_share_credentials_and_http(self, mock_get_credentials):
+        mock_get_credentials.return_value = make_credentials(timedelta(hours=1))
+
+        gmail = get_service('gmail', 'v1', 'test_token.json')
+        calendar = get_service('calendar', 'v3', 'test_token.json')
+
+        self.assertIs(get_service('gmail', 'v1', 'test_token.json'), gmail)
+        self.assertIs(gmail._http, calendar._http)
+        mock_get_credentials.assert_called_once_with('test_token.json', interactive=True)
+
+        # After drop_services the token is read again
+        drop_services('test_token.json')
+        self.assertIsNot(get_service('gmail', 'v1', 'test_token.json'), gmail)
+        self.assertEqual(mock_get_credentials.call_count, 2)
+
+    @patch('services.get_static_doc', wraps=services.get_static_doc)
+    def test_discovery_doc_is_read_once(self, mock_get_static_doc):
+        services._discovery_docs.clear()
+        first = get_discovery_doc('calendar', 'v3')
+        self.assertIs(get_discovery_doc('calendar', 'v3'), first)
+        mock_get_static_doc.assert_called_once_with('calendar', 'v3')
+
+        with self.assertRaises(ValueError):
+            get_discovery_doc('nonexistent', 'v0')
+
+    def test_refresh_ahead_of_expiry(self):
+        fresh = make_credentials(REFRESH_MARGIN * 2)
+        fresh.refresh = Mock()
+        self.assertFalse(refresh_if_expiring(fresh, Mock()))
+        fresh.refresh.assert_not_called()
+
+        expiring = make_credentials(REFRESH_MARGIN / 2)
+        expiring.refresh = Mock()
+        self.assertTrue(refresh_if_expiring(expiring, Mock()))
+        expiring.refresh.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
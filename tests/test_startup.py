@@ -0,0 +1,64 @@
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Budgets for cron runs that find no new emails
+IMPORT_BUDGET = 0.75  # seconds to import main.py
+NOOP_RUN_BUDGET = 1.0  # seconds of wall time for a whole run, interpreter startup included
+
+# Modules that only runs with new emails (or a login) need
+LAZY_MODULES = ['processor', 'calendar_service', 'calendar_mirror', 'ledger', 'email_parser',
+                'dateutil', 'sqlite3', 'requests', 'google_auth_oauthlib']
+
+def import_times(module):
+    """
+    Imports a module in a fresh interpreter with -X importtime.
+    Returns {module name: cumulative import time in seconds}.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+class TestStartup(unittest.TestCase):
+    def test_import_budget(self):
+        times = import_times('main')
+
+        self.assertLess(times['main'], IMPORT_BUDGET)
+        for module in LAZY_MODULES:
+            self.assertNotIn(module, times)
+
+    def test_noop_run_budget(self):
+        script = textwrap.dedent(f"""
+            import sys
+            sys.path.insert(0, {ROOT!r})
+            sys.path.insert(0, {os.path.join(ROOT, 'benchmarks')!r})
+            import main
+            from fake_google import FakeGmail
+            main.get_gmail_service = lambda: FakeGmail()
+            main.main([])
+            print([m for m in {LAZY_MODULES!r} if m in sys.modules])
+        """)
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, '-c', script], cwd=directory,
+                                    capture_output=True, text=True, check=True)
+            elapsed = time.perf_counter() - start
+
+        self.assertIn("No schedule emails found.", result.stdout)
+        self.assertEqual(result.stdout.splitlines()[-1], '[]')
+        self.assertLess(elapsed, NOOP_RUN_BUDGET)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from tenants import load_roster, DEFAULT_INTERVAL
+
+class TestTenants(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'tenants.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_roster(self, entries):
+        with open(self.path, 'w') as f:
+            json.dump(entries, f)
+
+    def test_defaults_and_relative_paths(self):
+        self.write_roster([{'name': 'anna', 'token_file': 'tokens/anna.json', 'calendar_id': 'cal1'}])
+
+        tenant, = load_roster(self.path)
+
+        self.assertEqual(tenant['token_file'], os.path.join(self.directory, 'tokens/anna.json'))
+        self.assertEqual(tenant['state_dir'], os.path.join(self.directory, 'state', 'anna'))
+        self.assertEqual(tenant['interval'], DEFAULT_INTERVAL)
+        self.assertEqual(tenant['calendar_id'], 'cal1')
+        self.assertEqual(tenant['event_summary'], "Work at McDonald's")
+
+    def test_invalid_rosters(self):
+        invalid = [
+            {'name': 'anna'},
+            [{'token_file': 'anna.json'}],
+            [{'name': 'anna', 'token_file': 'a.json'}, {'name': 'anna', 'token_file': 'b.json'}],
+            [{'name': 'anna', 'token_file': 'a.json', 'interval': 0}],
+        ]
+        for entries in invalid:
+            self.write_roster(entries)
+            with self.assertRaises(ValueError):
+                load_roster(self.path)
+
+if __name__ == '__main__':
+    unittest.main()
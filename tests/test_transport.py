@@ -0,0 +1,135 @@
+import unittest
+from unittest.mock import Mock, patch
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+import httplib2
+from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
+from transport import GzipHttp, _CountingHTTPSConnection, execute, run_batch, worker_http, MAX_RETRIES
+
+class TestTransport(unittest.TestCase):
+    @patch.object(httplib2.Http, 'request', return_value=({}, b''))
+    def test_requests_gzip(self, mock_request):
+        """Test that requests advertise gzip in Accept-Encoding and the user agent"""
+        http = GzipHttp()
+        http.request('https://www.googleapis.com/calendar/v3/calendars/x/events',
+                     headers={'User-Agent': 'google-api-python-client/2.0'})
+        
+        headers = mock_request.call_args[1]['headers']
+        self.assertEqual(headers['accept-encoding'], 'gzip')
+        self.assertEqual(headers['user-agent'], 'google-api-python-client/2.0 (gzip)')
+        self.assertIs(mock_request.call_args[1]['connection_type'], _CountingHTTPSConnection)
+        
+    @patch.object(httplib2.Http, 'request', return_value=({}, b''))
+    def test_keeps_existing_gzip_user_agent(self, mock_request):
+        """Test that the user agent is not changed when it already mentions gzip"""
+        http = GzipHttp()
+        http.request('https://gmail.googleapis.com/gmail/v1/users/me/profile',
+                     headers={'user-agent': 'client (gzip)'})
+        
+        headers = mock_request.call_args[1]['headers']
+        self.assertEqual(headers['user-agent'], 'client (gzip)')
+
+    def test_execute_uses_worker_http(self):
+        """Test that requests run on a worker's own http object while it is bound"""
+        request = Mock()
+        credentials = Credentials(token='token')
+        
+        execute(request)
+        request.execute.assert_called_with()
+        
+        with worker_http(credentials):
+            execute(request)
+            http = request.execute.call_args[1]['http']
+            self.assertIs(http.credentials, credentials)
+            # The same thread reuses its http object for the same credentials
+            with worker_http(credentials):
+                execute(request)
+                self.assertIs(request.execute.call_args[1]['http'], http)
+        
+        execute(request)
+        request.execute.assert_called_with()
+
+    @patch('transport.time.sleep')
+    def test_execute_retries_retryable_errors(self, mock_sleep):
+        """Test that throttled requests are retried with backoff"""
+        request = Mock()
+        request.execute.side_effect = [
+            HttpError(Mock(status=429, reason='Too Many Requests'), b''),
+            HttpError(Mock(status=503, reason='Backend Error'), b''),
+            {'id': 'event1'},
+        ]
+        
+        with patch('builtins.print'):
+            response = execute(request)
+        
+        self.assertEqual(response, {'id': 'event1'})
+        self.assertEqual(mock_sleep.call_count, 2)
+        
+    @patch('transport.time.sleep')
+    def test_execute_does_not_retry_other_errors(self, mock_sleep):
+        """Test that errors like 404 are raised immediately"""
+        request = Mock()
+        request.execute.side_effect = HttpError(Mock(status=404, reason='Not Found'), b'')
+        
+        with self.assertRaises(HttpError):
+            execute(request)
+        mock_sleep.assert_not_called()
+        
+    @patch('transport.time.sleep')
+    def test_run_batch_retries_throttled_items(self, mock_sleep):
+        """Test that only the throttled items of a batch are sent again"""
+        service = Mock()
+        requests = ['request0', 'request1', 'request2']
+        sent = []
+        
+        def new_batch(callback):
+            batch = Mock()
+            batch.added = []
+            batch.add.side_effect = lambda request, request_id: batch.added.append(request_id)
+            
+            def execute_batch():
+                sent.append(list(batch.added))
+                for request_id in batch.added:
+                    if request_id == '1' and len(sent) == 1:
+                        callback(request_id, None, HttpError(Mock(status=429, reason='Too Many Requests'), b''))
+                    elif request_id == '2':
+                        callback(request_id, None, HttpError(Mock(status=404, reason='Not Found'), b''))
+                    else:
+                        callback(request_id, f'response{request_id}', None)
+            
+            batch.execute.side_effect = execute_batch
+            return batch
+        
+        service.new_batch_http_request.side_effect = new_batch
+        
+        with patch('builtins.print'):
+            results = run_batch(service, requests, batch_size=50)
+        
+        self.assertEqual(sent, [['0', '1', '2'], ['1']])
+        self.assertEqual(results[0], ('response0', None))
+        self.assertEqual(results[1], ('response1', None))
+        self.assertEqual(results[2][1].resp.status, 404)
+        mock_sleep.assert_called_once()
+        
+    @patch('transport.time.sleep')
+    def test_run_batch_retries_failed_batch_in_one_place(self, mock_sleep):
+        """Test that a batch that keeps failing is sent MAX_RETRIES + 1 times, not retried twice over"""
+        service = Mock()
+        batch = Mock()
+        batch.execute.side_effect = ConnectionResetError()
+        service.new_batch_http_request.return_value = batch
+        
+        with patch('builtins.print'):
+            results = run_batch(service, ['request0', 'request1'], batch_size=50)
+        
+        self.assertEqual(batch.execute.call_count, MAX_RETRIES + 1)
+        self.assertEqual(mock_sleep.call_count, MAX_RETRIES)
+        self.assertTrue(all(isinstance(error, ConnectionResetError) for _, error in results))
+
+if __name__ == '__main__':
+    unittest.main()